@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Booking
+from .models import BlockedPeriod, Booking
 
 
 @admin.register(Booking)
@@ -15,3 +15,9 @@ class BookingAdmin(admin.ModelAdmin):
     )
     list_filter = ('status', 'created_at')
     search_fields = ('listing__title', 'tenant__email')
+
+
+@admin.register(BlockedPeriod)
+class BlockedPeriodAdmin(admin.ModelAdmin):
+    list_display = ('id', 'listing', 'start_date', 'end_date', 'reason')
+    search_fields = ('listing__title',)
@@ -0,0 +1,180 @@
+"""
+Календарь занятости объявления (/listings/{id}/calendar/?from=&to=).
+
+Вместо постраничного чтения бронирований клиент получает статус каждого
+дня периода: booked (approved, completed), pending, blocked (закрыто
+арендодателем, BlockedPeriod) или free. Для каждого объявления в
+ListingCalendar лежит по битовой карте на статус - бит на день от
+first_day, упакованы в байты. Ответ читает одну строку и распаковывает
+только байты запрошенного периода.
+
+Смена статуса бронирования переносит его дни между слоями на месте
+(apply_booking); закрытые периоды и удаления пересобирают карты по
+диапазонам дат объявления (rebuild_calendar). При каждом изменении
+растёт version - из неё строится ETag календаря, поэтому он меняется
+только вместе с бронированиями и закрытыми датами объявления.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+
+CALENDAR_BOOKED = 'booked'
+CALENDAR_PENDING = 'pending'
+CALENDAR_BLOCKED = 'blocked'
+CALENDAR_FREE = 'free'
+# Порядок важен: день с несколькими отметками получает первый статус
+CALENDAR_LAYERS = (CALENDAR_BOOKED, CALENDAR_PENDING, CALENDAR_BLOCKED)
+DEFAULT_CALENDAR_DAYS = 90
+MAX_CALENDAR_DAYS = 366
+
+
+def build_bitmaps(ranges):
+    """
+    {слой: [(start, end), ...]} -> (first_day, {слой: bytes}). Диапазоны -
+    ночи [start, end); без диапазонов first_day None и карты пустые
+    """
+    spans = [span for layer in CALENDAR_LAYERS for span in ranges.get(layer, ()) if span[0] < span[1]]
+    if not spans:
+        return None, {layer: b'' for layer in CALENDAR_LAYERS}
+    first_day = min(start for start, _ in spans)
+    size = (max(end for _, end in spans) - first_day).days
+    bitmaps = {}
+    for layer in CALENDAR_LAYERS:
+        bits = np.zeros(size, dtype=bool)
+        for start, end in ranges.get(layer, ()):
+            bits[(start - first_day).days:(end - first_day).days] = True
+        bitmaps[layer] = np.packbits(bits, bitorder='little').tobytes()
+    return first_day, bitmaps
+
+
+def unpack_days(blob, first_day, start, end):
+    """Биты дней [start, end) из карты (дни за пределами карты - нули)"""
+    result = np.zeros((end - start).days, dtype=bool)
+    if first_day is None or not blob:
+        return result
+    offset = (start - first_day).days
+    low, high = max(offset, 0), min(offset + len(result), len(blob) * 8)
+    if low >= high:
+        return result
+    # Распаковываются только байты периода
+    chunk = np.frombuffer(bytes(blob[low // 8:(high + 7) // 8]), dtype=np.uint8)
+    bits = np.unpackbits(chunk, bitorder='little')
+    result[low - offset:high - offset] = bits[low % 8:low % 8 + high - low]
+    return result
+
+
+def calendar_days(calendar, start, end):
+    """Статусы дней [start, end) по ListingCalendar (None - у объявления нет дат)"""
+    statuses = np.full((end - start).days, CALENDAR_FREE, dtype=object)
+    if calendar is not None:
+        # Слои с конца: приоритетный статус записывается последним
+        for layer in reversed(CALENDAR_LAYERS):
+            statuses[unpack_days(getattr(calendar, layer), calendar.first_day, start, end)] = layer
+    return [
+        {'date': start + timedelta(days=offset), 'status': status}
+        for offset, status in enumerate(statuses.tolist())
+    ]
+
+
+def booking_layer(status):
+    """Слой карты для статуса бронирования (None - дни не заняты)"""
+    from .models import Booking
+
+    if status in (Booking.STATUS_APPROVED, Booking.STATUS_COMPLETED):
+        return CALENDAR_BOOKED
+    if status == Booking.STATUS_PENDING:
+        return CALENDAR_PENDING
+    return None
+
+
+def listing_ranges(listing_id):
+    from .models import BlockedPeriod, Booking
+
+    bookings = Booking.objects.filter(listing_id=listing_id).values_list('start_date', 'end_date', 'status')
+    ranges = {layer: [] for layer in CALENDAR_LAYERS}
+    for start, end, status in bookings:
+        layer = booking_layer(status)
+        if layer is not None:
+            ranges[layer].append((start, end))
+    ranges[CALENDAR_BLOCKED] = list(
+        BlockedPeriod.objects.filter(listing_id=listing_id).values_list('start_date', 'end_date')
+    )
+    return ranges
+
+
+def mark_days(calendar, start, end, clear=None, fill=None):
+    """
+    Снимает дни [start, end) в слое clear и ставит в слое fill. Карты при
+    необходимости расширяются; возвращает (first_day, {слой: bytes})
+    """
+    size = max(len(getattr(calendar, layer)) for layer in CALENDAR_LAYERS) * 8
+    first_day = min(calendar.first_day or start, start)
+    last_day = max(calendar.first_day + timedelta(days=size) if calendar.first_day else end, end)
+    low, high = (start - first_day).days, (end - first_day).days
+    bitmaps = {}
+    for layer in CALENDAR_LAYERS:
+        bits = unpack_days(getattr(calendar, layer), calendar.first_day, first_day, last_day)
+        if layer == clear:
+            bits[low:high] = False
+        if layer == fill:
+            bits[low:high] = True
+        bitmaps[layer] = np.packbits(bits, bitorder='little').tobytes()
+    return first_day, bitmaps
+
+
+def rebuild_calendar(listing_id):
+    """Пересобирает карты объявления по его бронированиям и закрытым периодам"""
+    from listings.models import Listing
+
+    with transaction.atomic():
+        # Удалённое объявление (вызов после коммита каскадного удаления)
+        if not Listing.objects.filter(pk=listing_id).exists():
+            return
+        calendar, _ = _lock_calendar(listing_id)
+        _store(calendar, *build_bitmaps(listing_ranges(listing_id)))
+
+
+def apply_booking(booking, created=False):
+    """
+    Переносит дни бронирования в слой его нового статуса без пересборки.
+    Ночи pending/approved уникальны (OccupiedDay), поэтому биты диапазона
+    принадлежат только этому бронированию и их можно просто снять. Без
+    известного прежнего состояния карта пересобирается целиком
+    """
+    loaded = getattr(booking, '_loaded_values', {})
+    if created:
+        old_layer = None
+    elif all(name in loaded for name in booking.TRACKED_FIELDS) and (
+        loaded['start_date'], loaded['end_date']
+    ) == (booking.start_date, booking.end_date):
+        old_layer = booking_layer(loaded['status'])
+    else:
+        rebuild_calendar(booking.listing_id)
+        return
+    new_layer = booking_layer(booking.status)
+    if old_layer == new_layer:
+        return
+
+    with transaction.atomic():
+        calendar, calendar_created = _lock_calendar(booking.listing_id)
+        if calendar_created:
+            # Первое изменение объявления: карта по всем его датам
+            _store(calendar, *build_bitmaps(listing_ranges(booking.listing_id)))
+        else:
+            _store(calendar, *mark_days(calendar, booking.start_date, booking.end_date, old_layer, new_layer))
+
+
+def _lock_calendar(listing_id):
+    from .models import ListingCalendar
+
+    # Блокировка строки: изменения календаря одного объявления идут по очереди
+    return ListingCalendar.objects.select_for_update().get_or_create(listing_id=listing_id)
+
+
+def _store(calendar, first_day, bitmaps):
+    calendar.first_day = first_day
+    for layer, bitmap in bitmaps.items():
+        setattr(calendar, layer, bitmap)
+    calendar.version += 1
+    calendar.save()
@@ -0,0 +1,159 @@
+"""
+Массовое подтверждение заявок арендодателем (/bookings/bookings/decide/).
+
+Вместо вызова approve на каждую заявку (и своего запроса пересечений в
+каждом) интервалы объявления читаются один раз: подтверждённые
+бронирования и закрытые периоды - занятое время, заявки (pending) -
+кандидаты. Занятое время сливается проходом по отсортированным началам
+в непересекающиеся интервалы; кандидаты перебираются в порядке
+приоритета (первым пришёл / самое долгое проживание), и каждый
+проверяется бинарным поиском по уже занятому. Прошедшие проверку
+подтверждаются, остальные отклоняются - одной транзакцией, пакетными
+UPDATE по статусу.
+
+Ночи pending-заявок уникальны (OccupiedDay), так что заявки обычно не
+пересекаются друг с другом, а конфликты - с закрытыми датами и со
+старыми данными, записанными до ограничения.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from listings.cache import AVAILABILITY_GENERATION, BOOKINGS_GENERATION, bump_generation
+
+from .calendar import rebuild_calendar
+from .models import BlockedPeriod, Booking, DatesUnavailable, OccupiedDay
+
+PRIORITY_FIRST_COME = 'first_come'
+PRIORITY_LONGEST_STAY = 'longest_stay'
+PRIORITY_CHOICES = [
+    (PRIORITY_FIRST_COME, 'First come, first served'),
+    (PRIORITY_LONGEST_STAY, 'Longest stay first'),
+]
+MAX_DECISION_BOOKINGS = 1000
+
+
+def get_default_priority():
+    return getattr(settings, 'BOOKING_DECISION_PRIORITY', PRIORITY_FIRST_COME)
+
+
+def merge_intervals(intervals):
+    """Сливает пересекающиеся и смежные [start, end) - проход по отсортированным началам"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def resolve_conflicts(taken, candidates, priority=PRIORITY_FIRST_COME):
+    """
+    taken - занятые интервалы [start, end), candidates - заявки (pk, start,
+    end, created_at). Возвращает (подтверждаемые pk, отклоняемые pk)
+    """
+    if priority == PRIORITY_LONGEST_STAY:
+        def order(candidate):
+            pk, start, end, created_at = candidate
+            return -(end - start).days, created_at, pk
+    else:
+        def order(candidate):
+            pk, start, end, created_at = candidate
+            return created_at, pk
+
+    merged = merge_intervals(taken)
+    starts = [start for start, _ in merged]
+    ends = [end for _, end in merged]
+    approved, rejected = [], []
+    for pk, start, end, _ in sorted(candidates, key=order):
+        # Интервалы не пересекаются: достаточно соседа с последним началом до end
+        index = bisect_left(starts, end) - 1
+        if index >= 0 and ends[index] > start:
+            rejected.append(pk)
+            continue
+        approved.append(pk)
+        position = bisect_left(starts, start)
+        starts.insert(position, start)
+        ends.insert(position, end)
+    return approved, rejected
+
+
+def decide_bookings(landlord, booking_ids=None, listing_id=None, priority=None):
+    """
+    Подтверждает заявки landlord (booking_ids или все pending объявления
+    listing_id), конфликтующие отклоняет. Возвращает {'approved': [...],
+    'rejected': [...], 'skipped': [...]}; skipped - чужие и уже
+    рассмотренные id из booking_ids
+    """
+    priority = priority or get_default_priority()
+    with transaction.atomic():
+        requests = Booking.objects.filter(listing__owner=landlord, status=Booking.STATUS_PENDING)
+        if booking_ids is not None:
+            requests = requests.filter(pk__in=booking_ids)
+        if listing_id is not None:
+            requests = requests.filter(listing_id=listing_id)
+        # Блокировка заявок: параллельный approve / cancel ждёт решения
+        rows = list(requests.select_for_update().values_list('pk', 'listing_id', 'start_date', 'end_date', 'created_at'))
+        candidates = defaultdict(list)
+        for pk, listing, start, end, created_at in rows:
+            candidates[listing].append((pk, start, end, created_at))
+
+        taken = defaultdict(list)
+        listings = list(candidates)
+        approved_rows = Booking.objects.filter(listing_id__in=listings, status=Booking.STATUS_APPROVED)
+        for listing, start, end in approved_rows.values_list('listing_id', 'start_date', 'end_date'):
+            taken[listing].append((start, end))
+        for listing, start, end in BlockedPeriod.objects.filter(listing_id__in=listings).values_list(
+            'listing_id', 'start_date', 'end_date'
+        ):
+            taken[listing].append((start, end))
+
+        approved, rejected = [], []
+        for listing, listing_candidates in candidates.items():
+            listing_approved, listing_rejected = resolve_conflicts(taken[listing], listing_candidates, priority)
+            approved.extend(listing_approved)
+            rejected.extend(listing_rejected)
+
+        _apply(approved, rejected)
+        for listing in listings:
+            rebuild_calendar(listing)
+
+    decided = set(approved) | set(rejected)
+    skipped = [pk for pk in booking_ids if pk not in decided] if booking_ids is not None else []
+    return {'approved': sorted(approved), 'rejected': sorted(rejected), 'skipped': skipped}
+
+
+def _apply(approved, rejected):
+    """Пакетные UPDATE мимо Booking.save: занятые ночи и кэши обновляются здесь"""
+    if not approved and not rejected:
+        return
+    now = timezone.now()
+    if rejected:
+        OccupiedDay.objects.filter(booking_id__in=rejected).delete()
+        Booking.objects.filter(pk__in=rejected).update(status=Booking.STATUS_REJECTED, updated_at=now)
+    if approved:
+        # Заявка без своих ночей (пересечение, записанное до ограничения)
+        # занимает их сейчас; ночь чужого бронирования откатит всё решение
+        held = set(OccupiedDay.objects.filter(booking_id__in=approved).values_list('booking_id', 'day'))
+        missing = [
+            OccupiedDay(listing_id=booking.listing_id, booking_id=booking.pk, day=day)
+            for booking in Booking.objects.filter(pk__in=approved).only('pk', 'listing_id', 'start_date', 'end_date')
+            for day in booking.nights()
+            if (booking.pk, day) not in held
+        ]
+        try:
+            with transaction.atomic():
+                OccupiedDay.objects.bulk_create(missing, batch_size=1000)
+        except IntegrityError:
+            raise DatesUnavailable('Some of the approved bookings overlap other bookings')
+        Booking.objects.filter(pk__in=approved).update(status=Booking.STATUS_APPROVED, updated_at=now)
+    # Отклонённые заявки освободили ночи; UPDATE мимо сигналов - версию
+    # списков бронирований тоже сбрасываем сами. После коммита: иначе
+    # параллельный запрос закэширует старую занятость под новым поколением
+    transaction.on_commit(lambda: bump_generation(AVAILABILITY_GENERATION))
+    transaction.on_commit(lambda: bump_generation(BOOKINGS_GENERATION))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-17 01:36
+
+import django.db.models.deletion
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_occupied_days(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    OccupiedDay = apps.get_model('bookings', 'OccupiedDay')
+
+    batch = []
+    bookings = Booking.objects.filter(status__in=['pending', 'approved']).only(
+        'id', 'listing_id', 'start_date', 'end_date'
+    )
+    for booking in bookings.iterator(chunk_size=2000):
+        day = booking.start_date
+        while day < booking.end_date:
+            batch.append(OccupiedDay(listing_id=booking.listing_id, booking_id=booking.id, day=day))
+            day += timedelta(days=1)
+        if len(batch) >= 5000:
+            OccupiedDay.objects.bulk_create(batch)
+            batch = []
+    OccupiedDay.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_alter_booking_status'),
+        ('listings', '0006_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupiedDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupied_days', to='bookings.booking')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupied_days', to='listings.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'listing'], name='bookings_oc_day_808839_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_occupied_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-17 03:33
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from bookings.calendar import CALENDAR_BOOKED, CALENDAR_PENDING, build_bitmaps
+
+
+def build_calendars(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    ListingCalendar = apps.get_model('bookings', 'ListingCalendar')
+    layers = {'approved': CALENDAR_BOOKED, 'completed': CALENDAR_BOOKED, 'pending': CALENDAR_PENDING}
+    ranges = defaultdict(lambda: defaultdict(list))
+    rows = Booking.objects.filter(status__in=list(layers)).values_list('listing_id', 'start_date', 'end_date', 'status')
+    for listing_id, start, end, status in rows.iterator(chunk_size=5000):
+        ranges[listing_id][layers[status]].append((start, end))
+    calendars = []
+    for listing_id, listing_ranges in ranges.items():
+        first_day, bitmaps = build_bitmaps(listing_ranges)
+        calendars.append(ListingCalendar(listing_id=listing_id, first_day=first_day, version=1, **bitmaps))
+    ListingCalendar.objects.bulk_create(calendars, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_booking_updated_at'),
+        ('listings', '0015_saved_searches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingCalendar',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='calendar', serialize=False, to='listings.listing')),
+                ('first_day', models.DateField(blank=True, null=True)),
+                ('booked', models.BinaryField(default=b'')),
+                ('pending', models.BinaryField(default=b'')),
+                ('blocked', models.BinaryField(default=b'')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BlockedPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocked_periods', to='listings.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start_date', 'end_date'], name='bookings_bl_start_d_5d01e7_idx')],
+            },
+        ),
+        migrations.RunPython(build_calendars, migrations.RunPython.noop),
+    ]
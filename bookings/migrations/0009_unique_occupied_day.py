@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 03:35
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicate_nights(apps, schema_editor):
+    # Пересечения, проскочившие до ограничения: ночь остаётся за более ранним бронированием
+    OccupiedDay = apps.get_model('bookings', 'OccupiedDay')
+    duplicates = (
+        OccupiedDay.objects.values('listing_id', 'day')
+        .annotate(rows=Count('id'), first=Min('booking_id'))
+        .filter(rows__gt=1)
+    )
+    for row in list(duplicates):
+        OccupiedDay.objects.filter(listing_id=row['listing_id'], day=row['day']).exclude(
+            booking_id=row['first']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_listing_calendar'),
+        ('listings', '0015_saved_searches'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_nights, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='occupiedday',
+            constraint=models.UniqueConstraint(fields=('listing', 'day'), name='unique_occupied_listing_day'),
+        ),
+    ]
@@ -1,8 +1,14 @@
+from datetime import timedelta
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from listings.models import Listing
 
 
+class DatesUnavailable(Exception):
+    """Ночи бронирования уже заняты другим бронированием"""
+
+
 class Booking(models.Model):
     STATUS_PENDING = 'pending'
     STATUS_APPROVED = 'approved'
@@ -18,6 +24,11 @@ class Booking(models.Model):
         (STATUS_COMPLETED, 'Completed'),
     ]
 
+    # Статусы, которые занимают даты объявления
+    OCCUPYING_STATUSES = (STATUS_PENDING, STATUS_APPROVED)
+    # Значения при загрузке из БД: календарь снимает дни прежнего статуса
+    TRACKED_FIELDS = ('status', 'start_date', 'end_date')
+
     listing = models.ForeignKey(
         Listing,
         on_delete=models.CASCADE,
@@ -36,6 +47,7 @@ class Booking(models.Model):
         default=STATUS_PENDING
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'Booking #{self.id} - {self.listing}'
@@ -50,9 +62,37 @@ class Booking(models.Model):
         if self.start_date < timezone.now().date():
             raise ValidationError('Start date cannot be in the past')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values)
+            if name in cls.TRACKED_FIELDS
+        }
+        return instance
+
     def save(self, *args, **kwargs):
         self.full_clean()  # Вызываем валидацию при сохранении
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        try:
+            # Бронирование и его занятые ночи (сигнал post_save) пишутся одной
+            # транзакцией: при конфликте дат не остаётся ни того, ни другого
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except DatesUnavailable:
+            if adding:
+                self.pk = None
+                self._state.adding = True
+            raise
+        # После сигналов: они сравнивают с состоянием до сохранения
+        self._loaded_values = {name: getattr(self, name) for name in self.TRACKED_FIELDS}
+
+    def nights(self):
+        """Занятые ночи: от start_date включительно до end_date (день выезда свободен)"""
+        day = self.start_date
+        while day < self.end_date:
+            yield day
+            day += timedelta(days=1)
 
     @property
     def is_active(self):
@@ -62,4 +102,97 @@ class Booking(models.Model):
         return (
                 self.status == self.STATUS_APPROVED and
                 self.start_date <= today <= self.end_date
-        )
\ No newline at end of file
+        )
+
+
+class OccupiedDay(models.Model):
+    """
+    Ночь объявления, занятая бронированием (pending или approved).
+    Поддерживается сигналами Booking; индекс (day, listing) позволяет
+    найти занятые на период объявления одним range-запросом.
+
+    Уникальность (listing, day) - защита от двойного бронирования на
+    уровне БД: проверки exists() в сериализаторе и approve не спасают от
+    параллельных запросов, а вторая вставка той же ночи падает, и её
+    бронирование откатывается (Booking.save)
+    """
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name='occupied_days'
+    )
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='occupied_days'
+    )
+    day = models.DateField()
+
+    def __str__(self):
+        return f'{self.listing_id} occupied on {self.day}'
+
+    @classmethod
+    def listing_ids_between(cls, check_in, check_out):
+        """Подзапрос id объявлений, занятых хотя бы одну ночь в [check_in, check_out)"""
+        return cls.objects.filter(day__gte=check_in, day__lt=check_out).values('listing_id')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day', 'listing']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'day'], name='unique_occupied_listing_day'),
+        ]
+
+
+class BlockedPeriod(models.Model):
+    """
+    Даты, закрытые арендодателем (ремонт, своё проживание). Как у
+    бронирования, заняты ночи [start_date, end_date): end_date - первый
+    свободный день
+    """
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name='blocked_periods'
+    )
+    start_date = models.DateField()
+    end_date = models.DateField()
+    reason = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.listing_id} blocked {self.start_date} - {self.end_date}'
+
+    @classmethod
+    def listing_ids_between(cls, check_in, check_out):
+        """Подзапрос id объявлений, закрытых хотя бы одну ночь в [check_in, check_out)"""
+        return cls.objects.filter(start_date__lt=check_out, end_date__gt=check_in).values('listing_id')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_date', 'end_date']),
+        ]
+
+
+class ListingCalendar(models.Model):
+    """
+    Битовые карты дней объявления для /listings/{id}/calendar/ (см.
+    bookings.calendar): бит i - день first_day + i. version растёт при
+    каждом изменении бронирований и закрытых периодов объявления
+    """
+    listing = models.OneToOneField(
+        Listing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='calendar'
+    )
+    first_day = models.DateField(null=True, blank=True)
+    booked = models.BinaryField(default=b'')
+    pending = models.BinaryField(default=b'')
+    blocked = models.BinaryField(default=b'')
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Calendar of {self.listing_id} v{self.version}'
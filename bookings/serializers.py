@@ -1,8 +1,10 @@
 from rest_framework import serializers
-from .models import Booking
+from .decisions import MAX_DECISION_BOOKINGS, PRIORITY_CHOICES
+from .models import BlockedPeriod, Booking
+from rental_project.fieldsets import SparseFieldsetSerializerMixin
 
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     tenant_email = serializers.EmailField(source='tenant.email', read_only=True)
     listing_title = serializers.CharField(source='listing.title', read_only=True)
 
@@ -18,9 +20,10 @@ class BookingSerializer(serializers.ModelSerializer):
             "end_date",
             "status",
             "created_at",
+            "updated_at",
             "is_active"
         ]
-        read_only_fields = ["tenant", "status", "created_at", "is_active"]
+        read_only_fields = ["tenant", "status", "created_at", "updated_at", "is_active"]
 
     def validate(self, data):
         # Проверка что пользователь - tenant
@@ -47,4 +50,48 @@ class BookingSerializer(serializers.ModelSerializer):
         if overlapping_bookings.exists():
             raise serializers.ValidationError("These dates are not available")
 
+        # Даты, закрытые арендодателем
+        blocked = BlockedPeriod.objects.filter(
+            listing=listing,
+            start_date__lt=data['end_date'],
+            end_date__gt=data['start_date']
+        )
+        if blocked.exists():
+            raise serializers.ValidationError("These dates are not available")
+
+        return data
+
+
+class BlockedPeriodSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BlockedPeriod
+        fields = ["id", "listing", "start_date", "end_date", "reason", "created_at"]
+        read_only_fields = ["created_at"]
+
+    def validate_listing(self, listing):
+        if listing.owner_id != self.context['request'].user.pk:
+            raise serializers.ValidationError("You are not the owner of this listing")
+        return listing
+
+    def validate(self, data):
+        start_date = data.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = data.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date >= end_date:
+            raise serializers.ValidationError("End date must be after start date")
+        return data
+
+
+class BookingDecisionSerializer(serializers.Serializer):
+    """Заявки для массового решения: ids или все pending объявления listing"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, allow_empty=False,
+        max_length=MAX_DECISION_BOOKINGS,
+    )
+    listing = serializers.IntegerField(min_value=1, required=False)
+    priority = serializers.ChoiceField(choices=PRIORITY_CHOICES, required=False)
+
+    def validate(self, data):
+        if ('ids' in data) == ('listing' in data):
+            raise serializers.ValidationError("Pass either ids or listing")
         return data
+
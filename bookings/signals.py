@@ -0,0 +1,69 @@
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from listings.cache import AVAILABILITY_GENERATION, BOOKINGS_GENERATION, bump_generation
+
+from .calendar import apply_booking, rebuild_calendar
+from .models import BlockedPeriod, Booking, DatesUnavailable, OccupiedDay
+
+
+def sync_occupied_days(booking):
+    """
+    Пересоздаёт занятые ночи бронирования по его текущему статусу и датам.
+    Ночь, уже занятая другим бронированием, - DatesUnavailable
+    """
+    OccupiedDay.objects.filter(booking=booking).delete()
+    if booking.status in Booking.OCCUPYING_STATUSES:
+        try:
+            with transaction.atomic():
+                # Ночи по возрастанию: конкурирующие вставки берут блокировки
+                # ключей в одном порядке и не взаимоблокируются
+                OccupiedDay.objects.bulk_create([
+                    OccupiedDay(listing_id=booking.listing_id, booking=booking, day=day)
+                    for day in booking.nights()
+                ])
+        except IntegrityError:
+            raise DatesUnavailable(f'Listing {booking.listing_id} is already booked for these dates')
+    # Выдача с ?check_in/?check_out закэширована по поколению занятости.
+    # Сохранение идёт в транзакции Booking.save: сбрасываем после коммита,
+    # иначе кэш пересоберут из незакоммиченных (или откаченных) данных
+    transaction.on_commit(lambda: bump_generation(AVAILABILITY_GENERATION))
+
+
+@receiver(post_save, sender=Booking)
+def update_occupied_days(sender, instance, **kwargs):
+    sync_occupied_days(instance)
+
+
+@receiver(post_save, sender=Booking)
+def update_calendar(sender, instance, created, **kwargs):
+    apply_booking(instance, created)
+
+
+@receiver(post_save, sender=BlockedPeriod)
+def update_blocked_calendar(sender, instance, **kwargs):
+    rebuild_calendar(instance.listing_id)
+
+
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=BlockedPeriod)
+def update_calendar_on_delete(sender, instance, **kwargs):
+    # После коммита: при каскадном удалении объявления его календаря уже нет
+    listing_id = instance.listing_id
+    transaction.on_commit(lambda: rebuild_calendar(listing_id))
+
+
+@receiver(post_save, sender=BlockedPeriod)
+@receiver(post_delete, sender=BlockedPeriod)
+def update_blocked_availability(sender, instance, **kwargs):
+    # Закрытые даты исключаются фильтром ?check_in/?check_out
+    bump_generation(AVAILABILITY_GENERATION)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def bump_bookings_generation(sender, instance, **kwargs):
+    # Агрегат списка (COUNT / ETag) кэшируется по поколению. После коммита:
+    # иначе параллельный запрос закэширует старые данные уже под новым номером
+    transaction.on_commit(lambda: bump_generation(BOOKINGS_GENERATION))
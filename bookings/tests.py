@@ -1,12 +1,23 @@
-from django.test import TestCase
+import json
+import random
+import threading
+import time
+
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from datetime import date, timedelta
 from django.utils import timezone
+from django.db import OperationalError, close_old_connections, connection
+from django.core.cache import cache
+from django.test.utils import CaptureQueriesContext
 from users.models import User
+from listings.cache import AVAILABILITY_GENERATION, BOOKINGS_GENERATION, get_generations
 from listings.models import Listing
-from .models import Booking
+from .calendar import build_bitmaps, rebuild_calendar, unpack_days
+from .decisions import PRIORITY_FIRST_COME, PRIORITY_LONGEST_STAY, decide_bookings, resolve_conflicts
+from .models import BlockedPeriod, Booking, DatesUnavailable, ListingCalendar, OccupiedDay
 
 
 class BookingAPITest(APITestCase):
@@ -160,14 +171,9 @@ class BookingAPITest(APITestCase):
 
     def test_booking_date_overlap(self):
         """Тест пересечения дат бронирования"""
-        # Создаем approved бронирование
-        Booking.objects.create(
-            listing=self.listing,
-            tenant=self.tenant,
-            start_date=self.tomorrow,
-            end_date=self.next_week,
-            status=Booking.STATUS_APPROVED
-        )
+        # Подтверждаем бронирование из setUp (второе на те же ночи БД не примет)
+        self.booking.status = Booking.STATUS_APPROVED
+        self.booking.save()
 
         # Пытаемся создать пересекающееся бронирование
         url = reverse('booking-list')
@@ -412,6 +418,148 @@ class BookingAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
+class BookingConditionalGetTest(APITestCase):
+    def setUp(self):
+        self.tenant = User.objects.create_user(
+            username='etagtenant',
+            email='etagtenant@test.com',
+            password='pass123',
+            user_type='tenant'
+        )
+        self.landlord = User.objects.create_user(
+            username='etaglandlord',
+            email='etaglandlord@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.listing = Listing.objects.create(
+            title='Conditional booking',
+            description='Test',
+            location='Berlin',
+            price=100,
+            rooms=2,
+            property_type='apartment',
+            owner=self.landlord
+        )
+        self.booking = Booking.objects.create(
+            listing=self.listing,
+            tenant=self.tenant,
+            start_date=date.today() + timedelta(days=1),
+            end_date=date.today() + timedelta(days=3)
+        )
+        self.client.force_authenticate(user=self.tenant)
+
+    def test_updated_at_changes_etag(self):
+        url = reverse('bookings-detail', kwargs={'pk': self.booking.pk})
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.booking.status = Booking.STATUS_CANCELED
+        self.booking.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_list_etag_changes_with_listing_title(self):
+        url = reverse('bookings-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.listing.title = 'Renamed'
+        self.listing.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['listing_title'], 'Renamed')
+
+    def test_cursor_page_etag_follows_rows(self):
+        url = reverse('bookings-list') + '?cursor='
+        with CaptureQueriesContext(connection) as queries:
+            etag = self.client.get(url)['ETag']
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Вложенное объявление - часть ETag строки
+        self.listing.title = 'Renamed'
+        self.listing.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['listing_title'], 'Renamed')
+
+    @override_settings(PAGINATION_COUNT_CACHE_THRESHOLD=1)
+    def test_cached_list_aggregate_follows_writes(self):
+        """Закэшированный COUNT / ETag списка сбрасывается записью бронирования"""
+        cache.clear()
+        url = reverse('bookings-list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(response.data['count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second = Booking.objects.create(
+                listing=self.listing,
+                tenant=self.tenant,
+                start_date=date.today() + timedelta(days=10),
+                end_date=date.today() + timedelta(days=12)
+            )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(len(response.data['results']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        response = self.client.get(url)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.booking.pk])
+
+    def test_etag_is_per_user(self):
+        url = reverse('bookings-list')
+        tenant_etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(user=self.landlord)
+        self.assertNotEqual(self.client.get(url)['ETag'], tenant_etag)
+
+    def test_sparse_fields(self):
+        url = reverse('bookings-list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,status,is_active'})
+        self.assertEqual(response.data['results'], [
+            {'id': self.booking.pk, 'status': Booking.STATUS_PENDING, 'is_active': False}
+        ])
+        # tenant_email не запрошен - JOIN с пользователями не нужен
+        sql = [query['sql'] for query in queries.captured_queries if 'FROM "bookings_booking"' in query['sql']]
+        self.assertTrue(sql)
+        self.assertTrue(all('users_user' not in query for query in sql))
+
+        response = self.client.get(url, {'exclude': 'tenant_email'})
+        self.assertNotIn('tenant_email', response.data['results'][0])
+        self.assertEqual(response.data['results'][0]['listing_title'], 'Conditional booking')
+
+    @override_settings(EXPORT_CHUNK_SIZE=1)
+    def test_export_scoped_to_user(self):
+        other_tenant = User.objects.create_user(
+            username='othertenant', email='othertenant@test.com', password='pass123', user_type='tenant'
+        )
+        second = Booking.objects.create(
+            listing=self.listing,
+            tenant=self.tenant,
+            start_date=date.today() + timedelta(days=10),
+            end_date=date.today() + timedelta(days=12)
+        )
+        Booking.objects.create(
+            listing=self.listing,
+            tenant=other_tenant,
+            start_date=date.today() + timedelta(days=20),
+            end_date=date.today() + timedelta(days=22)
+        )
+        response = self.client.get(reverse('bookings-export'), {'file_format': 'ndjson'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.booking.pk, second.pk])
+        self.assertEqual(rows[0]['tenant_email'], 'etagtenant@test.com')
+
+        # Арендодатель выгружает бронирования своих объявлений
+        self.client.force_authenticate(user=self.landlord)
+        response = self.client.get(reverse('bookings-export'))
+        self.assertEqual(len(b''.join(response.streaming_content).decode('utf-8').splitlines()), 4)
+
+
 class BookingModelTest(TestCase):
     def setUp(self):
         self.tenant = User.objects.create_user(
@@ -486,4 +634,369 @@ class BookingModelTest(TestCase):
         )
 
         with self.assertRaises(Exception):
-            booking.full_clean()  # Должна вызвать ValidationError
\ No newline at end of file
+            booking.full_clean()  # Должна вызвать ValidationError
+
+
+class ListingCalendarTest(APITestCase):
+    def setUp(self):
+        self.tenant = User.objects.create_user(
+            username='calendartenant',
+            email='calendartenant@test.com',
+            password='pass123',
+            user_type='tenant'
+        )
+        self.landlord = User.objects.create_user(
+            username='calendarlandlord',
+            email='calendarlandlord@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.listing = Listing.objects.create(
+            title='Calendar listing',
+            description='Test',
+            location='Berlin',
+            city='Berlin',
+            price=100,
+            rooms=2,
+            property_type='apartment',
+            owner=self.landlord,
+            is_active=True
+        )
+        self.today = date.today()
+        self.url = reverse('listings-calendar', kwargs={'pk': self.listing.pk})
+
+    def day(self, offset):
+        return self.today + timedelta(days=offset)
+
+    def statuses(self, **params):
+        response = self.client.get(self.url, {'from': self.day(0), 'to': self.day(10), **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [day['status'] for day in response.data['days']]
+
+    def test_bitmaps_roundtrip(self):
+        first = date(2026, 1, 1)
+        ranges = {'booked': [(first, first + timedelta(days=3)), (date(2026, 1, 7), date(2026, 1, 21))]}
+        first_day, bitmaps = build_bitmaps(ranges)
+        self.assertEqual(first_day, first)
+        # 20 дней - 3 байта
+        self.assertEqual(len(bitmaps['booked']), 3)
+        self.assertEqual(bitmaps['pending'], b'\x00\x00\x00')
+
+        bits = unpack_days(bitmaps['booked'], first_day, date(2025, 12, 30), date(2026, 1, 23))
+        expected = [False] * 2 + [True] * 3 + [False] * 3 + [True] * 14 + [False] * 2
+        self.assertEqual(bits.tolist(), expected)
+        self.assertFalse(unpack_days(b'', None, first, first + timedelta(days=2)).any())
+
+    def test_statuses_follow_bookings_and_blocked_periods(self):
+        self.assertEqual(self.statuses(), ['free'] * 10)
+
+        booking = Booking.objects.create(
+            listing=self.listing, tenant=self.tenant, start_date=self.day(1), end_date=self.day(3)
+        )
+        BlockedPeriod.objects.create(listing=self.listing, start_date=self.day(6), end_date=self.day(8))
+        self.assertEqual(
+            self.statuses(),
+            ['free', 'pending', 'pending', 'free', 'free', 'free', 'blocked', 'blocked', 'free', 'free'],
+        )
+
+        booking.status = Booking.STATUS_APPROVED
+        booking.save()
+        self.assertEqual(self.statuses()[1:4], ['booked', 'booked', 'free'])
+
+        booking.status = Booking.STATUS_CANCELED
+        booking.save()
+        self.assertEqual(self.statuses()[1:3], ['free', 'free'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BlockedPeriod.objects.filter(listing=self.listing).delete()
+        self.assertEqual(self.statuses(), ['free'] * 10)
+
+    def test_status_changes_match_full_rebuild(self):
+        bookings = [
+            Booking.objects.create(
+                listing=self.listing, tenant=self.tenant, start_date=self.day(start), end_date=self.day(start + nights)
+            )
+            for start, nights in ((12, 3), (2, 4), (40, 10), (7, 1))
+        ]
+        bookings[1].status = Booking.STATUS_APPROVED
+        bookings[1].save()
+        bookings[2].status = Booking.STATUS_REJECTED
+        bookings[2].save()
+        # Повторная отмена не снимает дни чужого бронирования на тех же датах
+        bookings[2].status = Booking.STATUS_CANCELED
+        bookings[2].save()
+        Booking.objects.create(
+            listing=self.listing, tenant=self.tenant, start_date=self.day(41), end_date=self.day(43)
+        )
+        bookings[2].save()
+
+        incremental = ListingCalendar.objects.get(listing=self.listing)
+        self.assertEqual(incremental.version, 7)
+        expected = self.statuses(to=self.day(60))
+        rebuild_calendar(self.listing.pk)
+        self.assertEqual(self.statuses(to=self.day(60)), expected)
+        self.assertEqual(expected[41:43], ['pending', 'pending'])
+        self.assertEqual(expected.count('booked'), 4)
+
+    def test_etag_changes_only_with_bookings(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Изменение самого объявления календарь не меняет
+        self.listing.title = 'Renamed'
+        self.listing.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Booking.objects.create(listing=self.listing, tenant=self.tenant, start_date=self.day(1), end_date=self.day(2))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        self.assertEqual(ListingCalendar.objects.get(listing=self.listing).version, 1)
+
+    def test_invalid_period(self):
+        response = self.client.get(self.url, {'from': self.day(5), 'to': self.day(5)})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'from': self.day(0), 'to': self.day(400)})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'from': 'tomorrow'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_blocked_dates_cannot_be_booked(self):
+        self.client.force_authenticate(user=self.landlord)
+        response = self.client.post(reverse('blocked-periods-list'), {
+            'listing': self.listing.pk, 'start_date': self.day(3), 'end_date': self.day(6),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.client.force_authenticate(user=self.tenant)
+        response = self.client.post(reverse('bookings-list'), {
+            'listing': self.listing.pk, 'start_date': self.day(5), 'end_date': self.day(7),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse('listings-list'), {'check_in': self.day(4), 'check_out': self.day(5)})
+        self.assertNotIn(self.listing.pk, [item['id'] for item in response.data['results']])
+        response = self.client.get(reverse('listings-list'), {'check_in': self.day(6), 'check_out': self.day(8)})
+        self.assertIn(self.listing.pk, [item['id'] for item in response.data['results']])
+
+    def test_blocked_period_only_on_own_listing(self):
+        other = User.objects.create_user(
+            username='calendarother', email='calendarother@test.com', password='pass123', user_type='landlord'
+        )
+        self.client.force_authenticate(user=other)
+        response = self.client.post(reverse('blocked-periods-list'), {
+            'listing': self.listing.pk, 'start_date': self.day(3), 'end_date': self.day(6),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(BlockedPeriod.objects.exists())
+
+
+class BookingReservationTest(TransactionTestCase):
+    def setUp(self):
+        self.tenant = User.objects.create_user(
+            username='reservetenant',
+            email='reservetenant@test.com',
+            password='pass123',
+            user_type='tenant'
+        )
+        self.landlord = User.objects.create_user(
+            username='reservelandlord',
+            email='reservelandlord@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.listing = Listing.objects.create(
+            title='Reservation listing',
+            description='Test',
+            location='Berlin',
+            price=100,
+            rooms=2,
+            property_type='apartment',
+            owner=self.landlord,
+            is_active=True
+        )
+
+    def book(self, start, nights, **kwargs):
+        start_date = date.today() + timedelta(days=start)
+        return Booking.objects.create(
+            listing=self.listing, tenant=self.tenant,
+            start_date=start_date, end_date=start_date + timedelta(days=nights), **kwargs
+        )
+
+    def test_overlap_rejected_by_database(self):
+        first = self.book(5, 3)
+        # Мимо проверки сериализатора: ночь 7 уже занята
+        with self.assertRaises(DatesUnavailable):
+            self.book(7, 2)
+        self.assertEqual(list(Booking.objects.values_list('pk', flat=True)), [first.pk])
+        self.assertEqual(OccupiedDay.objects.filter(listing=self.listing).count(), 3)
+
+        # Выезд в день заезда - не пересечение; отменённое бронирование ночи освобождает
+        self.book(8, 2)
+        first.status = Booking.STATUS_CANCELED
+        first.save()
+        self.book(4, 3, status=Booking.STATUS_APPROVED)
+
+    def test_concurrent_requests_book_each_night_once(self):
+        threads, attempts = 8, 6
+        results = []
+        start = threading.Barrier(threads)
+
+        def worker(number):
+            rng = random.Random(number)
+            start.wait()
+            try:
+                for _ in range(attempts):
+                    day, nights = rng.randint(1, 20), rng.randint(1, 4)
+                    for _ in range(50):
+                        try:
+                            self.book(day, nights)
+                            results.append(True)
+                        except DatesUnavailable:
+                            results.append(False)
+                        except OperationalError:
+                            # SQLite пускает одного писателя: повторяем, как клиент после 5xx
+                            time.sleep(0.005)
+                            continue
+                        break
+            finally:
+                close_old_connections()
+
+        workers = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertIn(True, results)
+        self.assertEqual(Booking.objects.count(), results.count(True))
+        # Ни одна ночь не продана дважды
+        nights = [
+            day for booking in Booking.objects.filter(listing=self.listing) for day in booking.nights()
+        ]
+        self.assertEqual(len(nights), len(set(nights)))
+        self.assertEqual(OccupiedDay.objects.filter(listing=self.listing).count(), len(nights))
+
+
+class BookingDecisionTest(APITestCase):
+    def setUp(self):
+        self.tenant = User.objects.create_user(
+            username='decidetenant',
+            email='decidetenant@test.com',
+            password='pass123',
+            user_type='tenant'
+        )
+        self.landlord = User.objects.create_user(
+            username='decidelandlord',
+            email='decidelandlord@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.listing = Listing.objects.create(
+            title='Decision listing',
+            description='Test',
+            location='Berlin',
+            price=100,
+            rooms=2,
+            property_type='apartment',
+            owner=self.landlord,
+            is_active=True
+        )
+        self.url = reverse('bookings-decide')
+        self.client.force_authenticate(user=self.landlord)
+
+    def day(self, offset):
+        return date.today() + timedelta(days=offset)
+
+    def book(self, start, end, listing=None):
+        return Booking.objects.create(
+            listing=listing or self.listing, tenant=self.tenant, start_date=self.day(start), end_date=self.day(end)
+        )
+
+    def test_resolve_conflicts_priority(self):
+        created = timezone.now()
+        candidates = [
+            (1, self.day(2), self.day(5), created),
+            (2, self.day(4), self.day(10), created + timedelta(minutes=1)),
+            (3, self.day(10), self.day(12), created + timedelta(minutes=2)),
+            (4, self.day(20), self.day(22), created + timedelta(minutes=3)),
+        ]
+        # Занятое время пересекается само с собой - сливается в [19, 23)
+        taken = [(self.day(19), self.day(21)), (self.day(20), self.day(23))]
+        self.assertEqual(resolve_conflicts(taken, candidates, PRIORITY_FIRST_COME), ([1, 3], [2, 4]))
+        self.assertEqual(resolve_conflicts(taken, candidates, PRIORITY_LONGEST_STAY), ([2, 3], [1, 4]))
+        self.assertEqual(resolve_conflicts([], candidates[2:3]), ([3], []))
+
+    def test_decide_all_pending_for_listing(self):
+        first, second, third = self.book(1, 3), self.book(5, 8), self.book(10, 12)
+        other_listing = Listing.objects.create(
+            title='Other', description='Test', location='Berlin', price=100, rooms=1,
+            property_type='apartment', owner=self.landlord
+        )
+        untouched = self.book(1, 3, listing=other_listing)
+        # Закрыто после заявки
+        BlockedPeriod.objects.create(listing=self.listing, start_date=self.day(6), end_date=self.day(7))
+        updated_at = second.updated_at
+
+        response = self.client.post(self.url, {'listing': self.listing.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'approved': [first.pk, third.pk], 'rejected': [second.pk], 'skipped': []})
+
+        statuses = dict(Booking.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[first.pk], Booking.STATUS_APPROVED)
+        self.assertEqual(statuses[second.pk], Booking.STATUS_REJECTED)
+        self.assertEqual(statuses[untouched.pk], Booking.STATUS_PENDING)
+        second.refresh_from_db()
+        self.assertGreater(second.updated_at, updated_at)
+        # Ночи отклонённой заявки свободны, календарь пересобран
+        self.assertFalse(OccupiedDay.objects.filter(booking=second).exists())
+        days = self.client.get(
+            reverse('listings-calendar', kwargs={'pk': self.listing.pk}), {'from': self.day(1), 'to': self.day(8)}
+        ).data['days']
+        self.assertEqual(
+            [day['status'] for day in days],
+            ['booked', 'booked', 'free', 'free', 'free', 'blocked', 'free'],
+        )
+
+    def test_legacy_overlap_resolved_by_priority(self):
+        short = self.book(1, 4)
+        # Пересечение из данных до уникальности ночей
+        OccupiedDay.objects.filter(booking=short).delete()
+        long = self.book(2, 7)
+
+        response = self.client.post(
+            self.url, {'ids': [short.pk, long.pk, 999999], 'priority': PRIORITY_FIRST_COME}, format='json'
+        )
+        self.assertEqual(response.data, {'approved': [short.pk], 'rejected': [long.pk], 'skipped': [999999]})
+        # Подтверждённая заявка заняла свои ночи
+        self.assertEqual(OccupiedDay.objects.filter(booking=short).count(), 3)
+        self.assertEqual(OccupiedDay.objects.filter(listing=self.listing).count(), 3)
+
+    def test_generations_bumped_after_commit(self):
+        """Поколения кэша сбрасываются после коммита решения, а не внутри транзакции"""
+        booking = self.book(1, 3)
+        names = [AVAILABILITY_GENERATION, BOOKINGS_GENERATION]
+        before = get_generations(names).split('.')
+        with self.captureOnCommitCallbacks() as callbacks:
+            decide_bookings(self.landlord, [booking.pk])
+            self.assertEqual(get_generations(names).split('.'), before)
+        for callback in callbacks:
+            callback()
+        after = get_generations(names).split('.')
+        self.assertTrue(all(new != old for new, old in zip(after, before)))
+
+    def test_only_own_pending_requests(self):
+        other = User.objects.create_user(
+            username='decideother', email='decideother@test.com', password='pass123', user_type='landlord'
+        )
+        booking = self.book(1, 3)
+        self.client.force_authenticate(user=other)
+        response = self.client.post(self.url, {'ids': [booking.pk]}, format='json')
+        self.assertEqual(response.data, {'approved': [], 'rejected': [], 'skipped': [booking.pk]})
+
+        response = self.client.post(self.url, {'ids': [booking.pk], 'listing': self.listing.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.tenant)
+        response = self.client.post(self.url, {'ids': [booking.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, Booking.STATUS_PENDING)
+
@@ -1,7 +1,8 @@
 from rest_framework.routers import DefaultRouter
-from .views import BookingViewSet
+from .views import BlockedPeriodViewSet, BookingViewSet
 
 router = DefaultRouter()
 router.register(r'bookings', BookingViewSet, basename='bookings')
+router.register(r'blocked-periods', BlockedPeriodViewSet, basename='blocked-periods')
 
 urlpatterns = router.urls
\ No newline at end of file
@@ -1,16 +1,43 @@
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from .models import Booking
-from .serializers import BookingSerializer
+from .models import BlockedPeriod, Booking, DatesUnavailable
+from .decisions import decide_bookings
+from .serializers import BlockedPeriodSerializer, BookingDecisionSerializer, BookingSerializer
 from .permissions import IsTenant, IsLandlord
+from listings.cache import BOOKINGS_GENERATION, LISTINGS_GENERATION, get_generations
+from rental_project.conditional import ConditionalGetMixin
+from rental_project.export import ExportMixin
+from rental_project.fieldsets import SparseFieldsetMixin
+from rental_project.pagination import KeysetPagination
 
 
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(SparseFieldsetMixin, ConditionalGetMixin, ExportMixin, viewsets.ModelViewSet):
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    # В ответе название объявления - его изменение тоже меняет ETag
+    list_etag_aggregates = {'listing_updated_at': Max('listing__updated_at')}
+    sparse_required_fields = ('listing__updated_at',)
+    sparse_field_sources = {'is_active': ('status', 'start_date', 'end_date')}
+    export_name = 'bookings'
+
+    def get_etag_parts(self, instance):
+        return (instance.listing.updated_at,)
+
+    def get_etag_context(self):
+        # is_active в ответе зависит от текущей даты
+        return (timezone.now().date(),)
+
+    def get_list_version(self):
+        # Кэш агрегата списка сбрасывается изменением бронирований и объявлений
+        return get_generations([BOOKINGS_GENERATION, LISTINGS_GENERATION])
 
     def get_queryset(self):
         user = self.request.user
@@ -26,16 +53,20 @@ class BookingViewSet(viewsets.ModelViewSet):
         if self.action == "create":
             return [IsAuthenticated(), IsTenant()]
 
-        if self.action in ["approve", "reject", "complete"]:
+        if self.action in ["approve", "reject", "complete", "decide"]:
             return [IsAuthenticated(), IsLandlord()]
 
         return [IsAuthenticated()]
 
     def perform_create(self, serializer):
-        serializer.save(
-            tenant=self.request.user,
-            status=Booking.STATUS_PENDING
-        )
+        try:
+            serializer.save(
+                tenant=self.request.user,
+                status=Booking.STATUS_PENDING
+            )
+        except DatesUnavailable:
+            # Параллельный запрос занял даты после проверки в validate()
+            raise ValidationError("These dates are not available")
 
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
@@ -47,34 +78,67 @@ class BookingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        if booking.status != Booking.STATUS_PENDING:
-            return Response(
-                {"detail": f"Booking is already {booking.status}"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        # Проверяем нет ли пересечений с другими approved бронированиями
-        overlapping = Booking.objects.filter(
-            listing=booking.listing,
-            status=Booking.STATUS_APPROVED,
-            start_date__lt=booking.end_date,
-            end_date__gt=booking.start_date
-        ).exclude(id=booking.id)
-
-        if overlapping.exists():
-            return Response(
-                {"detail": "Dates conflict with existing approved booking"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        booking.status = Booking.STATUS_APPROVED
-        booking.save()
+        with transaction.atomic():
+            # Статус перечитывается под блокировкой: параллельная отмена или
+            # второе подтверждение ждут, а не перезаписывают друг друга
+            booking = Booking.objects.select_for_update().get(pk=booking.pk)
+            if booking.status != Booking.STATUS_PENDING:
+                return Response(
+                    {"detail": f"Booking is already {booking.status}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # Проверяем нет ли пересечений с другими approved бронированиями
+            overlapping = Booking.objects.filter(
+                listing_id=booking.listing_id,
+                status=Booking.STATUS_APPROVED,
+                start_date__lt=booking.end_date,
+                end_date__gt=booking.start_date
+            ).exclude(id=booking.id)
+
+            if overlapping.exists():
+                return Response(
+                    {"detail": "Dates conflict with existing approved booking"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            booking.status = Booking.STATUS_APPROVED
+            try:
+                booking.save()
+            except DatesUnavailable:
+                return Response(
+                    {"detail": "Dates conflict with existing approved booking"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
         return Response(
             {"detail": "Booking approved"},
             status=status.HTTP_200_OK
         )
 
+    @action(detail=False, methods=['post'])
+    def decide(self, request):
+        """
+        Массовое подтверждение заявок: {"ids": [...]} или {"listing": id} (все
+        его pending), "priority": first_come | longest_stay. Пересекающиеся
+        с подтверждёнными и закрытыми датами заявки отклоняются
+        """
+        serializer = BookingDecisionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = decide_bookings(
+                request.user,
+                booking_ids=serializer.validated_data.get('ids'),
+                listing_id=serializer.validated_data.get('listing'),
+                priority=serializer.validated_data.get('priority'),
+            )
+        except DatesUnavailable:
+            return Response(
+                {"detail": "Dates conflict with existing bookings"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(result, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
         """Пометить бронирование как завершённое (для отзывов)"""
@@ -141,4 +205,19 @@ class BookingViewSet(viewsets.ModelViewSet):
         return Response(
             {"detail": "Booking canceled"},
             status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        )
+
+
+class BlockedPeriodViewSet(viewsets.ModelViewSet):
+    """Даты, закрытые арендодателем на своих объявлениях (?listing= - одного объявления)"""
+    serializer_class = BlockedPeriodSerializer
+    permission_classes = [IsAuthenticated, IsLandlord]
+
+    def get_queryset(self):
+        queryset = BlockedPeriod.objects.filter(listing__owner=self.request.user).order_by('start_date', 'id')
+        listing = self.request.query_params.get('listing')
+        if listing:
+            if not listing.isdigit():
+                return queryset.none()
+            queryset = queryset.filter(listing_id=listing)
+        return queryset
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Listing, ListingImage, SearchHistory, ViewHistory
+from .models import Listing, ListingImage, Location, SavedSearch, SearchHistory, ViewHistory
 
 @admin.register(Listing)
 class ListingAdmin(admin.ModelAdmin):
@@ -10,8 +10,15 @@ class ListingAdmin(admin.ModelAdmin):
 
 @admin.register(ListingImage)
 class ListingImageAdmin(admin.ModelAdmin):
-    list_display = ('listing', 'image', 'is_main')
-    list_filter = ('is_main',)
+    list_display = ('listing', 'image', 'is_main', 'status')
+    list_filter = ('is_main', 'status')
 
 admin.site.register(SearchHistory)
-admin.site.register(ViewHistory)
\ No newline at end of file
+admin.site.register(SavedSearch)
+admin.site.register(ViewHistory)
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ('name', 'kind', 'canonical_name')
+    list_filter = ('kind',)
+    search_fields = ('name', 'canonical_name')
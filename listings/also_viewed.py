@@ -0,0 +1,156 @@
+"""
+«Смотрели также» (/listings/{id}/also-viewed/) по ViewHistory.
+
+Строка матрицы совместных просмотров C = X^T X (X - разреженная матрица
+пользователь x объявление) для объявления a - сколько пользователей,
+смотревших a, смотрели и b. Строки считаются пачками в NumPy без
+SciPy: просмотры пользователей в виде CSR (отсортированные массивы и
+смещения групп), пары собираются векторной «рваной» выборкой, счётчики -
+np.unique по упакованному ключу пары. Оценка - косинус
+C[a, b] / sqrt(n_a * n_b), где n - число разных зрителей
+(Listing.views_count), чтобы в соседях не оказывались просто самые
+популярные объявления. Для каждого объявления хранится топ
+ALSO_VIEWED_STORED в ListingNeighbours.
+
+manage.py refresh_also_viewed (по расписанию) дочитывает ViewHistory
+после последнего обработанного id и пересчитывает только затронутые
+строки: объявления с новыми просмотрами и всё, что смотрели их зрители.
+Неактивные и удалённые объявления отбрасываются при чтении.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+
+from .cache import get_cache
+from .models import Listing, ListingNeighbours, ViewHistory
+
+ALSO_VIEWED_LIMIT = 10
+ALSO_VIEWED_STORED = 30
+# Сколько строк матрицы считается за раз
+ALSO_VIEWED_BATCH = 1000
+# Учитываются последние просмотры пользователя: у ботов и «листающих всё
+# подряд» история огромная, а сигнала в ней мало
+MAX_USER_VIEWS = 200
+QUERY_CHUNK = 5000
+LAST_VIEW_KEY = 'listings:also-viewed:last-view-id'
+
+
+def get_neighbour_ids(listing_id):
+    """Соседи объявления по убыванию оценки (в том числе неактивные)"""
+    row = ListingNeighbours.objects.filter(listing_id=listing_id).values_list('neighbours', flat=True).first()
+    if row is None:
+        return []
+    return np.frombuffer(bytes(row), dtype=np.int64).tolist()
+
+
+def refresh_neighbours(full=False):
+    """
+    Пересчитывает соседей по новым просмотрам (full - все). Возвращает число
+    пересчитанных объявлений. Без отметки о прошлом запуске (первый запуск,
+    кэш очищен) пересчитывается всё
+    """
+    cache = get_cache()
+    last_view_id = ViewHistory.objects.aggregate(last=Max('id'))['last'] or 0
+    since = None if full else cache.get(LAST_VIEW_KEY)
+    if since is None:
+        targets = set(ViewHistory.objects.values_list('listing_id', flat=True).distinct())
+        # Объявления без просмотров (пользователи удалены) соседей не имеют
+        stale = sorted(set(ListingNeighbours.objects.values_list('listing_id', flat=True)) - targets)
+        for chunk in _chunks(stale):
+            ListingNeighbours.objects.filter(listing_id__in=chunk).delete()
+    else:
+        new = list(ViewHistory.objects.filter(id__gt=since, id__lte=last_view_id).values_list('user_id', 'listing_id'))
+        targets = {listing_id for _, listing_id in new}
+        users = sorted({user_id for user_id, _ in new})
+        for chunk in _chunks(users):
+            targets.update(ViewHistory.objects.filter(user_id__in=chunk).values_list('listing_id', flat=True))
+
+    targets = sorted(targets)
+    for start in range(0, len(targets), ALSO_VIEWED_BATCH):
+        batch = targets[start:start + ALSO_VIEWED_BATCH]
+        store_neighbours(batch, compute_neighbours(batch))
+    cache.set(LAST_VIEW_KEY, last_view_id, None)
+    return len(targets)
+
+
+def compute_neighbours(listing_ids, limit=ALSO_VIEWED_STORED):
+    """{listing_id: (id соседей, оценки)} - строки C для listing_ids по всей ViewHistory"""
+    targets = _fetch(ViewHistory.objects.values_list('user_id', 'listing_id'), 'listing_id', listing_ids, 2)
+    if not len(targets):
+        return {}
+    views = _fetch(ViewHistory.objects.values_list('user_id', 'listing_id', 'id'), 'user_id',
+                   np.unique(targets[:, 0]).tolist(), 3)
+
+    # CSR по пользователям: свежие просмотры первыми, не больше MAX_USER_VIEWS
+    views = views[np.lexsort((-views[:, 2], views[:, 0]))]
+    users, starts, counts = np.unique(views[:, 0], return_index=True, return_counts=True)
+    rank = np.arange(len(views)) - np.repeat(starts, counts)
+    views = views[rank < MAX_USER_VIEWS]
+    users, starts, counts = np.unique(views[:, 0], return_index=True, return_counts=True)
+
+    # Каждый (пользователь, объявление-цель) x все объявления этого пользователя
+    group = np.searchsorted(users, targets[:, 0])
+    degree = counts[group]
+    offsets = np.arange(degree.sum()) - np.repeat(np.cumsum(degree) - degree, degree)
+    others = views[np.repeat(starts[group], degree) + offsets, 1]
+    owners = np.repeat(targets[:, 1], degree)
+    distinct = others != owners
+    # Пара упакована в один int64 (id объявлений < 2^32)
+    keys = (owners[distinct] << 32) | others[distinct]
+    keys, together = np.unique(keys, return_counts=True)
+    owners, others = keys >> 32, keys & 0xFFFFFFFF
+
+    # Косинус по числу зрителей; удалённые объявления выпадают
+    ids = np.union1d(owners, others)
+    viewers = dict(_fetch_pairs(Listing.objects.values_list('pk', 'views_count'), 'pk', ids.tolist()))
+    known = np.array([pk in viewers for pk in ids.tolist()], dtype=bool)
+    ids = ids[known]
+    totals = np.array([max(viewers[pk], 1) for pk in ids.tolist()], dtype=np.float64)
+    present = np.isin(owners, ids) & np.isin(others, ids)
+    owners, others, together = owners[present], others[present], together[present]
+    scores = together / np.sqrt(totals[np.searchsorted(ids, owners)] * totals[np.searchsorted(ids, others)])
+
+    # Топ limit в каждой строке: по строке, внутри - по убыванию оценки
+    order = np.lexsort((others, -scores, owners))
+    owners, others, scores = owners[order], others[order], scores[order]
+    _, starts, counts = np.unique(owners, return_index=True, return_counts=True)
+    keep = (np.arange(len(owners)) - np.repeat(starts, counts)) < limit
+    owners, others, scores = owners[keep], others[keep], scores[keep]
+    bounds = np.flatnonzero(np.diff(owners)) + 1
+    result = {}
+    for row_owners, row_others, row_scores in zip(
+        np.split(owners, bounds), np.split(others, bounds), np.split(scores, bounds)
+    ):
+        if len(row_owners):
+            result[int(row_owners[0])] = (row_others, row_scores.astype(np.float32))
+    return result
+
+
+def store_neighbours(listing_ids, neighbours):
+    """Заменяет строки listing_ids; у объявлений без соседей строка удаляется"""
+    with transaction.atomic():
+        ListingNeighbours.objects.filter(listing_id__in=listing_ids).delete()
+        # Объявление могло быть удалено, пока считали
+        existing = set(Listing.objects.filter(pk__in=list(neighbours)).values_list('pk', flat=True))
+        ListingNeighbours.objects.bulk_create([
+            ListingNeighbours(listing_id=pk, neighbours=ids.astype(np.int64).tobytes(), scores=scores.tobytes())
+            for pk, (ids, scores) in neighbours.items() if pk in existing
+        ], batch_size=500)
+
+
+def _chunks(values, size=QUERY_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _fetch(queryset, field, values, width):
+    """Строки values_list с field__in=values (кусками) одним массивом int64"""
+    rows = []
+    for chunk in _chunks(list(values)):
+        rows.extend(queryset.filter(**{f'{field}__in': chunk}))
+    return np.array(rows, dtype=np.int64).reshape(-1, width)
+
+
+def _fetch_pairs(queryset, field, values):
+    for chunk in _chunks(list(values)):
+        yield from queryset.filter(**{f'{field}__in': chunk})
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ListingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'listings'
+
+    def ready(self):
+        from rental_project.images import KIND_LISTING, image_processor
+        from . import signals  # noqa: F401
+        from .main_images import touch_listings_with_image
+        from .models import ListingImage
+        image_processor.register(ListingImage, 'image', 'status', KIND_LISTING, on_update=touch_listings_with_image)
@@ -0,0 +1,266 @@
+"""
+Массовая загрузка объявлений арендодателя (POST /listings/bulk/).
+
+Файл CSV или NDJSON читается построчно: Django держит крупную загрузку
+во временном файле, в памяти - только текущая пачка из BULK_BATCH_SIZE
+строк. Строки проверяются ListingCreateSerializer и пишутся через
+bulk_create / bulk_update, каждая пачка - в своей транзакции. Строка с
+external_ref, который у арендодателя уже есть, обновляет объявление
+(upsert, передаются только меняющиеся поля).
+
+bulk_create / bulk_update не вызывают Listing.save() и сигналы, поэтому
+локации, geohash, поисковый индекс, статистика цен, индекс похожих,
+сохранённые поиски и кэши обновляются здесь же.
+"""
+import codecs
+import csv
+import json
+import os
+import uuid
+
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from .cache import invalidate_listings
+from .geo import encode_geohash
+from .locations import normalize_location_name
+from .models import Listing, Location
+from .price_stats import PriceStatsUpdater
+from .saved_searches import schedule_matching
+from .search import get_search_backend
+from .serializers import ListingCreateSerializer
+from .similar import similar_index
+
+BULK_BATCH_SIZE = 500
+# Временный external_ref строки без него, пока дочитываются id (MySQL)
+IMPORT_MARKER_PREFIX = 'bulk-import:'
+# Ошибки сверх лимита только считаются - отчёт не растёт с размером файла
+MAX_REPORTED_ERRORS = 1000
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+FILE_FORMATS = (FORMAT_CSV, FORMAT_NDJSON)
+FILE_EXTENSIONS = {'.csv': FORMAT_CSV, '.ndjson': FORMAT_NDJSON, '.jsonl': FORMAT_NDJSON}
+
+# Колонки, которые пишет bulk_update: всё, кроме ключа, владельца, даты
+# создания, счётчика просмотров (его параллельно увеличивают просмотры)
+# и обложки (её ведут сигналы фото)
+UPDATE_FIELDS = [
+    field.name for field in Listing._meta.concrete_fields
+    if field.name not in ('id', 'owner', 'created_at', 'views_count', 'main_image')
+]
+
+
+class BulkFormatError(Exception):
+    """Файл нельзя дочитать (кодировка, битый CSV): строки после ошибки не обработаны"""
+
+
+def guess_format(filename):
+    return FILE_EXTENSIONS.get(os.path.splitext(filename or '')[1].lower())
+
+
+def read_rows(upload, file_format):
+    """
+    Строки файла по одной: (номер строки, данные, ошибка разбора).
+    Номер - строка данных, начиная с 1 (заголовок CSV не считается)
+    """
+    lines = codecs.iterdecode(upload, 'utf-8-sig')
+    try:
+        if file_format == FORMAT_CSV:
+            yield from _read_csv(lines)
+        else:
+            yield from _read_ndjson(lines)
+    except UnicodeDecodeError:
+        raise BulkFormatError('File must be UTF-8 encoded')
+    except csv.Error as exc:
+        raise BulkFormatError(f'Invalid CSV: {exc}')
+
+
+def _read_csv(lines):
+    for row, data in enumerate(csv.DictReader(lines), start=1):
+        # Пустая ячейка - поле не передано (для нового объявления - значение по умолчанию)
+        yield row, {key: value for key, value in data.items() if key and value not in (None, '')}, None
+
+
+def _read_ndjson(lines):
+    row = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield row, None, {'non_field_errors': ['Invalid JSON']}
+            continue
+        if not isinstance(data, dict):
+            yield row, None, {'non_field_errors': ['Each line must be a JSON object']}
+            continue
+        yield row, data, None
+
+
+def _external_ref(data):
+    value = data.get('external_ref')
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+class ListingImporter:
+    def __init__(self, owner, batch_size=BULK_BATCH_SIZE):
+        self.owner = owner
+        self.batch_size = batch_size
+        self.report = {'created': 0, 'updated': 0, 'failed': 0, 'errors': [], 'errors_truncated': False}
+        self._chunk = []
+        self._chunk_refs = set()
+        self._locations = {}
+        # Сериализаторы переиспользуются: построение полей ModelSerializer
+        # на каждую строку дороже самой проверки. Без request в контексте
+        # external_ref не проверяется по БД - upsert делаем сами
+        self._create_serializer = ListingCreateSerializer()
+        self._update_serializer = ListingCreateSerializer(partial=True)
+
+    def run(self, rows):
+        try:
+            for row, data, error in rows:
+                if error is not None:
+                    self.add_error(row, None, error)
+                    continue
+                ref = _external_ref(data)
+                if ref is not None and ref in self._chunk_refs:
+                    # Повтор external_ref: сначала пишем пачку, тогда строка станет
+                    # обновлением - как если бы строки обрабатывались по одной
+                    self.flush()
+                self._chunk.append((row, data))
+                if ref is not None:
+                    self._chunk_refs.add(ref)
+                if len(self._chunk) >= self.batch_size:
+                    self.flush()
+        except BulkFormatError as exc:
+            self.report['detail'] = str(exc)
+        self.flush()
+        return self.report
+
+    def add_error(self, row, external_ref, errors):
+        self.report['failed'] += 1
+        if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+            self.report['errors'].append({'row': row, 'external_ref': external_ref, 'errors': errors})
+        else:
+            self.report['errors_truncated'] = True
+
+    def flush(self):
+        chunk, self._chunk, self._chunk_refs = self._chunk, [], set()
+        if not chunk:
+            return
+
+        refs = {_external_ref(data) for _, data in chunk} - {None}
+        existing = {}
+        if refs:
+            existing = {
+                listing.external_ref: listing
+                for listing in Listing.objects.filter(owner=self.owner, external_ref__in=refs)
+            }
+
+        created, updated, old_cities = [], [], []
+        for row, data in chunk:
+            ref = _external_ref(data)
+            instance = existing.get(ref)
+            serializer = self._create_serializer if instance is None else self._update_serializer
+            try:
+                validated_data = serializer.run_validation(data)
+            except ValidationError as exc:
+                self.add_error(row, ref, as_serializer_error(exc))
+                continue
+            if instance is None:
+                listing = Listing(owner=self.owner, **validated_data)
+                created.append((row, listing))
+            else:
+                old_cities.append(instance.city)
+                listing = instance
+                for name, value in validated_data.items():
+                    setattr(listing, name, value)
+                updated.append((row, listing))
+            self.fill_derived_fields(listing)
+
+        new = [listing for _, listing in created]
+        changed = [listing for _, listing in updated]
+        try:
+            with transaction.atomic():
+                self.write(new, changed)
+        except IntegrityError:
+            # Тот же external_ref одновременно загрузили другим запросом
+            for row, listing in created + updated:
+                self.add_error(row, listing.external_ref, {
+                    'non_field_errors': ['Conflicting concurrent upload, retry this row']
+                })
+            return
+
+        self.report['created'] += len(new)
+        self.report['updated'] += len(changed)
+        # Карточек новых объявлений в кэше нет - для них сбрасываем только списки городов
+        invalidate_listings(changed, old_cities + [listing.city for listing in new])
+
+    def write(self, new, changed):
+        self.create(new)
+        now = timezone.now()
+        for listing in changed:
+            # auto_now в bulk_update не срабатывает
+            listing.updated_at = now
+        Listing.objects.bulk_update(changed, UPDATE_FIELDS, batch_size=self.batch_size)
+        get_search_backend().index(new + changed)
+        # Статистика цен - одна запись на группу за пачку
+        price_stats = PriceStatsUpdater()
+        for listing in new:
+            price_stats.listing_saved(listing, created=True)
+        for listing in changed:
+            price_stats.listing_saved(listing)
+        price_stats.apply()
+        similar_index.mark_stale({listing.city_location_id for listing in new + changed})
+        # Сохранённые поиски - для новых и включённых этой загрузкой
+        activated = [listing for listing in changed if listing._loaded_values.get('is_active') is False]
+        schedule_matching(listing.pk for listing in new + activated if listing.is_active)
+
+    def create(self, listings):
+        """
+        bulk_create с id у всех новых объявлений. MySQL не возвращает id из
+        bulk_create - они дочитываются по external_ref, а строки без него на
+        время пачки получают уникальную метку, которая снимается в той же
+        транзакции
+        """
+        if not listings:
+            return
+        if connections[Listing.objects.db].features.can_return_rows_from_bulk_insert:
+            Listing.objects.bulk_create(listings, batch_size=self.batch_size)
+            return
+
+        batch = uuid.uuid4().hex
+        marked = [listing for listing in listings if not listing.external_ref]
+        for index, listing in enumerate(marked):
+            listing.external_ref = f'{IMPORT_MARKER_PREFIX}{batch}:{index}'
+        Listing.objects.bulk_create(listings, batch_size=self.batch_size)
+
+        by_ref = {listing.external_ref: listing for listing in listings}
+        rows = Listing.objects.filter(owner=self.owner, external_ref__in=list(by_ref)).values_list('external_ref', 'pk')
+        for ref, pk in rows:
+            by_ref[ref].pk = pk
+        if marked:
+            Listing.objects.filter(pk__in=[listing.pk for listing in marked]).update(external_ref=None)
+            for listing in marked:
+                listing.external_ref = None
+
+    def fill_derived_fields(self, listing):
+        """То же, что делает Listing.save(): локации и geohash"""
+        listing.city_location = self.get_location(Location.KIND_CITY, listing.city)
+        listing.district_location = self.get_location(Location.KIND_DISTRICT, listing.district)
+        if listing.latitude is not None and listing.longitude is not None:
+            listing.geohash = encode_geohash(listing.latitude, listing.longitude)
+        else:
+            listing.geohash = ''
+
+    def get_location(self, kind, name):
+        key = (kind, normalize_location_name(name))
+        if key not in self._locations:
+            self._locations[key] = Location.get_for_name(kind, name) if key[1] else None
+        return self._locations[key]
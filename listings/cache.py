@@ -0,0 +1,115 @@
+"""
+Кэш для объявлений.
+
+Инвалидация через поколения: в ключ входит номер поколения, при
+изменении объявлений номер увеличивается и старые ключи просто
+перестают читаться (и вытесняются по TTL).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .locations import normalize_location_name
+
+LISTINGS_GENERATION = 'listings'
+# Занятость дат (бронирования) - влияет на выдачу с ?check_in/?check_out
+AVAILABILITY_GENERATION = 'availability'
+# Версии данных списков бронирований и отзывов: ключ кэша их COUNT / ETag
+BOOKINGS_GENERATION = 'bookings'
+REVIEWS_GENERATION = 'reviews'
+
+
+def get_cache():
+    return caches[getattr(settings, 'LISTINGS_CACHE_ALIAS', 'default')]
+
+
+def get_generations(names):
+    """Номера нескольких поколений за один запрос к кэшу, в виде строки для ключа"""
+    cache = get_cache()
+    keys = [f'generation:{name}' for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            initial = _initial_generation()
+            cache.add(key, initial, None)
+            found[key] = cache.get(key, initial)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+def listing_generation(pk):
+    return f'listing:{pk}'
+
+
+def city_generation(city):
+    return f'city:{normalize_location_name(city)}'
+
+
+def list_generations(query_params):
+    """
+    Поколения, от которых зависит выдача списка с такими параметрами.
+    Список по конкретным городам меняется только при изменении объявлений
+    этих городов, остальные - при любом изменении объявлений
+    """
+    cities = [city for city in query_params.get('city', '').split(',') if normalize_location_name(city)]
+    if cities and query_params.get('location_match', 'exact') == 'exact':
+        names = sorted({city_generation(city) for city in cities})
+    else:
+        names = [LISTINGS_GENERATION]
+    if query_params.get('check_in') or query_params.get('check_out'):
+        names.append(AVAILABILITY_GENERATION)
+    return names
+
+
+def bump_generation(name):
+    cache = get_cache()
+    key = f'generation:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Ключа нет (вытеснен или ещё не создан)
+        cache.set(key, _initial_generation(), None)
+
+
+def _initial_generation():
+    """
+    Начальный номер поколения - время в мс, а не 1: если ключ поколения
+    вытеснили из кэша, новый номер не совпадёт ни с одним из прошлых и
+    старые записи не прочитаются
+    """
+    return int(time.time() * 1000)
+
+
+def invalidate_listing(listing, old_city=None):
+    """Сбрасывает кэши, в которые могло попасть объявление (в т.ч. по старому городу)"""
+    invalidate_listings([listing], [old_city])
+
+
+def invalidate_listings(listings, old_cities=()):
+    """То же для пачки объявлений (массовая загрузка): каждое поколение сбрасывается один раз"""
+    bump_generation(LISTINGS_GENERATION)
+    cities = {normalize_location_name(city) for city in old_cities}
+    for listing in listings:
+        if listing.pk is not None:
+            bump_generation(listing_generation(listing.pk))
+        cities.add(normalize_location_name(listing.city))
+    for city in cities - {''}:
+        bump_generation(city_generation(city))
+
+
+def normalize_params(query_params, ignore=()):
+    """Параметры запроса в каноническом виде: порядок ключей и значений не важен"""
+    items = []
+    for key in sorted(query_params.keys()):
+        if key in ignore:
+            continue
+        values = sorted(value.strip() for value in query_params.getlist(key) if value.strip())
+        if values:
+            items.append(f'{key}={",".join(values)}')
+    return '&'.join(items)
+
+
+def make_key(prefix, generation, *parts):
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'{prefix}:{generation}:{digest}'
@@ -0,0 +1,60 @@
+"""
+Счётчики фасетов для /listings/facets/.
+
+Все фасеты считаются одним GROUP BY по комбинации
+(property_type, город, комнаты, ценовой диапазон), дальше суммируются
+в Python - количество групп мало по сравнению с числом объявлений.
+"""
+from collections import Counter
+
+from django.db.models import Case, CharField, Count, Value, When
+
+# Верхние границы ценовых диапазонов (€), последний диапазон открытый
+PRICE_BANDS = (50, 100, 200, 500, 1000)
+
+
+def price_band_labels():
+    bounds = (0,) + PRICE_BANDS
+    labels = [f'{low}-{high}' for low, high in zip(bounds, bounds[1:])]
+    return labels + [f'{PRICE_BANDS[-1]}+']
+
+
+def price_band_expression():
+    labels = price_band_labels()
+    return Case(
+        *[When(price__lt=bound, then=Value(label)) for bound, label in zip(PRICE_BANDS, labels)],
+        default=Value(labels[-1]),
+        output_field=CharField(),
+    )
+
+
+def compute_facets(queryset):
+    rows = (
+        queryset.order_by()
+        .annotate(price_band=price_band_expression())
+        .values('property_type', 'city_location__name', 'rooms', 'price_band')
+        .annotate(count=Count('id'))
+    )
+
+    total = 0
+    facets = {name: Counter() for name in ('property_type', 'city', 'rooms', 'price_band')}
+    for row in rows:
+        count = row['count']
+        total += count
+        facets['property_type'][row['property_type']] += count
+        facets['city'][row['city_location__name']] += count
+        facets['rooms'][row['rooms']] += count
+        facets['price_band'][row['price_band']] += count
+
+    band_order = {label: index for index, label in enumerate(price_band_labels())}
+    return {
+        'total': total,
+        'property_type': _as_list(facets['property_type'].most_common()),
+        'city': _as_list(facets['city'].most_common()),
+        'rooms': _as_list(sorted(facets['rooms'].items())),
+        'price_band': _as_list(sorted(facets['price_band'].items(), key=lambda item: band_order[item[0]])),
+    }
+
+
+def _as_list(items):
+    return [{'value': value, 'count': count} for value, count in items]
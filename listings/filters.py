@@ -1,5 +1,17 @@
+from datetime import timedelta
+
 import django_filters
-from .models import Listing
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from bookings.models import BlockedPeriod, OccupiedDay
+
+from .locations import location_lookup
+from .models import Listing, Location
+from .search import get_search_backend
+
+LOCATION_MATCH_EXACT = 'exact'
+LOCATION_MATCH_CONTAINS = 'contains'
 
 
 class ListingFilter(django_filters.FilterSet):
@@ -7,12 +19,73 @@ class ListingFilter(django_filters.FilterSet):
     max_price = django_filters.NumberFilter(field_name="price", lookup_expr='lte')
     min_rooms = django_filters.NumberFilter(field_name="rooms", lookup_expr='gte')
     max_rooms = django_filters.NumberFilter(field_name="rooms", lookup_expr='lte')
-    city = django_filters.CharFilter(field_name="city", lookup_expr='icontains')
-    district = django_filters.CharFilter(field_name="district", lookup_expr='icontains')
+    # ?city=Berlin,Hamburg - точное совпадение по каноническому имени (индекс),
+    # ?location_match=contains - старый поиск подстроки через icontains
+    city = django_filters.CharFilter(method='filter_city')
+    district = django_filters.CharFilter(method='filter_district')
+    location_match = django_filters.ChoiceFilter(
+        choices=[
+            (LOCATION_MATCH_EXACT, 'Exact'),
+            (LOCATION_MATCH_CONTAINS, 'Contains'),
+        ],
+        method='filter_location_match'
+    )
+    # Свободные на весь период [check_in, check_out) объявления (без
+    # бронирований и закрытых арендодателем дат)
+    check_in = django_filters.DateFilter(method='filter_availability')
+    check_out = django_filters.DateFilter(method='filter_availability')
     property_type = django_filters.CharFilter(field_name="property_type")
     is_active = django_filters.BooleanFilter(field_name="is_active")
     owner = django_filters.NumberFilter(field_name="owner__id")
 
     class Meta:
         model = Listing
-        fields = ['city', 'district', 'property_type', 'is_active']
\ No newline at end of file
+        fields = ['city', 'district', 'property_type', 'is_active']
+
+    def filter_city(self, queryset, name, value):
+        return self._filter_location(queryset, Location.KIND_CITY, 'city', value)
+
+    def filter_district(self, queryset, name, value):
+        return self._filter_location(queryset, Location.KIND_DISTRICT, 'district', value)
+
+    def filter_location_match(self, queryset, name, value):
+        # Режим учитывается в filter_city / filter_district
+        return queryset
+
+    def filter_availability(self, queryset, name, value):
+        check_in = self.form.cleaned_data.get('check_in')
+        check_out = self.form.cleaned_data.get('check_out')
+        # Оба параметра обрабатываются за один вызов
+        if name == 'check_out' and check_in:
+            return queryset
+
+        if check_in is None:
+            check_in = check_out - timedelta(days=1)
+        if check_out is None:
+            check_out = check_in + timedelta(days=1)
+        if check_out <= check_in:
+            raise ValidationError({'check_out': 'check_out must be after check_in'})
+
+        queryset = queryset.exclude(id__in=OccupiedDay.listing_ids_between(check_in, check_out))
+        return queryset.exclude(id__in=BlockedPeriod.listing_ids_between(check_in, check_out))
+
+    def _filter_location(self, queryset, kind, field, value):
+        if self.form.cleaned_data.get('location_match') == LOCATION_MATCH_CONTAINS:
+            return queryset.filter(**{f'{field}__icontains': value})
+
+        names = [name for name in value.split(',') if name.strip()]
+        ids = location_lookup.resolve_many(kind, names)
+        return queryset.filter(**{f'{field}_location__in': ids})
+
+
+class ListingSearchFilter(filters.SearchFilter):
+    """
+    ?search= через полнотекстовый индекс вместо OR из icontains.
+    Результаты отсортированы по релевантности, если не передан ?ordering=
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return get_search_backend().search(queryset, query)
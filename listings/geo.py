@@ -0,0 +1,167 @@
+"""
+Поиск объявлений по координатам без PostGIS.
+
+В объявлении хранится geohash (precision 12) с индексом. Запрос по
+радиусу или bbox сначала отбирает кандидатов по префиксам geohash
+(диапазонный запрос по индексу) и по диапазону координат, затем точное
+расстояние по формуле гаверсинусов считается в SQL только для этих
+кандидатов. Фильтр по радиусу, сортировка, COUNT и страницы - в том же
+запросе, без ограничения числа результатов.
+"""
+import math
+
+from django.db.models import Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Round, Sin, Sqrt
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 12
+# Максимум ячеек в префильтре: больше - слишком длинный OR в SQL
+MAX_CELLS = 32
+MAX_RADIUS_KM = 500
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(высота, ширина) ячейки geohash в градусах"""
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def covering_cells(min_lat, min_lng, max_lat, max_lng):
+    """Префиксы geohash максимальной точности, покрывающие bbox не более чем MAX_CELLS ячейками"""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor((max_lat + 90) / height) - math.floor((min_lat + 90) / height) + 1
+        columns = math.floor((max_lng + 180) / width) - math.floor((min_lng + 180) / width) + 1
+        if rows * columns <= MAX_CELLS:
+            break
+
+    cells = set()
+    first_row = math.floor((min_lat + 90) / height)
+    first_column = math.floor((min_lng + 180) / width)
+    for row in range(rows):
+        center_lat = min(89.999999, -90 + (first_row + row + 0.5) * height)
+        for column in range(columns):
+            center_lng = min(179.999999, -180 + (first_column + column + 0.5) * width)
+            cells.add(encode_geohash(center_lat, center_lng, precision))
+    return sorted(cells)
+
+
+def cells_filter(cells):
+    """Диапазоны [prefix, prefix + '{') идут по индексу и в MySQL, и в SQLite"""
+    condition = Q()
+    for cell in cells:
+        condition |= Q(geohash__gte=cell, geohash__lt=cell + '{')
+    return condition
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    dlng = min(180.0, math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)))
+    return (
+        max(-90.0, latitude - dlat), max(-180.0, longitude - dlng),
+        min(90.0, latitude + dlat), min(180.0, longitude + dlng),
+    )
+
+
+def filter_bbox(queryset, min_lat, min_lng, max_lat, max_lng):
+    return queryset.filter(
+        cells_filter(covering_cells(min_lat, min_lng, max_lat, max_lng)),
+        latitude__gte=min_lat, latitude__lte=max_lat,
+        longitude__gte=min_lng, longitude__lte=max_lng,
+    )
+
+
+def filter_radius(queryset, latitude, longitude, radius_km):
+    """
+    Объявления в радиусе с аннотацией distance_km, ближайшие первыми.
+    Точное расстояние считается в SQL по кандидатам из bbox: все
+    объявления в радиусе, страницы и COUNT - средствами БД
+    """
+    candidates = filter_bbox(queryset, *radius_bbox(latitude, longitude, radius_km))
+    return candidates.alias(
+        exact_distance_km=haversine_expression(latitude, longitude)
+    ).filter(exact_distance_km__lte=radius_km).annotate(
+        distance_km=Round('exact_distance_km', 3)
+    ).order_by('distance_km', 'id')
+
+
+def haversine_expression(latitude, longitude):
+    """
+    Расстояние по формуле гаверсинусов в SQL - для фильтра по радиусу,
+    сортировки и поля distance_km. Считается только для строк, прошедших
+    префильтр по geohash и диапазону координат
+    """
+    lat1 = math.radians(latitude)
+    lat2 = Radians('latitude')
+    half_dlat = (lat2 - Value(lat1)) / 2
+    half_dlng = (Radians('longitude') - Value(math.radians(longitude))) / 2
+    a = Power(Sin(half_dlat), 2) + Value(math.cos(lat1)) * Cos(lat2) * Power(Sin(half_dlng), 2)
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a))
+
+
+class ListingGeoFilter(BaseFilterBackend):
+    """
+    ?lat=&lng=&radius_km= - объявления в радиусе, отсортированные по расстоянию
+    ?bbox=min_lng,min_lat,max_lng,max_lat - объявления в прямоугольнике карты
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        if params.get('bbox'):
+            queryset = filter_bbox(queryset, *self._parse_bbox(params['bbox']))
+
+        if params.get('lat') or params.get('lng') or params.get('radius_km'):
+            latitude = self._parse_float(params, 'lat', -90, 90)
+            longitude = self._parse_float(params, 'lng', -180, 180)
+            radius_km = self._parse_float(params, 'radius_km', 0, MAX_RADIUS_KM)
+            queryset = filter_radius(queryset, latitude, longitude, radius_km)
+        return queryset
+
+    def _parse_float(self, params, name, low, high):
+        try:
+            value = float(params[name])
+        except (KeyError, ValueError):
+            raise ValidationError({name: 'lat, lng and radius_km must be numbers'})
+        if not low <= value <= high or math.isnan(value):
+            raise ValidationError({name: f'Must be between {low} and {high}'})
+        return value
+
+    def _parse_bbox(self, value):
+        try:
+            min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(','))
+        except ValueError:
+            raise ValidationError({'bbox': 'Expected min_lng,min_lat,max_lng,max_lat'})
+        if not (-180 <= min_lng <= max_lng <= 180 and -90 <= min_lat <= max_lat <= 90):
+            raise ValidationError({'bbox': 'Invalid bounding box'})
+        return min_lat, min_lng, max_lat, max_lng
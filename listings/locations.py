@@ -0,0 +1,76 @@
+"""
+Нормализованные города и районы.
+
+Название приводится к каноническому виду (casefold, без диакритики,
+без пунктуации), по нему ищется Location. Фильтры объявлений работают
+через таблицу canonical_name -> id в памяти процесса и индексный
+запрос city_location_id IN (...) вместо icontains.
+"""
+import re
+import threading
+import unicodedata
+
+_NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize_location_name(value):
+    """'  Neukölln ' -> 'neukolln', 'St. Pauli' -> 'st pauli', 'Straße' -> 'strasse'"""
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', value.casefold())
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return _NON_WORD_RE.sub(' ', value).strip()
+
+
+class LocationLookup:
+    """
+    Таблица (kind, canonical_name) -> id в памяти процесса.
+
+    Загружается целиком при первом обращении и сбрасывается при создании
+    новой Location (сигнал). Промах идёт одним индексным запросом в БД -
+    так процесс узнаёт о городах, созданных другими воркерами.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._table = None
+
+    def clear(self):
+        with self._lock:
+            self._table = None
+
+    def _load(self):
+        from .models import Location
+
+        table = {
+            (kind, canonical): pk
+            for pk, kind, canonical in Location.objects.values_list('pk', 'kind', 'canonical_name')
+        }
+        with self._lock:
+            self._table = table
+        return table
+
+    def resolve(self, kind, value):
+        """id локации по пользовательскому вводу или None"""
+        from .models import Location
+
+        canonical = normalize_location_name(value)
+        if not canonical:
+            return None
+        table = self._table if self._table is not None else self._load()
+        pk = table.get((kind, canonical))
+        if pk is None:
+            pk = Location.objects.filter(kind=kind, canonical_name=canonical).values_list(
+                'pk', flat=True
+            ).first()
+            if pk is not None:
+                with self._lock:
+                    table[(kind, canonical)] = pk
+        return pk
+
+    def resolve_many(self, kind, values):
+        ids = (self.resolve(kind, value) for value in values)
+        return [pk for pk in ids if pk is not None]
+
+
+location_lookup = LocationLookup()
@@ -0,0 +1,53 @@
+"""
+Обложка объявления: Listing.main_image - денормализованная ссылка на фото.
+
+Спискам нужна одна обложка на объявление; вместо prefetch всех фото
+страницы ответ читает её одним JOIN (или колонками values() быстрого
+пути). Обложка - фото с is_main, иначе первое загруженное. Ссылку
+обновляют сигналы ListingImage (сохранение, удаление, смена is_main) и
+завершение обработки фото; расхождения после ручных правок в БД
+чинит manage.py repair_main_images.
+"""
+from django.utils import timezone
+
+from .cache import invalidate_listings
+from .models import Listing, ListingImage
+
+
+def pick_main_images(listing_ids):
+    """{id объявления: id обложки или None}"""
+    main = dict.fromkeys(listing_ids)
+    rows = (
+        ListingImage.objects.filter(listing_id__in=listing_ids)
+        .order_by('listing_id', '-is_main', 'id')
+        .values_list('listing_id', 'pk')
+    )
+    seen = set()
+    for listing_id, image_id in rows:
+        if listing_id not in seen:
+            seen.add(listing_id)
+            main[listing_id] = image_id
+    return main
+
+
+def update_main_images(listing_ids):
+    """Проставляет обложки объявлениям listing_ids; возвращает число изменённых"""
+    expected = pick_main_images(listing_ids)
+    changed = []
+    now = timezone.now()
+    for pk, main_image_id, city in Listing.objects.filter(pk__in=listing_ids).values_list('pk', 'main_image_id', 'city'):
+        if main_image_id != expected[pk]:
+            # Обложка входит в ответ - updated_at меняем ради ETag / Last-Modified
+            changed.append(Listing(pk=pk, main_image_id=expected[pk], updated_at=now, city=city))
+    if changed:
+        Listing.objects.bulk_update(changed, ['main_image', 'updated_at'])
+        invalidate_listings(changed)
+    return len(changed)
+
+
+def touch_listings_with_image(name):
+    """Фото обработано (статус и варианты в ответе изменились) - сбрасываем объявления с этой обложкой"""
+    listings = list(Listing.objects.filter(main_image__image=name).only('pk', 'city'))
+    if listings:
+        Listing.objects.filter(pk__in=[listing.pk for listing in listings]).update(updated_at=timezone.now())
+        invalidate_listings(listings)
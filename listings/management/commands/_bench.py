@@ -0,0 +1,141 @@
+"""
+Общие помощники для benchmark-команд.
+
+Бенчмарки генерируют синтетические объявления от имени временного
+пользователя и удаляют их в конце (если не передан --keep).
+Запускать стоит на отдельной (scratch) базе.
+"""
+import random
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from django.db import connection, transaction
+
+from listings.geo import encode_geohash
+from listings.models import Listing, Location
+from users.models import User
+
+WORDS = (
+    'bright', 'spacious', 'cozy', 'modern', 'renovated', 'quiet', 'central',
+    'balcony', 'garden', 'terrace', 'parking', 'furnished', 'loft', 'view',
+    'river', 'park', 'station', 'family', 'student', 'penthouse', 'garage',
+    'kitchen', 'bathroom', 'elevator', 'fireplace', 'pool', 'sauna', 'attic',
+)
+CITIES = {
+    'Berlin': ['Mitte', 'Kreuzberg', 'Neukölln', 'Pankow', 'Charlottenburg'],
+    'Hamburg': ['Altona', 'Eimsbüttel', 'St. Pauli', 'Harburg'],
+    'München': ['Schwabing', 'Maxvorstadt', 'Sendling', 'Bogenhausen'],
+    'Köln': ['Ehrenfeld', 'Deutz', 'Nippes', 'Lindenthal'],
+    'Leipzig': ['Plagwitz', 'Gohlis', 'Connewitz'],
+}
+# Центры городов: координаты объявлений разбрасываются вокруг них
+CITY_CENTERS = {
+    'Berlin': (52.5200, 13.4050),
+    'Hamburg': (53.5511, 9.9937),
+    'München': (48.1351, 11.5820),
+    'Köln': (50.9375, 6.9603),
+    'Leipzig': (51.3397, 12.3731),
+}
+PROPERTY_TYPES = [code for code, _ in Listing.PROPERTY_TYPES]
+SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'te', 'vi', 'do', 'ber', 'lin', 'hau', 'gar', 'ten')
+
+
+def build_vocabulary(rng, size=3000):
+    """Словарь описаний: частые WORDS + длинный хвост псевдослов (частоты по Ципфу)"""
+    vocabulary = list(WORDS)
+    while len(vocabulary) < size:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in vocabulary:
+            vocabulary.append(word)
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    return vocabulary, weights
+
+
+def create_bench_owner():
+    return User.objects.create_user(
+        username=f'bench_{uuid.uuid4().hex[:12]}',
+        email=f'bench_{uuid.uuid4().hex[:12]}@bench.local',
+        password=uuid.uuid4().hex,
+        user_type='landlord',
+    )
+
+
+def generate_listings(owner, count, batch_size=5000, seed=42, stdout=None):
+    """Создаёт count синтетических объявлений через bulk_create"""
+    rng = random.Random(seed)
+    cities = list(CITIES)
+    vocabulary, weights = build_vocabulary(rng)
+    # bulk_create не вызывает Listing.save() - локации и geohash проставляем сами
+    city_locations = {city: Location.get_for_name(Location.KIND_CITY, city) for city in cities}
+    district_locations = {
+        district: Location.get_for_name(Location.KIND_DISTRICT, district)
+        for districts in CITIES.values() for district in districts
+    }
+    created = 0
+    while created < count:
+        batch = []
+        for _ in range(min(batch_size, count - created)):
+            city = rng.choice(cities)
+            district = rng.choice(CITIES[city])
+            words = rng.sample(WORDS, 6)
+            center_lat, center_lng = CITY_CENTERS[city]
+            latitude = center_lat + rng.gauss(0, 0.08)
+            longitude = center_lng + rng.gauss(0, 0.12)
+            batch.append(Listing(
+                title=' '.join(words[:3]).capitalize(),
+                description=' '.join(rng.choices(vocabulary, weights, k=40)),
+                location=f'{rng.choice(WORDS).capitalize()}str. {rng.randint(1, 200)}',
+                city=city,
+                district=district,
+                city_location=city_locations[city],
+                district_location=district_locations[district],
+                price=Decimal(rng.randint(3000, 500000)) / 100,
+                rooms=rng.randint(1, 6),
+                property_type=rng.choice(PROPERTY_TYPES),
+                latitude=latitude,
+                longitude=longitude,
+                geohash=encode_geohash(latitude, longitude),
+                is_active=rng.random() > 0.1,
+                owner=owner,
+            ))
+        with transaction.atomic():
+            Listing.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+        if stdout is not None:
+            stdout.write(f'  generated {created}/{count} listings')
+    return created
+
+
+def cleanup_owner(owner):
+    """Удаляет данные бенчмарка без загрузки объектов в память"""
+    listings = 'SELECT id FROM listings_listing WHERE owner_id = %s'
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM bookings_occupiedday WHERE listing_id IN ({listings})', [owner.pk])
+        cursor.execute(f'DELETE FROM bookings_booking WHERE listing_id IN ({listings})', [owner.pk])
+        cursor.execute(f'DELETE FROM bookings_blockedperiod WHERE listing_id IN ({listings})', [owner.pk])
+        cursor.execute(f'DELETE FROM bookings_listingcalendar WHERE listing_id IN ({listings})', [owner.pk])
+        cursor.execute(f'DELETE FROM listings_viewhistory WHERE listing_id IN ({listings})', [owner.pk])
+        cursor.execute(f'DELETE FROM listings_listingviewbucket WHERE listing_id IN ({listings})', [owner.pk])
+        cursor.execute(f'DELETE FROM listings_listingimage WHERE listing_id IN ({listings})', [owner.pk])
+        cursor.execute(f'DELETE FROM listings_listingneighbours WHERE listing_id IN ({listings})', [owner.pk])
+        cursor.execute('DELETE FROM listings_listing WHERE owner_id = %s', [owner.pk])
+    owner.delete()
+
+
+def measure(func, repeat):
+    """Запускает func repeat раз и возвращает (p50, p95, max) в миллисекундах"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return statistics.median(timings), p95, timings[-1]
+
+
+def format_timing(label, timing):
+    p50, p95, worst = timing
+    return f'{label:<28} p50={p50:9.2f}ms  p95={p95:9.2f}ms  max={worst:9.2f}ms'
@@ -0,0 +1,98 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory
+
+from listings.also_viewed import refresh_neighbours
+from listings.models import Listing, ViewHistory
+from listings.views import ListingViewSet
+from users.models import User
+
+from ._bench import cleanup_owner, create_bench_owner, format_timing, generate_listings, measure
+
+
+class Command(BaseCommand):
+    help = '"Also viewed" neighbours: full and incremental co-occurrence refresh, endpoint latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=50_000)
+        parser.add_argument('--users', type=int, default=50_000)
+        parser.add_argument('--views-per-user', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated data')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        prefix = f'bench_viewer_{uuid.uuid4().hex[:8]}_'
+        try:
+            generate_listings(owner, options['listings'], stdout=self.stdout)
+            ids = list(Listing.objects.filter(owner=owner).order_by('pk').values_list('pk', flat=True))
+            users = self._create_users(prefix, options['users'])
+            self._create_views(users, ids, options['views_per_user'])
+            self._run(ids, users, options['repeat'])
+        finally:
+            if not options['keep']:
+                cleanup_owner(owner)
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'DELETE FROM listings_viewhistory WHERE user_id IN '
+                        '(SELECT id FROM users_user WHERE username LIKE %s)', [f'{prefix}%']
+                    )
+                User.objects.filter(username__startswith=prefix).delete()
+
+    def _create_users(self, prefix, count):
+        User.objects.bulk_create(
+            [User(username=f'{prefix}{i}', email=f'{prefix}{i}@bench.local') for i in range(count)],
+            batch_size=5000,
+        )
+        return list(User.objects.filter(username__startswith=prefix).values_list('pk', flat=True))
+
+    def _create_views(self, users, ids, views_per_user, seed=7):
+        """Пользователь смотрит объявления рядом со своим «интересом» - у матрицы есть структура"""
+        rng = random.Random(seed)
+        rows = []
+        for user_id in users:
+            center = rng.randrange(len(ids))
+            window = ids[max(center - 300, 0):center + 300]
+            for listing_id in rng.sample(window, min(len(window), rng.randint(1, 2 * views_per_user))):
+                rows.append(ViewHistory(user_id=user_id, listing_id=listing_id))
+        with transaction.atomic():
+            ViewHistory.objects.bulk_create(rows, batch_size=10000)
+        # Число разных зрителей (его же ведёт write_views)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE listings_listing SET views_count = '
+                '(SELECT COUNT(*) FROM listings_viewhistory v WHERE v.listing_id = listings_listing.id) '
+                'WHERE id IN (SELECT DISTINCT listing_id FROM listings_viewhistory)'
+            )
+        self.stdout.write(f'  {len(rows)} views by {len(users)} users')
+        return rows
+
+    def _run(self, ids, users, repeat):
+        started = time.perf_counter()
+        updated = refresh_neighbours(full=True)
+        self.stdout.write(f'full refresh: {updated} listings in {(time.perf_counter() - started):.1f}s')
+
+        rng = random.Random(3)
+        ViewHistory.objects.bulk_create(
+            [ViewHistory(user_id=rng.choice(users), listing_id=rng.choice(ids)) for _ in range(1000)],
+            ignore_conflicts=True,
+        )
+        started = time.perf_counter()
+        updated = refresh_neighbours()
+        self.stdout.write(f'incremental refresh (1000 new views): {updated} listings in '
+                          f'{(time.perf_counter() - started):.1f}s')
+
+        factory = APIRequestFactory(HTTP_HOST='localhost')
+        view = ListingViewSet.as_view({'get': 'also_viewed'})
+        active = list(Listing.objects.filter(pk__in=ids, is_active=True).values_list('pk', flat=True))
+
+        def endpoint():
+            pk = rng.choice(active)
+            response = view(factory.get(f'/listings/{pk}/also-viewed/'), pk=pk)
+            assert response.status_code == 200, response.status_code
+
+        self.stdout.write(format_timing('endpoint top-10', measure(endpoint, repeat)))
@@ -0,0 +1,102 @@
+import random
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.core.management.base import BaseCommand
+
+from bookings.models import Booking, OccupiedDay
+from listings.models import Listing
+
+from ._bench import (
+    cleanup_owner, create_bench_owner, format_timing, generate_listings, measure,
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare ?check_in&check_out filtering: occupancy rows vs naive NOT EXISTS on bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=100_000)
+        parser.add_argument('--bookings', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated data')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        tenant = create_bench_owner()
+        try:
+            generate_listings(owner, options['listings'], stdout=self.stdout)
+            self._generate_bookings(owner, tenant, options['bookings'])
+            self._run(options['repeat'], options['page_size'])
+        finally:
+            if not options['keep']:
+                cleanup_owner(owner)
+                tenant.delete()
+
+    def _generate_bookings(self, owner, tenant, count, batch_size=5000):
+        rng = random.Random(7)
+        listing_ids = list(Listing.objects.filter(owner=owner).values_list('id', flat=True))
+        statuses = [choice for choice, _ in Booking.STATUS_CHOICES]
+        start = date.today()
+        created = 0
+        while created < count:
+            bookings = []
+            for _ in range(min(batch_size, count - created)):
+                check_in = start + timedelta(days=rng.randint(0, 365))
+                bookings.append(Booking(
+                    listing_id=rng.choice(listing_ids),
+                    tenant=tenant,
+                    start_date=check_in,
+                    end_date=check_in + timedelta(days=rng.randint(1, 14)),
+                    status=rng.choice(statuses),
+                ))
+            with transaction.atomic():
+                # bulk_create не вызывает сигналы - занятые ночи создаём сами.
+                # Пересечения между синтетическими бронированиями не важны для
+                # замера: уже занятая ночь остаётся за первым
+                Booking.objects.bulk_create(bookings, batch_size=batch_size)
+                if bookings[0].pk is None:
+                    # MySQL не возвращает id из bulk_create: строки одного INSERT получают id по порядку
+                    ids = Booking.objects.filter(tenant=tenant).order_by('-id').values_list('id', flat=True)
+                    for booking, pk in zip(bookings, reversed(list(ids[:len(bookings)]))):
+                        booking.pk = pk
+                OccupiedDay.objects.bulk_create(
+                    [
+                        OccupiedDay(listing_id=booking.listing_id, booking_id=booking.id, day=day)
+                        for booking in bookings
+                        if booking.status in Booking.OCCUPYING_STATUSES
+                        for day in booking.nights()
+                    ],
+                    batch_size=batch_size,
+                    ignore_conflicts=True,
+                )
+            created += len(bookings)
+            self.stdout.write(f'  generated {created}/{count} bookings')
+
+    def _run(self, repeat, page_size):
+        base = Listing.objects.filter(is_active=True)
+        for offset, nights in ((3, 2), (30, 7), (120, 14)):
+            check_in = date.today() + timedelta(days=offset)
+            check_out = check_in + timedelta(days=nights)
+
+            def naive_page():
+                overlapping = Booking.objects.filter(
+                    listing=OuterRef('pk'),
+                    status__in=Booking.OCCUPYING_STATUSES,
+                    start_date__lt=check_out,
+                    end_date__gt=check_in,
+                )
+                queryset = base.filter(~Exists(overlapping))
+                queryset.count()
+                list(queryset[:page_size])
+
+            def occupancy_page():
+                queryset = base.exclude(id__in=OccupiedDay.listing_ids_between(check_in, check_out))
+                queryset.count()
+                list(queryset[:page_size])
+
+            self.stdout.write(f'\n{check_in} .. {check_out} ({nights} nights)')
+            self.stdout.write(format_timing('NOT EXISTS (bookings)', measure(naive_page, repeat)))
+            self.stdout.write(format_timing('occupied days', measure(occupancy_page, repeat)))
@@ -0,0 +1,95 @@
+import csv
+import random
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from listings.bulk import FORMAT_CSV, ListingImporter, read_rows
+from listings.serializers import ListingCreateSerializer
+
+from ._bench import CITIES, CITY_CENTERS, PROPERTY_TYPES, WORDS, cleanup_owner, create_bench_owner
+
+COLUMNS = (
+    'external_ref', 'title', 'description', 'location', 'city', 'district',
+    'price', 'rooms', 'property_type', 'latitude', 'longitude',
+)
+
+
+class Command(BaseCommand):
+    help = 'Bulk CSV import: rows/sec and peak memory vs one ListingCreateSerializer.save() per row'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20_000)
+        parser.add_argument('--single-rows', type=int, default=1_000,
+                            help='Rows imported one by one for comparison')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        try:
+            self._run(owner, options['rows'], options['single_rows'])
+        finally:
+            cleanup_owner(owner)
+
+    def _run(self, owner, rows, single_rows):
+        rng = random.Random(42)
+
+        started = time.perf_counter()
+        for data in _generate(rng, single_rows, 'single'):
+            serializer = ListingCreateSerializer(data=data)
+            serializer.is_valid(raise_exception=True)
+            serializer.save(owner=owner)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{"save() per row":<24} {single_rows / elapsed:10,.0f} rows/sec  ({single_rows} rows)')
+
+        with tempfile.TemporaryFile() as upload:
+            _write_csv(upload, _generate(rng, rows, 'bulk'))
+            upload.seek(0)
+            started = time.perf_counter()
+            report = ListingImporter(owner).run(read_rows(upload, FORMAT_CSV))
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{"bulk import":<24} {rows / elapsed:10,.0f} rows/sec  '
+            f'({rows} rows, created={report["created"]}, failed={report["failed"]})'
+        )
+
+        # Память не должна зависеть от размера файла: сравниваем N и 4N строк
+        # (отдельный прогон - tracemalloc сам замедляет импорт)
+        for count in (rows // 4, rows):
+            with tempfile.TemporaryFile() as upload:
+                _write_csv(upload, _generate(rng, count, f'memory{count}'))
+                upload.seek(0)
+                tracemalloc.start()
+                ListingImporter(owner).run(read_rows(upload, FORMAT_CSV))
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            self.stdout.write(f'{"peak memory":<24} {peak / 2 ** 20:10.1f} MiB      ({count} rows)')
+
+
+def _generate(rng, count, prefix):
+    cities = list(CITIES)
+    for index in range(count):
+        city = rng.choice(cities)
+        center_lat, center_lng = CITY_CENTERS[city]
+        words = rng.sample(WORDS, 8)
+        yield {
+            'external_ref': f'{prefix}-{index}',
+            'title': ' '.join(words[:3]).capitalize(),
+            'description': ' '.join(words),
+            'location': f'{rng.choice(WORDS).capitalize()}str. {rng.randint(1, 200)}',
+            'city': city,
+            'district': rng.choice(CITIES[city]),
+            'price': f'{rng.randint(3000, 500000) / 100:.2f}',
+            'rooms': str(rng.randint(1, 6)),
+            'property_type': rng.choice(PROPERTY_TYPES),
+            'latitude': f'{center_lat + rng.gauss(0, 0.08):.6f}',
+            'longitude': f'{center_lng + rng.gauss(0, 0.12):.6f}',
+        }
+
+
+def _write_csv(binary_file, rows):
+    with open(binary_file.fileno(), 'w', encoding='utf-8', newline='', closefd=False) as text:
+        writer = csv.DictWriter(text, COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,89 @@
+import random
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from bookings.calendar import rebuild_calendar
+from bookings.models import Booking
+from listings.models import Listing
+from listings.views import ListingViewSet
+
+from ._bench import cleanup_owner, create_bench_owner, format_timing, generate_listings, measure
+
+
+class Command(BaseCommand):
+    help = 'Availability calendar of one listing: day bitmaps vs reading its bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated data')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        tenant = create_bench_owner()
+        try:
+            generate_listings(owner, 1, stdout=self.stdout)
+            listing = Listing.objects.get(owner=owner)
+            self._generate_bookings(listing, tenant, options['bookings'])
+            self._run(owner, listing, options['days'], options['repeat'])
+        finally:
+            if not options['keep']:
+                cleanup_owner(owner)
+                tenant.delete()
+
+    def _generate_bookings(self, listing, tenant, count):
+        # Годы истории назад и год вперёд; пересечения для замера не важны
+        rng = random.Random(11)
+        today = date.today()
+        bookings = []
+        for _ in range(count):
+            start = today + timedelta(days=rng.randint(-5 * 365, 365))
+            bookings.append(Booking(
+                listing=listing,
+                tenant=tenant,
+                start_date=start,
+                end_date=start + timedelta(days=rng.randint(1, 14)),
+                status=rng.choice([choice for choice, _ in Booking.STATUS_CHOICES]),
+            ))
+        Booking.objects.bulk_create(bookings, batch_size=1000)
+        rebuild_calendar(listing.pk)
+        self.stdout.write(f'  {count} bookings')
+
+    def _run(self, owner, listing, days, repeat):
+        start = date.today() + timedelta(days=30)
+        end = start + timedelta(days=days)
+
+        def from_bookings():
+            # Как раньше делал клиент: все пересекающиеся бронирования и разметка по дням
+            statuses = {}
+            bookings = Booking.objects.filter(
+                listing=listing, start_date__lt=end, end_date__gt=start,
+                status__in=(Booking.STATUS_PENDING, Booking.STATUS_APPROVED, Booking.STATUS_COMPLETED),
+            ).values_list('start_date', 'end_date', 'status')
+            for booking_start, booking_end, status in bookings:
+                day = max(booking_start, start)
+                while day < min(booking_end, end):
+                    if statuses.get(day) != 'booked':
+                        statuses[day] = 'pending' if status == Booking.STATUS_PENDING else 'booked'
+                    day += timedelta(days=1)
+            return [statuses.get(start + timedelta(days=i), 'free') for i in range(days)]
+
+        factory = APIRequestFactory(HTTP_HOST='localhost')
+        view = ListingViewSet.as_view({'get': 'calendar'})
+        params = {'from': start.isoformat(), 'to': end.isoformat()}
+
+        def endpoint(**headers):
+            request = factory.get(f'/listings/{listing.pk}/calendar/', params, **headers)
+            force_authenticate(request, owner)
+            return view(request, pk=listing.pk)
+
+        etag = endpoint()['ETag']
+        self.stdout.write(format_timing('read bookings', measure(from_bookings, repeat)))
+        self.stdout.write(format_timing('rebuild bitmaps', measure(lambda: rebuild_calendar(listing.pk), repeat // 10 or 1)))
+        self.stdout.write(format_timing('calendar endpoint', measure(endpoint, repeat)))
+        self.stdout.write(format_timing('calendar endpoint, 304', measure(
+            lambda: endpoint(HTTP_IF_NONE_MATCH=etag), repeat
+        )))
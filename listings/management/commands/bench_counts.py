@@ -0,0 +1,65 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from listings.models import Listing
+from listings.views import ListingViewSet
+from rental_project.counts import estimate_count
+
+from ._bench import cleanup_owner, create_bench_owner, format_timing, generate_listings, measure
+
+
+class Command(BaseCommand):
+    help = 'List page latency: exact COUNT per request vs cached counts vs table-statistic estimates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=200_000)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated listings')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        try:
+            generate_listings(owner, options['listings'], stdout=self.stdout)
+            self._run(owner, options['repeat'])
+        finally:
+            if not options['keep']:
+                cleanup_owner(owner)
+
+    def _run(self, owner, repeat):
+        factory = APIRequestFactory(HTTP_HOST='localhost')
+        view = ListingViewSet.as_view({'get': 'list'})
+
+        def page(params):
+            request = factory.get('/listings/', params)
+            force_authenticate(request, owner)
+            response = view(request)
+            assert response.status_code == 200, response.status_code
+            return response.data
+
+        queryset = Listing.objects.filter(owner=owner, city='Berlin')
+        self.stdout.write(format_timing('COUNT(*) alone', measure(lambda: queryset.aggregate(Count('pk')), repeat)))
+
+        for label, params in (('all own listings', {}), ('city=Berlin', {'city': 'Berlin'})):
+            with override_settings(PAGINATION_COUNT_CACHE_TIMEOUT=0, PAGINATION_ESTIMATE_THRESHOLD=0):
+                self.stdout.write(format_timing(f'{label}: exact', measure(lambda: page(params), repeat)))
+            cache.clear()
+            page(params)
+            self.stdout.write(format_timing(f'{label}: cached', measure(lambda: page(params), repeat)))
+
+        # Оценка по статистике: ANALYZE обновляет sqlite_stat1 (в MySQL/PostgreSQL - сама СУБД)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        cache.clear()
+        total = Listing.objects.count()
+        with override_settings(PAGINATION_ESTIMATE_THRESHOLD=1000):
+            estimate = estimate_count(Listing.objects.all())
+            self.stdout.write(format_timing('estimate (no filter)', measure(
+                lambda: estimate_count(Listing.objects.all()), repeat
+            )))
+        self.stdout.write(format_timing('exact (no filter)', measure(lambda: Listing.objects.count(), repeat)))
+        self.stdout.write(f'estimate {estimate} vs exact {total}')
@@ -0,0 +1,80 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from bookings.calendar import rebuild_calendar
+from bookings.decisions import decide_bookings
+from bookings.models import BlockedPeriod, Booking, OccupiedDay
+from bookings.views import BookingViewSet
+from listings.models import Listing
+
+from ._bench import cleanup_owner, create_bench_owner, generate_listings
+
+
+class Command(BaseCommand):
+    help = 'Deciding pending requests of a listing: one approve call each vs one bulk decide'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated data')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        tenant = create_bench_owner()
+        try:
+            generate_listings(owner, 2, stdout=self.stdout)
+            one_by_one, bulk = Listing.objects.filter(owner=owner).order_by('pk')
+            for listing in (one_by_one, bulk):
+                self._generate_requests(listing, tenant, options['requests'])
+            self._run(owner, one_by_one, bulk)
+        finally:
+            if not options['keep']:
+                cleanup_owner(owner)
+                tenant.delete()
+
+    def _generate_requests(self, listing, tenant, count):
+        # Бронирования по 2 ночи подряд, каждое пятое уже подтверждено; на
+        # даты каждой седьмой заявки арендодатель потом закрыл объявление
+        start = date.today() + timedelta(days=1)
+        bookings = [
+            Booking(
+                listing=listing, tenant=tenant,
+                start_date=start + timedelta(days=2 * i), end_date=start + timedelta(days=2 * i + 2),
+                status=Booking.STATUS_APPROVED if i % 5 == 0 else Booking.STATUS_PENDING,
+            )
+            for i in range(count)
+        ]
+        Booking.objects.bulk_create(bookings, batch_size=1000)
+        OccupiedDay.objects.bulk_create([
+            OccupiedDay(listing=listing, booking=booking, day=day)
+            for booking in Booking.objects.filter(listing=listing) for day in booking.nights()
+        ], batch_size=1000)
+        BlockedPeriod.objects.bulk_create([
+            BlockedPeriod(listing=listing, start_date=booking.start_date, end_date=booking.end_date)
+            for i, booking in enumerate(bookings) if i % 7 == 3
+        ])
+        rebuild_calendar(listing.pk)
+
+    def _run(self, owner, one_by_one, bulk):
+        factory = APIRequestFactory(HTTP_HOST='localhost')
+        view = BookingViewSet.as_view({'post': 'approve'})
+        ids = list(Booking.objects.filter(listing=one_by_one, status=Booking.STATUS_PENDING).values_list('pk', flat=True))
+
+        started = time.perf_counter()
+        for pk in ids:
+            request = factory.post(f'/bookings/bookings/{pk}/approve/')
+            force_authenticate(request, owner)
+            view(request, pk=pk)
+        elapsed = time.perf_counter() - started
+        approved = Booking.objects.filter(pk__in=ids, status=Booking.STATUS_APPROVED).count()
+        self.stdout.write(f'approve one by one   {len(ids)} requests in {elapsed * 1000:9.1f}ms ({approved} approved)')
+
+        started = time.perf_counter()
+        result = decide_bookings(owner, listing_id=bulk.pk)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'bulk decide          {len(result["approved"]) + len(result["rejected"])} requests in '
+            f'{elapsed * 1000:9.1f}ms ({len(result["approved"])} approved, {len(result["rejected"])} rejected)'
+        )
@@ -0,0 +1,70 @@
+import time
+import tracemalloc
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from listings.views import ListingViewSet
+
+from ._bench import cleanup_owner, create_bench_owner, generate_listings
+
+
+class Command(BaseCommand):
+    help = 'Listing export: streaming CSV/NDJSON vs scraping cursor pages, rows/sec and peak memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=40_000)
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated listings')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        try:
+            generate_listings(owner, options['listings'], stdout=self.stdout)
+            self._run(owner, options['listings'])
+        finally:
+            if not options['keep']:
+                cleanup_owner(owner)
+
+    def _run(self, owner, total):
+        factory = APIRequestFactory(HTTP_HOST='localhost')
+        list_view = ListingViewSet.as_view({'get': 'list'})
+        export_view = ListingViewSet.as_view({'get': 'export'})
+
+        def scrape():
+            # Как сейчас выгружают данные: курсорные страницы списка одна за другой
+            rows, cursor = 0, ''
+            while cursor is not None:
+                request = factory.get('/listings/', {'cursor': cursor})
+                force_authenticate(request, owner)
+                data = list_view(request).render().data
+                rows += len(data['results'])
+                cursor = parse_qs(urlparse(data['next']).query)['cursor'][0] if data['next'] else None
+            return rows
+
+        def export(file_format, gzip=False):
+            request = factory.get('/listings/export/', {'file_format': file_format},
+                                  HTTP_ACCEPT_ENCODING='gzip' if gzip else '')
+            force_authenticate(request, owner)
+            size = 0
+            for part in export_view(request).streaming_content:
+                size += len(part)
+            return size
+
+        for label, func in (
+            ('cursor pages', scrape),
+            ('export csv', lambda: export('csv')),
+            ('export ndjson', lambda: export('ndjson')),
+            ('export csv + gzip', lambda: export('csv', gzip=True)),
+        ):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{label:<20} {total / elapsed:10,.0f} rows/sec  (result {result:,})')
+
+        # Пиковая память выгрузки - одна пачка, не весь результат
+        tracemalloc.start()
+        export('csv')
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(f'{"export peak memory":<20} {peak / 2 ** 20:10.1f} MiB  ({total} rows)')
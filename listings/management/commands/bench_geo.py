@@ -0,0 +1,66 @@
+import math
+
+from django.core.management.base import BaseCommand
+
+from listings.geo import filter_bbox, filter_radius
+from listings.models import Listing
+
+from ._bench import (
+    CITY_CENTERS, cleanup_owner, create_bench_owner, format_timing, generate_listings, measure,
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare radius/bbox search: geohash prefilter + SQL distance vs loading all coordinates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated data')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        try:
+            generate_listings(owner, options['listings'], stdout=self.stdout)
+            self._run(options['repeat'], options['page_size'])
+        finally:
+            if not options['keep']:
+                cleanup_owner(owner)
+
+    def _run(self, repeat, page_size):
+        base = Listing.objects.filter(is_active=True)
+        latitude, longitude = CITY_CENTERS['Berlin']
+
+        for radius_km in (1, 5, 20):
+            def naive_page():
+                # Все координаты в Python и расстояние по одной строке
+                nearest = []
+                for pk, lat, lng in base.values_list('id', 'latitude', 'longitude').iterator():
+                    distance = _haversine(latitude, longitude, lat, lng)
+                    if distance <= radius_km:
+                        nearest.append((distance, pk))
+                nearest.sort()
+                list(base.filter(id__in=[pk for _, pk in nearest[:page_size]]))
+
+            def geohash_page():
+                list(filter_radius(base, latitude, longitude, radius_km)[:page_size])
+
+            self.stdout.write(f'\nradius {radius_km} km around Berlin')
+            self.stdout.write(format_timing('full scan', measure(naive_page, repeat)))
+            self.stdout.write(format_timing('geohash + SQL distance', measure(geohash_page, repeat)))
+
+        def bbox_page():
+            queryset = filter_bbox(base, 52.50, 13.36, 52.54, 13.44)
+            queryset.count()
+            list(queryset[:page_size])
+
+        self.stdout.write('\nbbox ~ 5x4 km (map view)')
+        self.stdout.write(format_timing('geohash bbox', measure(bbox_page, repeat)))
+
+
+def _haversine(lat1, lng1, lat2, lng2):
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return 2 * 6371.0088 * math.asin(math.sqrt(a))
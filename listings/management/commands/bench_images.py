@@ -0,0 +1,87 @@
+import io
+import random
+import time
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from PIL import Image, ImageFilter
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from listings.models import ListingImage
+from listings.views import ListingViewSet
+from rental_project.images import IMAGE_PENDING, KIND_LISTING, image_processor, variant_name, variant_names
+
+from ._bench import cleanup_owner, create_bench_owner, format_timing, generate_listings, measure
+
+
+class Command(BaseCommand):
+    help = 'Listing photo upload: request latency with in-request vs pooled processing, variant sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploads', type=int, default=20)
+        parser.add_argument('--workers', type=int, default=2)
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        try:
+            generate_listings(owner, 1, stdout=self.stdout)
+            self._run(owner, owner.listings.get(), options['uploads'], options['workers'])
+        finally:
+            for name in ListingImage.objects.filter(listing__owner=owner).values_list('image', flat=True):
+                for path in [name] + variant_names(name, KIND_LISTING):
+                    default_storage.delete(path)
+            cleanup_owner(owner)
+
+    def _run(self, owner, listing, uploads, workers):
+        rng = random.Random(42)
+        photos = [_photo(rng) for _ in range(uploads * 2)]
+        factory = APIRequestFactory(HTTP_HOST='localhost')
+        view = ListingViewSet.as_view({'post': 'images'})
+
+        def upload():
+            request = factory.post(f'/listings/{listing.pk}/images/', {
+                'image': SimpleUploadedFile('photo.jpg', photos.pop(), content_type='image/jpeg'),
+            }, format='multipart')
+            force_authenticate(request, owner)
+            response = view(request, pk=listing.pk)
+            assert response.status_code == 201, response.data
+            return response.data
+
+        self.stdout.write(f'original upload: {len(photos[0]) / 1024:,.0f} KiB, 4000x3000 JPEG')
+        with override_settings(IMAGE_PROCESSING_WORKERS=0):
+            started = time.perf_counter()
+            self.stdout.write(format_timing('upload, in request', measure(upload, uploads)))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{"processed, in request":<28} {uploads / elapsed:9.1f} images/sec')
+
+        with override_settings(IMAGE_PROCESSING_WORKERS=workers):
+            started = time.perf_counter()
+            self.stdout.write(format_timing(f'upload, pool ({workers} workers)', measure(upload, uploads)))
+            while ListingImage.objects.filter(listing=listing, status=IMAGE_PENDING).exists():
+                time.sleep(0.05)
+            elapsed = time.perf_counter() - started
+            # Включая запуск процессов пула; на машине с одним ядром быстрее, чем в запросе, не будет
+            self.stdout.write(f'{"processed, pool":<28} {uploads / elapsed:9.1f} images/sec')
+            image_processor.shutdown()
+
+        name = ListingImage.objects.filter(listing=listing).values_list('image', flat=True).first()
+        for variant in ('thumb', 'large'):
+            sizes = ', '.join(
+                f'{extension} {default_storage.size(variant_name(name, variant, extension)) / 1024:,.0f} KiB'
+                for extension in ('jpg', 'webp')
+            )
+            self.stdout.write(f'{variant:<28} {sizes}')
+
+
+def _photo(rng):
+    """Шумный снимок 12 Мп: сжимается примерно как фотография, а не как заливка"""
+    small = Image.effect_noise((400, 300), 60).convert('RGB')
+    small = Image.merge('RGB', [
+        channel.point(lambda value, shift=rng.randint(-60, 60): value + shift) for channel in small.split()
+    ])
+    image = small.resize((4000, 3000), Image.Resampling.BICUBIC).filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
@@ -0,0 +1,63 @@
+import numpy as np
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from listings.models import Listing
+from listings.price_stats import compute_price_stats, rebuild_price_stats
+from listings.views import ListingViewSet
+
+from ._bench import cleanup_owner, create_bench_owner, format_timing, generate_listings, measure
+
+
+class Command(BaseCommand):
+    help = 'Price stats latency: scanning listings per request vs precomputed per-city price arrays'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=200_000)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated listings')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        try:
+            generate_listings(owner, options['listings'], stdout=self.stdout)
+            # bulk_create обходит сигналы - массивы цен строим целиком
+            self.stdout.write(format_timing('rebuild_price_stats', measure(rebuild_price_stats, 1)))
+            self._run(options['repeat'])
+        finally:
+            if not options['keep']:
+                cleanup_owner(owner)
+                rebuild_price_stats()
+
+    def _run(self, repeat):
+        factory = APIRequestFactory(HTTP_HOST='localhost')
+        view = ListingViewSet.as_view({'get': 'price_stats'})
+
+        def endpoint(params):
+            response = view(factory.get('/listings/price-stats/', params))
+            assert response.status_code == 200, response.status_code
+            return response.data
+
+        def scan(params):
+            # Прежний путь: все цены выборки из таблицы объявлений на каждый запрос
+            queryset = Listing.objects.filter(is_active=True)
+            if 'city' in params:
+                queryset = queryset.filter(city=params['city'])
+            if 'property_type' in params:
+                queryset = queryset.filter(property_type=params['property_type'])
+            prices = np.array([int(price * 100) for price in queryset.values_list('price', flat=True)], dtype=np.int64)
+            return compute_price_stats(np.sort(prices))
+
+        for label, params in (
+            ('all cities', {}),
+            ('city=Berlin', {'city': 'Berlin'}),
+            ('city=Berlin&property_type=apartment', {'city': 'Berlin', 'property_type': 'apartment'}),
+        ):
+            self.stdout.write(format_timing(f'{label}: scan listings', measure(lambda: scan(params), repeat)))
+            cache.clear()
+            self.stdout.write(format_timing(f'{label}: precomputed, cold', measure(
+                lambda: (cache.clear(), endpoint(params)), repeat
+            )))
+            self.stdout.write(format_timing(f'{label}: precomputed, cached', measure(lambda: endpoint(params), repeat)))
+            assert endpoint(params)['count'] == scan(params)['count']
@@ -0,0 +1,86 @@
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+
+from bookings.models import Booking, DatesUnavailable
+from listings.models import Listing
+
+from ._bench import cleanup_owner, create_bench_owner, generate_listings
+
+
+class Command(BaseCommand):
+    help = 'Concurrent bookings of one listing: throughput and a double-booking check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=200, help='Booking attempts per thread')
+        parser.add_argument('--horizon', type=int, default=730, help='Days ahead to book into')
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated data')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        tenant = create_bench_owner()
+        try:
+            generate_listings(owner, 1, stdout=self.stdout)
+            listing = Listing.objects.get(owner=owner)
+            self._run(listing, tenant, options['threads'], options['attempts'], options['horizon'])
+        finally:
+            if not options['keep']:
+                cleanup_owner(owner)
+                tenant.delete()
+
+    def _run(self, listing, tenant, threads, attempts, horizon):
+        counts = {'booked': 0, 'conflict': 0, 'retry': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+        today = date.today()
+
+        def worker(number):
+            rng = random.Random(number)
+            barrier.wait()
+            try:
+                for _ in range(attempts):
+                    start = today + timedelta(days=rng.randint(1, horizon))
+                    end = start + timedelta(days=rng.randint(1, 7))
+                    while True:
+                        try:
+                            Booking.objects.create(listing=listing, tenant=tenant, start_date=start, end_date=end)
+                            outcome = 'booked'
+                        except DatesUnavailable:
+                            outcome = 'conflict'
+                        except OperationalError:
+                            # Блокировка базы (SQLite) или взаимоблокировка - повторяем
+                            with lock:
+                                counts['retry'] += 1
+                            continue
+                        break
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                close_old_connections()
+
+        workers = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = counts['booked'] + counts['conflict']
+        self.stdout.write(
+            f'{threads} threads, {total} attempts in {elapsed:.2f}s: '
+            f'{counts["booked"] / elapsed:.1f} bookings/s, {total / elapsed:.1f} attempts/s '
+            f'({counts["conflict"]} rejected as taken, {counts["retry"]} retried)'
+        )
+
+        # Проверка по самим бронированиям, не по OccupiedDay
+        ranges = sorted(Booking.objects.filter(
+            listing=listing, status__in=Booking.OCCUPYING_STATUSES,
+        ).values_list('start_date', 'end_date'))
+        overlaps = sum(1 for previous, current in zip(ranges, ranges[1:]) if current[0] < previous[1])
+        self.stdout.write(f'{len(ranges)} bookings stored, {overlaps} overlapping')
@@ -0,0 +1,74 @@
+import random
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from listings.filters import ListingFilter
+from listings.models import Listing, SavedSearch, SavedSearchMatch
+from listings.saved_searches import filter_data, index_search, match_listings
+from users.models import User
+
+from ._bench import CITIES, PROPERTY_TYPES, cleanup_owner, create_bench_owner, format_timing, generate_listings, measure
+
+
+class Command(BaseCommand):
+    help = 'Matching a new listing against saved searches: reverse index vs checking every search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--searches', type=int, default=50_000)
+        parser.add_argument('--listings', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated data')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        prefix = f'bench_searcher_{uuid.uuid4().hex[:8]}_'
+        try:
+            generate_listings(owner, options['listings'], stdout=self.stdout)
+            self._create_searches(prefix, options['searches'])
+            self._run(owner, options['repeat'])
+        finally:
+            if not options['keep']:
+                SavedSearchMatch.objects.filter(listing__owner=owner).delete()
+                cleanup_owner(owner)
+                User.objects.filter(username__startswith=prefix).delete()
+
+    def _create_searches(self, prefix, count, per_user=10, seed=5):
+        rng = random.Random(seed)
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}{i}', email=f'{prefix}{i}@bench.local') for i in range(count // per_user + 1)
+        ])
+        users = list(User.objects.filter(username__startswith=prefix))
+        searches = []
+        for i in range(count):
+            params = {'city': rng.choice(list(CITIES)), 'max_price': str(rng.choice((300, 800, 1500, 3000)))}
+            if rng.random() < 0.5:
+                params['property_type'] = rng.choice(PROPERTY_TYPES)
+            if rng.random() < 0.5:
+                params['min_rooms'] = str(rng.randint(1, 4))
+            searches.append(SavedSearch(user=users[i % len(users)], params=params))
+        with transaction.atomic():
+            SavedSearch.objects.bulk_create(searches, batch_size=5000)
+            for search in SavedSearch.objects.filter(user__username__startswith=prefix):
+                index_search(search)
+        self.stdout.write(f'  {count} saved searches')
+
+    def _run(self, owner, repeat):
+        rng = random.Random(9)
+        ids = list(Listing.objects.filter(owner=owner, is_active=True).values_list('pk', flat=True))
+
+        def scan():
+            # Без индекса: каждый поиск проверяется на объявлении
+            pk = rng.choice(ids)
+            queryset = Listing.objects.filter(pk=pk)
+            return sum(
+                ListingFilter(filter_data(params), queryset=queryset).qs.exists()
+                for params in SavedSearch.objects.values_list('params', flat=True)
+            )
+
+        self.stdout.write(format_timing('check every search', measure(scan, 1)))
+        self.stdout.write(format_timing('reverse index', measure(lambda: match_listings([rng.choice(ids)]), repeat)))
+        self.stdout.write(format_timing('reverse index, 100 listings', measure(
+            lambda: match_listings(rng.sample(ids, 100)), max(repeat // 5, 1)
+        )))
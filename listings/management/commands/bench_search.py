@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from rest_framework import filters
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+
+from listings.models import Listing
+from listings.search import get_search_backend
+from listings.views import ListingViewSet
+
+from ._bench import (
+    cleanup_owner, create_bench_owner, format_timing, generate_listings, measure,
+)
+
+QUERIES = ('balcony', 'cozy garden', 'modern loft view', 'kreuzberg', 'sauna pool', 'park')
+
+
+class Command(BaseCommand):
+    help = 'Compare ?search= latency: DRF SearchFilter (icontains) vs full-text backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated listings')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write(f'Search backend: {type(backend).__name__}')
+
+        owner = create_bench_owner()
+        try:
+            generate_listings(owner, options['listings'], stdout=self.stdout)
+            # bulk_create не вызывает сигналы - перестраиваем индекс целиком
+            backend.rebuild()
+            self._run(backend, options['repeat'], options['page_size'])
+        finally:
+            if not options['keep']:
+                cleanup_owner(owner)
+                backend.rebuild()
+
+    def _run(self, backend, repeat, page_size):
+        factory = APIRequestFactory()
+        view = ListingViewSet()
+        base = Listing.objects.filter(is_active=True)
+
+        for query in QUERIES:
+            request = Request(factory.get('/listings/', {'search': query}))
+
+            def search_filter_page():
+                queryset = filters.SearchFilter().filter_queryset(request, base, view)
+                queryset.count()
+                list(queryset.order_by('-created_at')[:page_size])
+
+            def backend_page():
+                queryset = backend.search(base, query)
+                queryset.count()
+                list(queryset[:page_size])
+
+            self.stdout.write(f'\n?search={query!r}')
+            self.stdout.write(format_timing('SearchFilter (icontains)', measure(search_filter_page, repeat)))
+            self.stdout.write(format_timing(type(backend).__name__, measure(backend_page, repeat)))
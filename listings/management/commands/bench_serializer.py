@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from listings.models import Listing
+from listings.serializers import ListingSerializer, listing_rows
+
+from ._bench import cleanup_owner, create_bench_owner, generate_listings, measure
+
+
+class Command(BaseCommand):
+    help = 'Rows/sec of listing list serialization: ListingSerializer on models vs values() fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=20_000)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated listings')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        try:
+            generate_listings(owner, options['listings'], stdout=self.stdout)
+            self._run(owner, options['page_size'], options['repeat'])
+        finally:
+            if not options['keep']:
+                cleanup_owner(owner)
+
+    def _run(self, owner, page_size, repeat):
+        queryset = Listing.objects.filter(owner=owner).order_by('-created_at', '-id')
+        renderer = JSONRenderer()
+        serializer = ListingSerializer()
+        total = queryset.count()
+
+        def fetch_models():
+            return list(queryset.select_related('owner', 'main_image'))
+
+        def fetch_rows():
+            return list(listing_rows.values(queryset, serializer))
+
+        def render(objects):
+            # Страницами, как в API: у каждой страницы свой ListSerializer
+            return [
+                renderer.render(ListingSerializer(objects[offset:offset + page_size], many=True).data)
+                for offset in range(0, len(objects), page_size)
+            ]
+
+        instances, rows = fetch_models(), fetch_rows()
+        if render(instances) != render(rows):
+            self.stderr.write('Output differs!')
+            return
+        self.stdout.write(f'Output is byte-identical ({total} rows, pages of {page_size})')
+
+        for label, fetch, objects in (
+            ('ListingSerializer (models)', fetch_models, instances),
+            ('values() fast path', fetch_rows, rows),
+        ):
+            fetch_p50, _, _ = measure(fetch, repeat)
+            render_p50, _, _ = measure(lambda: render(objects), repeat)
+            self.stdout.write(
+                f'{label:<28} fetch {total / fetch_p50 * 1000:10,.0f} rows/sec  '
+                f'serialize {total / render_p50 * 1000:10,.0f} rows/sec  '
+                f'total {total / (fetch_p50 + render_p50) * 1000:10,.0f} rows/sec'
+            )
@@ -0,0 +1,60 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from listings.models import Listing
+from listings.similar import similar_index
+from listings.views import ListingViewSet
+
+from ._bench import cleanup_owner, create_bench_owner, format_timing, generate_listings, measure
+
+
+class Command(BaseCommand):
+    help = 'Latency of /listings/{id}/similar/: per-city in-memory feature matrices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=500_000)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated listings')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        try:
+            generate_listings(owner, options['listings'], stdout=self.stdout)
+            self._run(owner, options['repeat'])
+        finally:
+            if not options['keep']:
+                cleanup_owner(owner)
+            similar_index.clear()
+
+    def _run(self, owner, repeat):
+        rng = random.Random(1)
+        rows = list(Listing.objects.filter(owner=owner, is_active=True).values_list('pk', 'city_location_id'))
+        cities = sorted({city for _, city in rows})
+        for city in cities:
+            started = time.perf_counter()
+            partition = similar_index.partition(city)
+            self.stdout.write(
+                f'partition {city}: {partition._snapshot[4]} listings, '
+                f'built in {(time.perf_counter() - started) * 1000:.0f}ms'
+            )
+
+        listings = {listing.pk: listing for listing in Listing.objects.filter(pk__in=[pk for pk, _ in rng.sample(rows, 500)])}
+        samples = list(listings.values())
+
+        self.stdout.write(format_timing('index top-20 (2x limit)', measure(
+            lambda: similar_index.similar(rng.choice(samples), 20), repeat
+        )))
+
+        factory = APIRequestFactory(HTTP_HOST='localhost')
+        view = ListingViewSet.as_view({'get': 'similar'})
+
+        def endpoint():
+            listing = rng.choice(samples)
+            response = view(factory.get(f'/listings/{listing.pk}/similar/'), pk=listing.pk)
+            assert response.status_code == 200, response.status_code
+            assert len(response.data) == 10, len(response.data)
+
+        self.stdout.write(format_timing('endpoint top-10', measure(endpoint, repeat)))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings.models import Listing
+from listings.suggest import suggest_index
+
+from ._bench import (
+    cleanup_owner, create_bench_owner, format_timing, generate_listings, measure,
+)
+
+PREFIXES = ('b', 'co', 'mod', 'brig', 'kreuz', 'spacious ba', 'neuk')
+
+
+class Command(BaseCommand):
+    help = 'Compare /listings/suggest/ lookups: in-memory prefix index vs istartswith query'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--keep', action='store_true', help='Do not delete generated listings')
+
+    def handle(self, *args, **options):
+        owner = create_bench_owner()
+        try:
+            generate_listings(owner, options['listings'], stdout=self.stdout)
+            started = time.perf_counter()
+            suggest_index.rebuild()
+            self.stdout.write(f'Index built in {(time.perf_counter() - started) * 1000:.0f}ms')
+            self._run(options['repeat'])
+        finally:
+            if not options['keep']:
+                cleanup_owner(owner)
+                suggest_index.clear()
+
+    def _run(self, repeat):
+        for prefix in PREFIXES:
+            def database():
+                list(
+                    Listing.objects.filter(is_active=True, title__istartswith=prefix)
+                    .values_list('title', flat=True).distinct()[:10]
+                )
+
+            self.stdout.write(f'\n{prefix!r}')
+            self.stdout.write(format_timing('istartswith', measure(database, max(repeat // 10, 1))))
+            self.stdout.write(format_timing('prefix index', measure(lambda: suggest_index.suggest(prefix), repeat)))
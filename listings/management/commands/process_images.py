@@ -0,0 +1,46 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from rental_project.images import IMAGE_FAILED, IMAGE_READY, image_processor, is_stored, store_image
+
+
+class Command(BaseCommand):
+    help = (
+        'Build thumbnails and WebP variants for images still pending: uploads lost on worker '
+        'restart and files uploaded before content-addressed storage'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', help='Also reprocess failed images')
+
+    def handle(self, *args, **options):
+        skip = [IMAGE_READY] if options['retry_failed'] else [IMAGE_READY, IMAGE_FAILED]
+        for model, field, status_field, kind, _ in image_processor.targets():
+            names = (
+                model.objects.exclude(**{f'{status_field}__in': skip})
+                .exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+                .values_list(field, flat=True).distinct()
+            )
+            counts = {IMAGE_READY: 0, IMAGE_FAILED: 0}
+            for name in list(names):
+                status = self.process(model, field, kind, name)
+                counts[status] += 1
+            self.stdout.write(
+                f'{model._meta.label}.{field}: {counts[IMAGE_READY]} ready, {counts[IMAGE_FAILED]} failed'
+            )
+
+    def process(self, model, field, kind, name):
+        if not is_stored(name):
+            # Загрузка до хранения по содержимому: переносим файл под имя по sha256
+            try:
+                with default_storage.open(name, 'rb') as upload:
+                    stored = store_image(upload)
+            except (OSError, ValueError) as exc:
+                self.stderr.write(f'{name}: {exc}')
+                image_processor.mark(name, kind, IMAGE_FAILED)
+                return IMAGE_FAILED
+            model.objects.filter(**{field: name}).update(**{field: stored})
+            name = stored
+        status = image_processor.process(name, kind)
+        image_processor.mark(name, kind, status)
+        return status
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from listings.also_viewed import refresh_neighbours
+
+
+class Command(BaseCommand):
+    help = (
+        'Update "also viewed" neighbours from view history added since the last run '
+        '(run from cron, e.g. every 10 minutes; --full recomputes everything)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute neighbours of every viewed listing')
+
+    def handle(self, *args, **options):
+        updated = refresh_neighbours(full=options['full'])
+        self.stdout.write(f'Recomputed neighbours for {updated} listings')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from listings.popularity import prune_buckets, refresh_trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute trending listings for /listings/popular/?window=24h|7d (run from cron, e.g. every 10 minutes)'
+
+    def handle(self, *args, **options):
+        removed = prune_buckets()
+        for window, ids in refresh_trending().items():
+            self.stdout.write(f'{window}: {len(ids)} listings')
+        self.stdout.write(f'Removed {removed} expired view buckets')
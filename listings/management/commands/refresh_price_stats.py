@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from listings.price_stats import rebuild_price_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild per-city price arrays behind /listings/price-stats/ from listings '
+        '(after raw SQL edits or .update() calls that bypass signals)'
+    )
+
+    def handle(self, *args, **options):
+        groups = rebuild_price_stats()
+        self.stdout.write(f'Rebuilt price stats for {groups} city / property type groups')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from listings.main_images import update_main_images
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = 'Backfill / repair Listing.main_image (cover photo for list responses) from listing images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = fixed = 0
+        last_pk = 0
+        while True:
+            ids = list(
+                Listing.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            last_pk = ids[-1]
+            checked += len(ids)
+            fixed += update_main_images(ids)
+        self.stdout.write(f'Checked {checked} listings, fixed {fixed} cover images')
@@ -0,0 +1,57 @@
+import django.db.models.deletion
+import listings.search
+from django.db import migrations, models
+
+FTS_TABLE = 'listings_listing_fts'
+FULLTEXT_INDEX = 'listings_listing_fulltext'
+SEARCH_FIELDS = ('title', 'description', 'location', 'city', 'district')
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    columns = ', '.join(SEARCH_FIELDS)
+    if vendor == 'mysql':
+        schema_editor.execute(
+            f'ALTER TABLE listings_listing ADD FULLTEXT INDEX {FULLTEXT_INDEX} ({columns})'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{columns}, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        source = ', '.join(f"COALESCE({field}, '')" for field in SEARCH_FIELDS)
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, {columns}) '
+            f'SELECT id, {source} FROM listings_listing'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(f'ALTER TABLE listings_listing DROP INDEX {FULLTEXT_INDEX}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_alter_listing_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingSearchDocument',
+            fields=[
+                ('listing', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='listings.listing')),
+                ('document', listings.search.FullTextField(db_column='listings_listing_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'listings_listing_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
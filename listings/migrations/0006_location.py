@@ -0,0 +1,67 @@
+# Generated by Django 5.2 on 2026-10-17 01:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from listings.locations import normalize_location_name
+
+
+def backfill_locations(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    Location = apps.get_model('listings', 'Location')
+
+    for kind, field in (('city', 'city'), ('district', 'district')):
+        values = Listing.objects.exclude(**{f'{field}__isnull': True}).values_list(field, flat=True).distinct()
+        for value in values:
+            canonical = normalize_location_name(value)
+            if not canonical:
+                continue
+            location, _ = Location.objects.get_or_create(
+                kind=kind,
+                canonical_name=canonical,
+                defaults={'name': value.strip()}
+            )
+            Listing.objects.filter(**{field: value}).update(**{f'{field}_location': location})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_listing_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('city', 'City'), ('district', 'District')], max_length=20)),
+                ('name', models.CharField(max_length=100)),
+                ('canonical_name', models.CharField(max_length=100)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'canonical_name'), name='unique_location_canonical_name')],
+            },
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='city_location',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='listings.location'),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='district_location',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='listings.location'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['city_location', 'is_active'], name='listings_li_city_lo_8ae77f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['district_location', 'is_active'], name='listings_li_distric_94f167_idx'),
+        ),
+        migrations.RunPython(backfill_locations, migrations.RunPython.noop),
+    ]
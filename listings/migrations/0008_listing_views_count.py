@@ -0,0 +1,74 @@
+# Generated by Django 5.2 on 2026-10-17 01:42
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def backfill_view_counters(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    ListingViewBucket = apps.get_model('listings', 'ListingViewBucket')
+    ViewHistory = apps.get_model('listings', 'ViewHistory')
+
+    counts = ViewHistory.objects.values('listing_id').annotate(total=Count('id')).values_list('listing_id', 'total')
+    for listing_id, total in counts.iterator():
+        Listing.objects.filter(pk=listing_id).update(views_count=total)
+
+    # Часовые корзины за последнюю неделю - чтобы тренды не начинались с нуля
+    buckets = {}
+    since = timezone.now() - timedelta(days=7)
+    views = ViewHistory.objects.filter(timestamp__gte=since).values_list('listing_id', 'timestamp')
+    for listing_id, timestamp in views.iterator():
+        hour = timestamp.replace(minute=0, second=0, microsecond=0)
+        buckets[(listing_id, hour)] = buckets.get((listing_id, hour), 0) + 1
+    ListingViewBucket.objects.bulk_create(
+        [ListingViewBucket(listing_id=listing_id, hour=hour, count=count)
+         for (listing_id, hour), count in buckets.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_listing_coordinates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='views_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'views_count'], name='listings_li_is_acti_640b46_idx'),
+        ),
+        migrations.AddField(
+            model_name='listingviewbucket',
+            name='listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='listings.listing'),
+        ),
+        migrations.AddIndex(
+            model_name='listingviewbucket',
+            index=models.Index(fields=['hour'], name='listings_li_hour_67bc58_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='listingviewbucket',
+            constraint=models.UniqueConstraint(fields=('listing', 'hour'), name='unique_listing_view_bucket'),
+        ),
+        migrations.RunPython(backfill_view_counters, migrations.RunPython.noop),
+    ]
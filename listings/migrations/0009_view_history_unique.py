@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-17 01:44
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_views(apps, schema_editor):
+    """Оставляем первый просмотр каждой пары (user, listing) и пересчитываем views_count"""
+    Listing = apps.get_model('listings', 'Listing')
+    ViewHistory = apps.get_model('listings', 'ViewHistory')
+
+    duplicates = (
+        ViewHistory.objects.values('user_id', 'listing_id')
+        .annotate(first_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    listing_ids = set()
+    for row in list(duplicates):
+        ViewHistory.objects.filter(user_id=row['user_id'], listing_id=row['listing_id']).exclude(
+            id=row['first_id']
+        ).delete()
+        listing_ids.add(row['listing_id'])
+
+    for listing_id in listing_ids:
+        Listing.objects.filter(pk=listing_id).update(
+            views_count=ViewHistory.objects.filter(listing_id=listing_id).count()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_listing_views_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_views, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='viewhistory',
+            constraint=models.UniqueConstraint(fields=('user', 'listing'), name='unique_view_history_user_listing'),
+        ),
+    ]
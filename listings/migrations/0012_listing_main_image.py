@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 02:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_listingimage_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='main_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='listings.listingimage'),
+        ),
+    ]
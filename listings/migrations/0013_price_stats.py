@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-17 02:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from listings.price_stats import rebuild_price_stats
+
+
+def backfill_price_stats(apps, schema_editor):
+    rebuild_price_stats(apps.get_model('listings', 'Listing'), apps.get_model('listings', 'PriceStats'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_listing_main_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('property_type', models.CharField(choices=[('apartment', 'Apartment'), ('house', 'House'), ('studio', 'Studio'), ('room', 'Room'), ('villa', 'Villa'), ('cottage', 'Cottage')], max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('prices', models.BinaryField(default=b'')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('city_location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='listings.location')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('city_location', 'property_type'), name='unique_price_stats_group')],
+            },
+        ),
+        migrations.RunPython(backfill_price_stats, migrations.RunPython.noop),
+    ]
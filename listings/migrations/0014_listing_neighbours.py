@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0013_price_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingNeighbours',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='listings.listing')),
+                ('neighbours', models.BinaryField(default=b'')),
+                ('scores', models.BinaryField(default=b'')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,5 +1,46 @@
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from rental_project.images import IMAGE_PENDING, IMAGE_STATUS_CHOICES
 from users.models import User
+from .geo import encode_geohash
+from .locations import normalize_location_name
+from .search import FTS_TABLE, FullTextField
+
+
+class Location(models.Model):
+    """Город или район с каноническим (casefold, без диакритики) именем"""
+    KIND_CITY = 'city'
+    KIND_DISTRICT = 'district'
+
+    KIND_CHOICES = [
+        (KIND_CITY, 'City'),
+        (KIND_DISTRICT, 'District'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    name = models.CharField(max_length=100)
+    canonical_name = models.CharField(max_length=100)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def get_for_name(cls, kind, name):
+        """Location для названия (создаётся при первом упоминании)"""
+        canonical = normalize_location_name(name)
+        if not canonical:
+            return None
+        location, _ = cls.objects.get_or_create(
+            kind=kind,
+            canonical_name=canonical,
+            defaults={'name': name.strip()}
+        )
+        return location
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'canonical_name'], name='unique_location_canonical_name'),
+        ]
 
 
 class Listing(models.Model):
@@ -20,28 +61,103 @@ class Listing(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     rooms = models.IntegerField()
     property_type = models.CharField(max_length=50, choices=PROPERTY_TYPES)
+    latitude = models.FloatField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
+    # geohash координат: префикс geohash - ячейка сетки для префильтра по индексу
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
     is_active = models.BooleanField(default=True)
+    # Число просмотров (ViewHistory), поддерживается при записи просмотра
+    views_count = models.PositiveIntegerField(default=0, editable=False)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listings')
+    # Обложка для списков (listings.main_images), обновляется сигналами ListingImage
+    main_image = models.ForeignKey(
+        'ListingImage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False
+    )
+    # Идентификатор объявления в системе арендодателя: upsert при массовой загрузке
+    external_ref = models.CharField(max_length=100, blank=True, null=True)
+    city_location = models.ForeignKey(
+        Location,
+        on_delete=models.PROTECT,
+        related_name='+',
+        null=True,
+        editable=False
+    )
+    district_location = models.ForeignKey(
+        Location,
+        on_delete=models.PROTECT,
+        related_name='+',
+        null=True,
+        editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Поля, значения которых на момент загрузки из БД запоминаются,
+    # чтобы при сохранении понимать, что именно изменилось
+    # (цена, тип, город и активность - для статистики цен)
+    TRACKED_FIELDS = ('city', 'district', 'city_location_id', 'property_type', 'price', 'is_active')
+
     def __str__(self):
         return f"{self.title} ({self.property_type}) - {self.price}€"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values)
+            if name in cls.TRACKED_FIELDS
+        }
+        return instance
+
+    def has_changed(self, field):
+        loaded = getattr(self, '_loaded_values', {})
+        return self._state.adding or field not in loaded or loaded[field] != getattr(self, field)
+
+    def save(self, *args, **kwargs):
+        if self.has_changed('city') or self.city_location_id is None:
+            self.city_location = Location.get_for_name(Location.KIND_CITY, self.city)
+        if self.has_changed('district'):
+            self.district_location = Location.get_for_name(Location.KIND_DISTRICT, self.district)
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        super().save(*args, **kwargs)
+        self._loaded_values = {name: getattr(self, name) for name in self.TRACKED_FIELDS}
+
     class Meta:
         indexes = [
             models.Index(fields=['city', 'is_active']),
+            models.Index(fields=['city_location', 'is_active']),
+            models.Index(fields=['district_location', 'is_active']),
             models.Index(fields=['price']),
             models.Index(fields=['property_type']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['rooms']),
+            models.Index(fields=['geohash']),
+            models.Index(fields=['is_active', 'views_count']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'external_ref'], name='unique_listing_owner_external_ref'),
         ]
         ordering = ['-created_at']
 
 
 class ListingImage(models.Model):
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='images')
+    # Имя по содержимому (rental_project.images); upload_to - для старых загрузок
     image = models.ImageField(upload_to='listing_images/')
     is_main = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, default=IMAGE_PENDING)
 
     def __str__(self):
         return f"Image for {self.listing.title}"
@@ -62,4 +178,129 @@ class ViewHistory(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.user.username} viewed {self.listing.title}"
\ No newline at end of file
+        return f"{self.user.username} viewed {self.listing.title}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'listing'], name='unique_view_history_user_listing'),
+        ]
+
+
+class SavedSearch(models.Model):
+    """Сохранённый поиск: параметры ListingFilter; новые подходящие объявления попадают во «входящие»"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_searches')
+    name = models.CharField(max_length=100, blank=True)
+    params = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.name or self.params}"
+
+
+class SavedSearchKey(models.Model):
+    """
+    Обратный индекс сохранённых поисков (listings.saved_searches): по ключу
+    (город, тип, ценовой диапазон) нового объявления находятся поиски,
+    которые могут ему подойти. Пустой город / тип - поиск без этого условия
+    """
+    search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name='keys')
+    city_location = models.ForeignKey(Location, on_delete=models.CASCADE, null=True, related_name='+')
+    property_type = models.CharField(max_length=50, blank=True)
+    price_band = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['price_band', 'city_location', 'property_type']),
+        ]
+
+
+class SavedSearchMatch(models.Model):
+    """Новое объявление, подошедшее под сохранённый поиск (входящие пользователя)"""
+    search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name='matches')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_matches')
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='+')
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.listing_id} for search {self.search_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['search', 'listing'], name='unique_saved_search_match'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'is_read']),
+        ]
+
+
+class ListingViewBucket(models.Model):
+    """Просмотры объявления за час - для трендов с затуханием"""
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='view_buckets')
+    hour = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.listing_id} @ {self.hour:%Y-%m-%d %H:00}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'hour'], name='unique_listing_view_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+
+
+class ListingNeighbours(models.Model):
+    """
+    «Смотрели также»: объявления, которые чаще всего смотрели те же
+    пользователи - id (int64) и оценки (float32) по убыванию (listings.also_viewed)
+    """
+    listing = models.OneToOneField(Listing, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    neighbours = models.BinaryField(default=b'')
+    scores = models.BinaryField(default=b'')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.listing_id}: {len(self.neighbours) // 8} neighbours"
+
+
+class PriceStats(models.Model):
+    """
+    Цены активных объявлений группы (город, тип жилья) для /listings/price-stats/:
+    отсортированный массив int64 в центах (listings.price_stats)
+    """
+    city_location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='+')
+    property_type = models.CharField(max_length=50, choices=Listing.PROPERTY_TYPES)
+    count = models.PositiveIntegerField(default=0)
+    prices = models.BinaryField(default=b'')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.city_location_id}/{self.property_type}: {self.count} prices"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['city_location', 'property_type'], name='unique_price_stats_group'),
+        ]
+
+
+class ListingSearchDocument(models.Model):
+    """
+    Теневая FTS5 таблица для поиска на SQLite (создаётся миграцией).
+    Колонки с текстом не описаны: нужны только MATCH и rank
+    """
+    listing = models.OneToOneField(
+        Listing,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_document'
+    )
+    document = FullTextField(db_column=FTS_TABLE)
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = FTS_TABLE
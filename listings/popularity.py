@@ -0,0 +1,147 @@
+"""
+Счётчики просмотров и «трендовые» объявления.
+
+Listing.views_count увеличивается при записи просмотра, поэтому
+популярные за всё время - это ORDER BY views_count по индексу, без
+COUNT по ViewHistory. Для окон 24h / 7d просмотры копятся в часовых
+корзинах ListingViewBucket; счёт корзины затухает экспоненциально
+с возрастом. Топ по окнам пересчитывается командой refresh_popular
+(по расписанию) и хранится в кэше.
+
+Просмотры пишутся не в запросе, а через буфер пачками: уникальный
+(user, listing) в ViewHistory + INSERT IGNORE, счётчики растут только
+на действительно новые пары.
+"""
+import heapq
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from rental_project.buffer import BufferedWriter
+from users.models import User
+
+from .cache import get_cache
+from .models import Listing, ListingViewBucket, ViewHistory
+
+POPULAR_LIMIT = 10
+# Сколько id храним в кэше: часть объявлений может стать неактивной
+# между пересчётами, топ добирается из запаса
+TRENDING_STORED = 50
+TRENDING_CACHE_TIMEOUT = 60 * 60
+# Окно -> период полураспада в часах
+TRENDING_WINDOWS = {
+    '24h': (timedelta(hours=24), 6),
+    '7d': (timedelta(days=7), 48),
+}
+WINDOW_ALL = 'all'
+WINDOW_CHOICES = (*TRENDING_WINDOWS, WINDOW_ALL)
+
+
+def current_hour(now=None):
+    return (now or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+def record_view(user, listing_id):
+    """Ставит просмотр в очередь на запись; сам запрос в БД не ходит"""
+    return view_buffer.add((user.pk, int(listing_id)))
+
+
+def write_views(events):
+    """Пишет пачку (user_id, listing_id); повторные просмотры игнорируются"""
+    pairs = set(events)
+    user_ids = {user_id for user_id, _ in pairs}
+    listing_ids = {listing_id for _, listing_id in pairs}
+    # Пользователь или объявление могли быть удалены, пока событие ждало в буфере
+    user_ids &= set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+    listing_ids &= set(Listing.objects.filter(pk__in=listing_ids).values_list('pk', flat=True))
+    existing = set(
+        ViewHistory.objects.filter(user_id__in=user_ids, listing_id__in=listing_ids).values_list(
+            'user_id', 'listing_id'
+        )
+    )
+    new = [
+        (user_id, listing_id) for user_id, listing_id in pairs
+        if user_id in user_ids and listing_id in listing_ids and (user_id, listing_id) not in existing
+    ]
+    if not new:
+        return
+    # ignore_conflicts: параллельный flush другого воркера мог вставить ту же пару
+    ViewHistory.objects.bulk_create(
+        [ViewHistory(user_id=user_id, listing_id=listing_id) for user_id, listing_id in new],
+        ignore_conflicts=True,
+    )
+    count_views(Counter(listing_id for _, listing_id in new))
+
+
+view_buffer = BufferedWriter('view_history', write_views)
+
+
+def count_views(counts, hour=None):
+    """Увеличивает views_count и часовые корзины: {listing_id: число новых просмотров}"""
+    hour = hour or current_hour()
+    for listing_id, count in counts.items():
+        # update() не трогает updated_at: просмотр не меняет объявление
+        Listing.objects.filter(pk=listing_id).update(views_count=F('views_count') + count)
+        bucket = ListingViewBucket.objects.filter(listing_id=listing_id, hour=hour)
+        if bucket.update(count=F('count') + count):
+            continue
+        try:
+            with transaction.atomic():
+                ListingViewBucket.objects.create(listing_id=listing_id, hour=hour, count=count)
+        except IntegrityError:
+            # Корзину только что создал параллельный запрос
+            bucket.update(count=F('count') + count)
+
+
+def trending_scores(window, now=None):
+    """{listing_id: score} по корзинам окна с экспоненциальным затуханием"""
+    period, half_life = TRENDING_WINDOWS[window]
+    now = current_hour(now)
+    scores = {}
+    buckets = ListingViewBucket.objects.filter(hour__gt=now - period).values_list(
+        'listing_id', 'hour', 'count'
+    )
+    for listing_id, hour, count in buckets.iterator():
+        age = (now - hour).total_seconds() / 3600
+        scores[listing_id] = scores.get(listing_id, 0) + count * 0.5 ** (age / half_life)
+    return scores
+
+
+def compute_trending(window, limit=TRENDING_STORED, now=None):
+    """id активных объявлений с наибольшим счётом (по убыванию)"""
+    scores = trending_scores(window, now)
+    active = set(Listing.objects.filter(pk__in=list(scores), is_active=True).values_list('pk', flat=True))
+    return heapq.nlargest(limit, active, key=lambda pk: (scores[pk], pk))
+
+
+def trending_key(window):
+    return f'listings:trending:{window}'
+
+
+def refresh_trending(now=None):
+    """Пересчитывает топ всех окон; вызывается командой refresh_popular"""
+    cache = get_cache()
+    result = {}
+    for window in TRENDING_WINDOWS:
+        result[window] = compute_trending(window, now=now)
+        cache.set(trending_key(window), result[window], TRENDING_CACHE_TIMEOUT)
+    return result
+
+
+def get_trending_ids(window):
+    """Топ окна из кэша; если пересчёта ещё не было - считаем сразу"""
+    cache = get_cache()
+    ids = cache.get(trending_key(window))
+    if ids is None:
+        ids = compute_trending(window)
+        cache.set(trending_key(window), ids, TRENDING_CACHE_TIMEOUT)
+    return ids
+
+
+def prune_buckets(now=None):
+    """Удаляет корзины старше самого длинного окна"""
+    longest = max(period for period, _ in TRENDING_WINDOWS.values())
+    return ListingViewBucket.objects.filter(hour__lte=current_hour(now) - longest).delete()[0]
@@ -0,0 +1,225 @@
+"""
+Статистика цен для /listings/price-stats/ (слайдер цены, «типичная цена»).
+
+Для каждой группы (город, тип жилья) в PriceStats лежит отсортированный
+массив цен активных объявлений (int64, центы). Ответ собирается из
+массивов нужных групп векторно в NumPy: min/max/среднее, перцентили и
+гистограмма с фиксированным числом корзин - таблица объявлений при
+запросе не читается.
+
+Массивы обновляются точечно: при сохранении и удалении объявления
+(сигналы) и при массовой загрузке старая цена удаляется из группы, новая
+вставляется через searchsorted, без пересчёта группы. Полная пересборка -
+manage.py refresh_price_stats.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+
+from .cache import get_cache, make_key
+
+PRICE_PERCENTILES = (10, 25, 50, 75, 90)
+PRICE_HISTOGRAM_BUCKETS = 20
+MAX_HISTOGRAM_BUCKETS = 100
+PRICE_STATS_CACHE_TIMEOUT = 300
+
+
+def to_cents(price):
+    return int((Decimal(price) * 100).to_integral_value())
+
+
+PRICE_FIELDS = ('city_location_id', 'property_type', 'price', 'is_active')
+
+UNKNOWN = object()
+
+
+def listing_price_key(listing, loaded=False):
+    """
+    (город, тип, цена в центах) активного объявления или None. loaded=True -
+    состояние на момент загрузки из БД (UNKNOWN, если объявление загружено
+    не целиком или создано в памяти)
+    """
+    if loaded:
+        values = getattr(listing, '_loaded_values', {})
+        if not all(name in values for name in PRICE_FIELDS):
+            return UNKNOWN
+    else:
+        values = {name: getattr(listing, name) for name in PRICE_FIELDS}
+    if not values['is_active'] or values['city_location_id'] is None or values['price'] is None:
+        return None
+    return values['city_location_id'], values['property_type'], to_cents(values['price'])
+
+
+class PriceStatsUpdater:
+    """Копит изменения цен по группам и применяет их одной записью на группу"""
+
+    def __init__(self):
+        self._removed = defaultdict(list)
+        self._added = defaultdict(list)
+        self._rebuild = set()
+
+    def track(self, old, new):
+        """old / new - listing_price_key() до и после изменения"""
+        if old is UNKNOWN:
+            # Прежняя цена неизвестна - группу нового состояния пересобираем по БД
+            if new is not None:
+                self._rebuild.add(new[:2])
+            return
+        if old == new:
+            return
+        if old is not None:
+            self._removed[old[:2]].append(old[2])
+        if new is not None:
+            self._added[new[:2]].append(new[2])
+
+    def listing_saved(self, listing, created=False):
+        old = None if created else listing_price_key(listing, loaded=True)
+        self.track(old, listing_price_key(listing))
+
+    def listing_deleted(self, listing):
+        old = listing_price_key(listing, loaded=True)
+        self.track(listing_price_key(listing) if old is UNKNOWN else old, None)
+
+    def apply(self):
+        from .models import Listing, PriceStats
+
+        groups = sorted(set(self._removed) | set(self._added) | self._rebuild)
+        if not groups:
+            return
+        with transaction.atomic():
+            for group in groups:
+                city_location_id, property_type = group
+                stats, _ = PriceStats.objects.select_for_update().get_or_create(
+                    city_location_id=city_location_id, property_type=property_type
+                )
+                if group in self._rebuild:
+                    rows = Listing.objects.filter(
+                        is_active=True, city_location_id=city_location_id, property_type=property_type,
+                    ).values_list('city_location_id', 'property_type', 'price')
+                    prices = group_prices(list(rows)).get(group, np.empty(0, dtype=np.int64))
+                else:
+                    prices = load_prices(stats.prices)
+                    prices = remove_prices(prices, self._removed.get(group, ()))
+                    prices = insert_prices(prices, self._added.get(group, ()))
+                stats.prices = prices.tobytes()
+                stats.count = len(prices)
+                stats.save(update_fields=['prices', 'count', 'updated_at'])
+        self._removed.clear()
+        self._added.clear()
+        self._rebuild.clear()
+
+
+def load_prices(blob):
+    return np.frombuffer(bytes(blob or b''), dtype=np.int64)
+
+
+def insert_prices(prices, values):
+    if not len(values):
+        return prices
+    values = np.sort(np.asarray(values, dtype=np.int64))
+    return np.insert(prices, np.searchsorted(prices, values), values)
+
+
+def remove_prices(prices, values):
+    """Удаляет по одному вхождению каждой цены; отсутствующие (рассинхрон) пропускаются"""
+    if not len(values) or not len(prices):
+        return prices
+    values = np.sort(np.asarray(values, dtype=np.int64))
+    # Повторы одной цены - соседние позиции: первая + номер повтора
+    _, first, counts = np.unique(values, return_index=True, return_counts=True)
+    positions = np.searchsorted(prices, values) + (np.arange(len(values)) - np.repeat(first, counts))
+    inside = positions < len(prices)
+    positions = positions[inside]
+    positions = positions[prices[positions] == values[inside]]
+    return np.delete(prices, positions)
+
+
+def group_prices(rows):
+    """(city_location_id, property_type, price) -> {(город, тип): отсортированный массив центов}"""
+    rows = [row for row in rows if row[0] is not None and row[2] is not None]
+    if not rows:
+        return {}
+    cities = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    type_names = sorted({row[1] for row in rows})
+    type_codes = {name: code for code, name in enumerate(type_names)}
+    types = np.fromiter((type_codes[row[1]] for row in rows), dtype=np.int64, count=len(rows))
+    cents = np.rint(np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows)) * 100).astype(np.int64)
+
+    order = np.lexsort((cents, types, cities))
+    cities, types, cents = cities[order], types[order], cents[order]
+    boundaries = np.flatnonzero((np.diff(cities) != 0) | (np.diff(types) != 0)) + 1
+    starts = np.concatenate(([0], boundaries))
+    return {
+        (int(cities[start]), type_names[types[start]]): chunk
+        for start, chunk in zip(starts, np.split(cents, boundaries))
+    }
+
+
+def rebuild_price_stats(listing_model=None, stats_model=None):
+    """Пересобирает все группы по таблице объявлений; возвращает число групп"""
+    if listing_model is None or stats_model is None:
+        from .models import Listing, PriceStats
+        listing_model, stats_model = Listing, PriceStats
+    rows = listing_model.objects.filter(is_active=True).values_list('city_location_id', 'property_type', 'price')
+    groups = group_prices(list(rows))
+    with transaction.atomic():
+        stats_model.objects.all().delete()
+        stats_model.objects.bulk_create([
+            stats_model(city_location_id=city, property_type=property_type, count=len(prices), prices=prices.tobytes())
+            for (city, property_type), prices in groups.items()
+        ], batch_size=500)
+    return len(groups)
+
+
+def compute_price_stats(prices, buckets=PRICE_HISTOGRAM_BUCKETS):
+    """Сводка по массиву цен в центах"""
+    if not len(prices):
+        return {'count': 0, 'min': None, 'max': None, 'mean': None, 'percentiles': None, 'histogram': []}
+    low, high = int(prices.min()), int(prices.max())
+    percentiles = np.percentile(prices, PRICE_PERCENTILES)
+    counts, edges = np.histogram(prices, bins=buckets, range=(low, high if high > low else low + 1))
+    return {
+        'count': int(len(prices)),
+        'min': _money(low),
+        'max': _money(high),
+        'mean': _money(prices.mean()),
+        'percentiles': {f'p{p}': _money(value) for p, value in zip(PRICE_PERCENTILES, percentiles)},
+        'histogram': [
+            {'from': _money(start), 'to': _money(end), 'count': int(count)}
+            for start, end, count in zip(edges[:-1], edges[1:], counts)
+        ],
+    }
+
+
+def get_price_stats(city_location_ids=None, property_types=None, buckets=PRICE_HISTOGRAM_BUCKETS):
+    """
+    Статистика по группам фильтра (None - без ограничения). Ответ кэшируется
+    по версиям (updated_at) групп: новых данных нет - массивы не читаются
+    """
+    from .models import PriceStats
+
+    queryset = PriceStats.objects.all()
+    if city_location_ids is not None:
+        queryset = queryset.filter(city_location_id__in=city_location_ids)
+    if property_types is not None:
+        queryset = queryset.filter(property_type__in=property_types)
+
+    cache = get_cache()
+    versions = sorted(queryset.values_list('pk', 'updated_at'))
+    key = make_key('listings:price-stats', buckets, *(f'{pk}:{updated_at.isoformat()}' for pk, updated_at in versions))
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    arrays = [load_prices(blob) for blob in queryset.values_list('prices', flat=True)]
+    prices = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int64)
+    result = compute_price_stats(prices, buckets)
+    cache.set(key, result, PRICE_STATS_CACHE_TIMEOUT)
+    return result
+
+
+def _money(cents):
+    return round(float(cents) / 100, 2)
+
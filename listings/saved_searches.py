@@ -0,0 +1,152 @@
+"""
+Сохранённые поиски и «входящие» (/saved-searches/, /saved-searches/inbox/).
+
+Вместо того чтобы арендатор раз за разом повторял один и тот же поиск,
+новое объявление само сопоставляется с сохранёнными поисками при
+создании (в том числе массовой загрузкой) и при включении через
+toggle_active. Перебора всех поисков нет: у каждого поиска в
+SavedSearchKey лежат ключи (город, тип, ценовой диапазон), которые он
+покрывает, и кандидаты для объявления находятся одним запросом по индексу.
+Точные границы цены, комнаты, тип и город кандидата проверяются в
+памяти; район, даты и поиск подстрокой - ListingFilter по самим
+объявлениям, один запрос на набор одинаковых параметров. Совпадения
+пишутся в SavedSearchMatch после коммита.
+"""
+import json
+import operator
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.http import QueryDict
+
+from .facets import PRICE_BANDS
+from .filters import LOCATION_MATCH_CONTAINS, ListingFilter
+from .locations import location_lookup
+from .models import Listing, Location, SavedSearch, SavedSearchKey, SavedSearchMatch
+
+MAX_SAVED_SEARCHES = 20
+# Параметры ListingFilter, которые можно сохранить (неактивные и чужие
+# объявления во входящие не попадают - is_active и owner не нужны)
+SAVED_SEARCH_PARAMS = tuple(name for name in ListingFilter.base_filters if name not in ('is_active', 'owner'))
+# Поиски только с этими параметрами проверяются без запроса к БД
+SIMPLE_PARAMS = {'city', 'property_type', 'min_price', 'max_price', 'min_rooms', 'max_rooms'}
+
+
+def price_band(price):
+    """Номер ценового диапазона facets.PRICE_BANDS (последний - открытый)"""
+    return bisect_right(PRICE_BANDS, float(price))
+
+
+def filter_data(params):
+    """Сохранённые параметры -> данные для ListingFilter"""
+    data = QueryDict(mutable=True)
+    for name, value in params.items():
+        data[name] = value
+    return data
+
+
+def search_keys(params):
+    """Ключи обратного индекса, которые покрывает поиск с такими параметрами"""
+    cities = [None]
+    if params.get('city') and params.get('location_match') != LOCATION_MATCH_CONTAINS:
+        ids = {location_lookup.resolve(Location.KIND_CITY, name) for name in params['city'].split(',') if name.strip()}
+        # Города, которого ещё нет в справочнике, нет и в ключе: такой поиск
+        # индексируется без города, объявление проверит ListingFilter
+        cities = sorted(ids, key=lambda pk: (pk is not None, pk))
+    property_type = params.get('property_type', '')
+    low = price_band(params['min_price']) if params.get('min_price') else 0
+    high = price_band(params['max_price']) if params.get('max_price') else len(PRICE_BANDS)
+    return [
+        (city, property_type, band)
+        for city in cities
+        for band in range(low, max(low, high) + 1)
+    ]
+
+
+def index_search(search):
+    """Перестраивает ключи поиска (после создания и изменения параметров)"""
+    with transaction.atomic():
+        SavedSearchKey.objects.filter(search=search).delete()
+        SavedSearchKey.objects.bulk_create([
+            SavedSearchKey(search=search, city_location_id=city, property_type=property_type, price_band=band)
+            for city, property_type, band in search_keys(search.params)
+        ])
+
+
+def schedule_matching(listing_ids):
+    """Сопоставление после коммита: объявление уже видно, ошибка не откатит сохранение"""
+    listing_ids = list(listing_ids)
+    if listing_ids:
+        transaction.on_commit(lambda: match_listings(listing_ids))
+
+
+def match_listings(listing_ids):
+    """Пишет во входящие совпадения объявлений listing_ids с сохранёнными поисками"""
+    rows = Listing.objects.filter(pk__in=listing_ids, is_active=True).values_list(
+        'pk', 'owner_id', 'city_location_id', 'property_type', 'price', 'rooms'
+    )
+    listings = {row[0]: row for row in rows}
+    groups = defaultdict(list)
+    for pk, _, city_location_id, property_type, price, _ in listings.values():
+        groups[(city_location_id, property_type, price_band(price))].append(pk)
+
+    candidates = defaultdict(set)
+    for (city_location_id, property_type, band), pks in groups.items():
+        city = Q(city_location__isnull=True)
+        if city_location_id is not None:
+            city |= Q(city_location_id=city_location_id)
+        search_ids = SavedSearchKey.objects.filter(
+            city, price_band=band, property_type__in=[property_type, ''],
+        ).values_list('search_id', flat=True).distinct()
+        for search_id in search_ids:
+            candidates[search_id].update(pks)
+    if not candidates:
+        return 0
+
+    # Одинаковые параметры (частый случай) проверяются один раз
+    by_params = defaultdict(list)
+    for search_id, user_id, params in SavedSearch.objects.filter(pk__in=list(candidates)).values_list(
+        'pk', 'user_id', 'params'
+    ):
+        by_params[json.dumps(params, sort_keys=True)].append((search_id, user_id))
+
+    matches = []
+    for params, searches in by_params.items():
+        params = json.loads(params)
+        pks = set().union(*(candidates[search_id] for search_id, _ in searches))
+        matched = {pk for pk in pks if _matches_simple(params, listings[pk])}
+        if matched and not set(params) <= SIMPLE_PARAMS:
+            # Район, даты, поиск подстрокой - проверяет сам ListingFilter
+            filterset = ListingFilter(filter_data(params), queryset=Listing.objects.filter(pk__in=matched))
+            matched = set(filterset.qs.values_list('pk', flat=True))
+        for search_id, user_id in searches:
+            matches.extend(
+                SavedSearchMatch(search_id=search_id, user_id=user_id, listing_id=pk)
+                for pk in sorted(candidates[search_id] & matched)
+                # Своё объявление владельцу во входящие не кладём
+                if listings[pk][1] != user_id
+            )
+    # Повторное включение объявления не дублирует совпадение
+    SavedSearchMatch.objects.bulk_create(matches, ignore_conflicts=True, batch_size=1000)
+    return len(matches)
+
+
+def _matches_simple(params, listing):
+    """Условия, которые проверяются без БД (то же, что делает с ними ListingFilter)"""
+    _, _, city_location_id, property_type, price, rooms = listing
+    if params.get('property_type') and params['property_type'] != property_type:
+        return False
+    for name, value, compare in (
+        ('min_price', price, operator.ge), ('max_price', price, operator.le),
+        ('min_rooms', rooms, operator.ge), ('max_rooms', rooms, operator.le),
+    ):
+        if params.get(name) and not compare(value, Decimal(params[name])):
+            return False
+    if params.get('city') and params.get('location_match') != LOCATION_MATCH_CONTAINS:
+        names = [name for name in params['city'].split(',') if name.strip()]
+        if city_location_id not in location_lookup.resolve_many(Location.KIND_CITY, names):
+            return False
+    return True
@@ -0,0 +1,184 @@
+"""
+Полнотекстовый поиск по объявлениям.
+
+Бэкенд выбирается по движку БД: на MySQL используется FULLTEXT индекс
+(MATCH ... AGAINST), на SQLite - теневая FTS5 таблица, на остальных
+движках - старый вариант через icontains. Явно бэкенд можно задать
+через settings.LISTING_SEARCH_BACKEND (dotted path к классу).
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, models
+from django.db.models import F, FloatField, Lookup, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+SEARCH_FIELDS = ('title', 'description', 'location', 'city', 'district')
+FTS_TABLE = 'listings_listing_fts'
+
+# Ограничиваем количество слов, чтобы не строить огромные запросы
+MAX_TERMS = 10
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class FullTextField(models.TextField):
+    """
+    Скрытая колонка FTS5 таблицы с именем самой таблицы:
+    "<table>"."<table>" MATCH '...' ищет сразу по всем колонкам
+    """
+
+
+@FullTextField.register_lookup
+class FullTextMatch(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+def split_terms(query):
+    """Разбивает поисковую строку на слова (без спецсимволов движков)"""
+    return _TERM_RE.findall(query or '')[:MAX_TERMS]
+
+
+class BaseSearchBackend:
+    """
+    Интерфейс бэкенда поиска.
+
+    search() фильтрует queryset, добавляет аннотацию search_rank
+    (больше - релевантнее) и сортирует по ней. Строка без слов (?search=!!!)
+    ничего не находит, как и в SearchFilter.
+    index()/remove() держат индекс в синхронизации с таблицей объявлений.
+    """
+    rank_annotation = 'search_rank'
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def without_terms(self, queryset, query):
+        """Результат для запроса без слов: пустой, если строка не пустая"""
+        return queryset.none() if (query or '').strip() else queryset
+
+    def index(self, listings):
+        pass
+
+    def remove(self, listing_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class IcontainsSearchBackend(BaseSearchBackend):
+    """Старое поведение SearchFilter: AND по словам, OR по полям"""
+
+    def search(self, queryset, query):
+        terms = split_terms(query)
+        if not terms:
+            return self.without_terms(queryset, query)
+        for term in terms:
+            condition = Q()
+            for field in SEARCH_FIELDS:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset
+
+
+class MySQLFulltextBackend(BaseSearchBackend):
+    """MATCH ... AGAINST по FULLTEXT индексу (индекс обновляет сама InnoDB)"""
+
+    # innodb_ft_min_token_size по умолчанию - более короткие слова не индексируются
+    min_token_size = 3
+
+    def search(self, queryset, query):
+        terms = [t for t in split_terms(query) if len(t) >= self.min_token_size]
+        if not terms:
+            return IcontainsSearchBackend().search(queryset, query)
+
+        table = queryset.model._meta.db_table
+        columns = ', '.join(f'{table}.{field}' for field in SEARCH_FIELDS)
+        against = ' '.join(f'+{term}*' for term in terms)
+        match = RawSQL(
+            f'MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)',
+            [against],
+            output_field=FloatField(),
+        )
+        return queryset.annotate(**{self.rank_annotation: match}).filter(
+            **{f'{self.rank_annotation}__gt': 0}
+        ).order_by(f'-{self.rank_annotation}', '-id')
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """Теневая FTS5 таблица (ListingSearchDocument), rowid = id объявления"""
+
+    def search(self, queryset, query):
+        terms = split_terms(query)
+        if not terms:
+            return self.without_terms(queryset, query)
+
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # rank в FTS5 - это bm25(): чем меньше, тем релевантнее
+        return queryset.filter(search_document__document__match=match).annotate(
+            **{self.rank_annotation: -F('search_document__rank')}
+        ).order_by(f'-{self.rank_annotation}', '-id')
+
+    def index(self, listings):
+        listings = list(listings)
+        if not listings:
+            return
+        self.remove([listing.pk for listing in listings])
+        columns = ', '.join(SEARCH_FIELDS)
+        placeholders = ', '.join(['%s'] * (len(SEARCH_FIELDS) + 1))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES ({placeholders})',
+                [
+                    [listing.pk] + [getattr(listing, field) or '' for field in SEARCH_FIELDS]
+                    for listing in listings
+                ],
+            )
+
+    def remove(self, listing_ids):
+        listing_ids = list(listing_ids)
+        if not listing_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(listing_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                listing_ids,
+            )
+
+    def rebuild(self):
+        columns = ', '.join(SEARCH_FIELDS)
+        source = ', '.join(f"COALESCE({field}, '')" for field in SEARCH_FIELDS)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, {columns}) '
+                f'SELECT id, {source} FROM listings_listing'
+            )
+
+
+VENDOR_BACKENDS = {
+    'mysql': MySQLFulltextBackend,
+    'sqlite': SQLiteFTS5Backend,
+}
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path, vendor):
+    if path:
+        return import_string(path)()
+    return VENDOR_BACKENDS.get(vendor, IcontainsSearchBackend)()
+
+
+def get_search_backend():
+    """Текущий бэкенд поиска для подключения по умолчанию"""
+    path = getattr(settings, 'LISTING_SEARCH_BACKEND', None)
+    return _load_backend(path, connection.vendor)
@@ -1,16 +1,317 @@
-from rest_framework import serializers
-from .models import Listing
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.settings import api_settings
+from rental_project.fieldsets import SparseFieldsetSerializerMixin
+from rental_project.pagination import keyset_columns
+from rental_project.images import (
+    IMAGE_PENDING, IMAGE_READY, KIND_LISTING, image_processor, validate_image_upload, variant_urls,
+)
+from users.models import User
+from .filters import ListingFilter
+from .models import Listing, ListingImage, SavedSearch, SavedSearchMatch
+from .saved_searches import MAX_SAVED_SEARCHES, SAVED_SEARCH_PARAMS, filter_data
 
 
-class ListingSerializer(serializers.ModelSerializer):
+class ListingListSerializer(serializers.ListSerializer):
+    """Страница из ListingRows.values() (словари) сериализуется быстрым путём"""
+
+    def to_representation(self, data):
+        rows = data if isinstance(data, list) else list(data)
+        if rows and isinstance(rows[0], dict):
+            return listing_rows.serialize(rows, self.child)
+        return super().to_representation(rows)
+
+
+class MainImageField(serializers.Field):
+    """Обложка объявления: {id, status, variants} или null"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return self.represent(value.pk, value.image.name, value.status, self.context.get('request'))
+
+    @staticmethod
+    def represent(pk, name, status, request):
+        variants = None
+        if status == IMAGE_READY:
+            variants = variant_urls(name, KIND_LISTING, request)
+        return {'id': pk, 'status': status, 'variants': variants}
+
+
+class ListingSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     owner = serializers.StringRelatedField()
+    main_image = MainImageField()
+    # Есть только в ответе на запрос с ?lat=&lng=&radius_km=
+    distance_km = serializers.FloatField(read_only=True)
 
     class Meta:
         model = Listing
-        fields = '__all__'
+        # Служебные колонки: ключ импорта арендодателя, ячейка geohash,
+        # ссылки на справочник локаций - в публичный ответ и выгрузку не идут
+        exclude = ('external_ref', 'geohash', 'city_location', 'district_location')
+        list_serializer_class = ListingListSerializer
 
 
 class ListingCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Listing
-        exclude = ('owner', 'created_at', 'updated_at')
\ No newline at end of file
+        exclude = ('owner', 'created_at', 'updated_at')
+
+    def validate_external_ref(self, value):
+        # Пустая строка - это «без идентификатора», иначе она нарушила бы уникальность
+        value = (value or '').strip() or None
+        request = self.context.get('request')
+        if value is not None and request is not None:
+            existing = Listing.objects.filter(owner=request.user, external_ref=value)
+            if self.instance is not None:
+                existing = existing.exclude(pk=self.instance.pk)
+            if existing.exists():
+                raise serializers.ValidationError('Listing with this external_ref already exists')
+        return value
+
+
+class ListingImageSerializer(serializers.ModelSerializer):
+    """Фото объявления: загружается оригинал, в ответе - URL вариантов после обработки"""
+    image = serializers.ImageField(write_only=True)
+    variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ListingImage
+        fields = ('id', 'image', 'is_main', 'status', 'variants')
+        read_only_fields = ('status',)
+
+    def get_variants(self, obj):
+        if obj.status != IMAGE_READY:
+            return None
+        return variant_urls(obj.image.name, KIND_LISTING, self.context.get('request'))
+
+    def validate_image(self, value):
+        return validate_image_upload(value)
+
+    def create(self, validated_data):
+        name, status = image_processor.prepare(validated_data.pop('image'), KIND_LISTING)
+        instance = ListingImage.objects.create(image=name, status=status, **validated_data)
+        if status == IMAGE_PENDING:
+            image_processor.schedule(name, KIND_LISTING)
+        return instance
+
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    """Сохранённый поиск: params - параметры фильтра списка (?city=&min_price=...)"""
+
+    class Meta:
+        model = SavedSearch
+        fields = ('id', 'name', 'params', 'created_at')
+
+    def validate_params(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('Must be an object of list filter parameters')
+        unknown = sorted(set(value) - set(SAVED_SEARCH_PARAMS))
+        if unknown:
+            raise serializers.ValidationError(f'Unknown parameters: {", ".join(unknown)}')
+        params = {name: str(item).strip() for name, item in value.items() if item is not None and str(item).strip()}
+        if not params:
+            raise serializers.ValidationError('At least one filter parameter is required')
+        filterset = ListingFilter(filter_data(params), queryset=Listing.objects.none())
+        if not filterset.is_valid():
+            raise serializers.ValidationError(filterset.errors)
+        try:
+            # Ошибки, которые фильтр находит только при применении (check_out <= check_in)
+            filterset.qs
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError(exc.detail)
+        return params
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        if self.instance is None and SavedSearch.objects.filter(user=user).count() >= MAX_SAVED_SEARCHES:
+            raise serializers.ValidationError(f'At most {MAX_SAVED_SEARCHES} saved searches per user')
+        return attrs
+
+
+class SavedSearchMatchSerializer(serializers.ModelSerializer):
+    """Запись во входящих: объявление, подошедшее под сохранённый поиск"""
+    search_name = serializers.CharField(source='search.name', read_only=True)
+    listing = ListingSerializer(read_only=True)
+
+    class Meta:
+        model = SavedSearchMatch
+        fields = ('id', 'search', 'search_name', 'listing', 'is_read', 'created_at')
+
+
+class ListingRows:
+    """
+    Быстрый путь для списков объявлений: .values() вместо моделей.
+
+    Для каждого поля ListingSerializer один раз строится шаг плана
+    (колонка values() и вид форматирования), строки страницы
+    превращаются в словари с теми же ключами в том же порядке и с теми
+    же значениями, что дал бы ListingSerializer - JSON совпадает
+    байт в байт. Не создаются экземпляры Listing и User, owner собирается
+    так же, как User.__str__, без get_user_type_display() на каждой строке.
+    """
+    owner_columns = ('owner__username', 'owner__user_type')
+    main_image_columns = ('main_image_id', 'main_image__image', 'main_image__status')
+
+    def __init__(self):
+        # По одному шагу на поле сериализатора: ?fields= выбирает подмножество
+        # из конечного списка полей, и кэш не растёт от их сочетаний
+        self._steps = {}
+
+    def get_plan(self, serializer):
+        """[(ключ, колонка values(), вид форматирования, поле), ...]"""
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            key = (type(serializer), name)
+            step = self._steps.get(key)
+            if step is None:
+                step = self._steps[key] = self._compile(name, field)
+            plan.append(step)
+        return plan
+
+    def _compile(self, name, field):
+        if name == 'owner':
+            return name, None, 'owner', field
+        if isinstance(field, MainImageField):
+            return name, None, 'main_image', field
+        if isinstance(field, PrimaryKeyRelatedField):
+            return name, field.source, 'raw', field
+        if isinstance(field, serializers.DateTimeField):
+            return name, field.source, 'datetime', field
+        if isinstance(field, serializers.DecimalField):
+            return name, field.source, 'decimal', field
+        if isinstance(field, serializers.ChoiceField):
+            return name, field.source, 'choice', field
+        if isinstance(field, (serializers.IntegerField, serializers.FloatField,
+                              serializers.BooleanField, serializers.CharField)):
+            return name, field.source, 'simple', field
+        return name, field.source, 'field', field
+
+    def values(self, queryset, serializer, required=()):
+        """
+        queryset -> .values() с колонками плана, колонками курсора
+        keyset-пагинации и required (нужны вьюсету помимо ответа)
+        """
+        columns = []
+        annotations = queryset.query.annotations
+        for name, column, kind, field in self.get_plan(serializer):
+            if kind == 'owner':
+                columns.extend(self.owner_columns)
+            elif kind == 'main_image':
+                columns.extend(self.main_image_columns)
+            elif field.read_only and column not in annotations and not _is_model_field(column):
+                # distance_km и подобные - только если queryset их аннотирует
+                continue
+            else:
+                columns.append(column)
+        # pk и весь фактический порядок keyset-пагинации (с Meta.ordering и
+        # tie-breaker) - из них собирается курсор, даже если ?fields= их не просит;
+        # required - колонки ETag страницы
+        for column in [Listing._meta.pk.name, *keyset_columns(queryset), *required]:
+            if column not in columns and (column in annotations or _is_model_field(column)):
+                columns.append(column)
+        return queryset.prefetch_related(None).values(*columns)
+
+    def serialize(self, rows, serializer):
+        first = rows[0]
+        user_types = dict(User.USER_TYPES)
+        # Поля плана - от первого сериализатора с этим набором полей, request берём текущий
+        request = serializer.context.get('request')
+        converters = []
+        for name, column, kind, field in self.get_plan(serializer):
+            if column is not None and column not in first:
+                continue
+            converters.append((name, column, self._converter(kind, field, user_types, request)))
+
+        result = []
+        for row in rows:
+            item = {}
+            for name, column, convert in converters:
+                if column is None:
+                    item[name] = convert(row)
+                    continue
+                value = row[column]
+                item[name] = None if value is None else convert(value)
+            result.append(item)
+        return result
+
+    def _converter(self, kind, field, user_types, request):
+        if kind == 'owner':
+            def owner(row):
+                if row['owner__username'] is None:
+                    return None
+                user_type = row['owner__user_type']
+                return f"{row['owner__username']} ({user_types.get(user_type, user_type)})"
+            return owner
+
+        if kind == 'main_image':
+            def main_image(row):
+                if row['main_image_id'] is None:
+                    return None
+                return field.represent(
+                    row['main_image_id'], row['main_image__image'], row['main_image__status'], request
+                )
+            return main_image
+
+        if kind == 'raw':
+            return _identity
+
+        if kind == 'simple':
+            return {
+                serializers.IntegerField: int,
+                serializers.FloatField: float,
+                serializers.BooleanField: bool,
+                serializers.CharField: str,
+            }.get(type(field), field.to_representation)
+
+        if kind == 'decimal':
+            exponent = -field.decimal_places
+            coerce_to_string = getattr(field, 'coerce_to_string', None)
+            if coerce_to_string is None:
+                coerce_to_string = api_settings.COERCE_DECIMAL_TO_STRING
+            if not coerce_to_string or field.localize:
+                return field.to_representation
+
+            def decimal(value):
+                # Из БД Decimal уже с нужным числом знаков - quantize не нужен
+                if value.as_tuple().exponent == exponent:
+                    return f'{value:f}'
+                return field.to_representation(value)
+            return decimal
+
+        if kind == 'datetime':
+            output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+            field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+            if field_timezone is None or output_format is None or output_format.lower() != ISO_8601:
+                return field.to_representation
+
+            def datetime(value):
+                if value.tzinfo is None:
+                    return field.to_representation(value)
+                value = value.astimezone(field_timezone).isoformat()
+                if value.endswith('+00:00'):
+                    value = value[:-6] + 'Z'
+                return value
+            return datetime
+
+        return field.to_representation
+
+
+def _identity(value):
+    return value
+
+
+def _is_model_field(name):
+    try:
+        Listing._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+listing_rows = ListingRows()
@@ -0,0 +1,79 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import invalidate_listing
+from .locations import location_lookup
+from .main_images import update_main_images
+from .models import Listing, ListingImage, Location
+from .price_stats import PriceStatsUpdater
+from .saved_searches import schedule_matching
+from .search import get_search_backend
+from .similar import similar_index
+
+
+@receiver(post_save, sender=Listing)
+def index_listing(sender, instance, **kwargs):
+    """Синхронизируем поисковый индекс при сохранении объявления"""
+    get_search_backend().index([instance])
+
+
+@receiver(post_delete, sender=Listing)
+def unindex_listing(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def invalidate_listing_caches(sender, instance, **kwargs):
+    """Создание, изменение (в т.ч. toggle_active) и удаление сбрасывают кэши списков и карточки"""
+    # _loaded_values обновляется после сигнала - здесь в нём ещё город до изменения
+    old_city = getattr(instance, '_loaded_values', {}).get('city')
+    invalidate_listing(instance, old_city)
+
+
+@receiver(post_save, sender=Listing)
+def update_price_stats(sender, instance, created, **kwargs):
+    """Цена, тип, город или активность изменились - переносим цену в статистике групп"""
+    updater = PriceStatsUpdater()
+    updater.listing_saved(instance, created)
+    updater.apply()
+
+
+@receiver(post_delete, sender=Listing)
+def remove_price_stats(sender, instance, **kwargs):
+    updater = PriceStatsUpdater()
+    updater.listing_deleted(instance)
+    updater.apply()
+
+
+@receiver(post_save, sender=Listing)
+def update_similar_index(sender, instance, **kwargs):
+    old_city_location_id = getattr(instance, '_loaded_values', {}).get('city_location_id')
+    similar_index.listing_saved(instance, old_city_location_id)
+
+
+@receiver(post_delete, sender=Listing)
+def remove_from_similar_index(sender, instance, **kwargs):
+    similar_index.listing_deleted(instance)
+
+
+@receiver(post_save, sender=Listing)
+def match_saved_searches(sender, instance, created, **kwargs):
+    """Новое или снова включённое (toggle_active) объявление - во входящие подходящих сохранённых поисков"""
+    was_active = False if created else getattr(instance, '_loaded_values', {}).get('is_active', True)
+    if instance.is_active and not was_active:
+        schedule_matching([instance.pk])
+
+
+@receiver(post_save, sender=ListingImage)
+@receiver(post_delete, sender=ListingImage)
+def update_main_image(sender, instance, **kwargs):
+    """Новое / удалённое фото или смена is_main - пересчитываем обложку объявления"""
+    update_main_images([instance.listing_id])
+
+
+@receiver(post_save, sender=Location)
+def reset_location_lookup(sender, instance, created, **kwargs):
+    """Новая локация - перечитываем таблицу поиска при следующем запросе"""
+    if created:
+        location_lookup.clear()
@@ -0,0 +1,319 @@
+"""
+Похожие объявления (/listings/{id}/similar/).
+
+Каждое активное объявление кодируется вектором признаков: нормированные
+цена (log) и число комнат, one-hot типа жилья, хэшированный one-hot района
+и хэшированный TF-IDF названия и описания. Похожесть - евклидово
+расстояние между векторами (веса блоков - FEATURE_WEIGHTS); оно
+считается через скалярные произведения: |a - b|^2 = |a|^2 + |b|^2 - 2 a.b.
+
+Индекс живёт в памяти процесса, по партиции на город: матрица float32,
+квадраты норм строк и id. Запрос - произведение матрицы города на вектор
+объявления пачками по SIMILAR_BATCH_ROWS строк и argpartition, без
+обращения к БД. Сохранение и удаление объявления в этом процессе сразу
+меняют строку партиции (сигналы); изменения из других процессов
+партиция дочитывает по updated_at раз в SIMILAR_REFRESH_INTERVAL секунд,
+раз в SIMILAR_FULL_REBUILD_INTERVAL строится заново (пересчёт IDF и
+нормировки, удалённые строки выбрасываются).
+"""
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+from django.db import close_old_connections
+
+from .models import Listing
+
+SIMILAR_LIMIT = 10
+MAX_SIMILAR_LIMIT = 50
+SIMILAR_REFRESH_INTERVAL = 60
+SIMILAR_FULL_REBUILD_INTERVAL = 60 * 60
+SIMILAR_BATCH_ROWS = 16384
+DISTRICT_DIMENSIONS = 16
+TEXT_DIMENSIONS = 64
+# Масштаб блоков признаков: чем больше, тем сильнее различие в блоке
+# отдаляет объявления друг от друга
+FEATURE_WEIGHTS = {'price': 2.0, 'rooms': 1.0, 'property_type': 1.5, 'district': 0.7, 'text': 1.0}
+
+PROPERTY_TYPES = [code for code, _ in Listing.PROPERTY_TYPES]
+FEATURE_FIELDS = ('id', 'price', 'rooms', 'property_type', 'district_location_id', 'title', 'description')
+
+_PRICE = 0
+_ROOMS = 1
+_TYPES = 2
+_DISTRICTS = _TYPES + len(PROPERTY_TYPES)
+_TEXT = _DISTRICTS + DISTRICT_DIMENSIONS
+DIMENSIONS = _TEXT + TEXT_DIMENSIONS
+
+_TOKEN_RE = re.compile(r'\w{2,}')
+_TYPE_COLUMNS = {code: _TYPES + index for index, code in enumerate(PROPERTY_TYPES)}
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+class Encoder:
+    """
+    Строки FEATURE_FIELDS -> матрица признаков. Нормировка цены и комнат
+    и IDF считаются по строкам партиции при построении (fit_transform) и
+    дальше не меняются
+    """
+
+    def __init__(self):
+        self._columns = _TokenColumns()
+        self.price_mean, self.price_scale = 0.0, 1.0
+        self.rooms_mean, self.rooms_scale = 0.0, 1.0
+        self.idf = np.ones(TEXT_DIMENSIONS, dtype=np.float32)
+
+    def fit_transform(self, rows):
+        prices, rooms = self._numeric(rows)
+        self.price_mean, self.price_scale = _scaling(prices)
+        self.rooms_mean, self.rooms_scale = _scaling(rooms)
+        counts = self._term_counts(rows)
+        documents = np.count_nonzero(counts, axis=0)
+        self.idf = (np.log((1 + len(rows)) / (1 + documents)) + 1).astype(np.float32)
+        return self._encode(rows, prices, rooms, counts)
+
+    def transform(self, rows):
+        return self._encode(rows, *self._numeric(rows), self._term_counts(rows))
+
+    def _encode(self, rows, prices, rooms, counts):
+        matrix = np.zeros((len(rows), DIMENSIONS), dtype=np.float32)
+        if not rows:
+            return matrix
+        matrix[:, _PRICE] = (prices - self.price_mean) / self.price_scale * FEATURE_WEIGHTS['price']
+        matrix[:, _ROOMS] = (rooms - self.rooms_mean) / self.rooms_scale * FEATURE_WEIGHTS['rooms']
+
+        positions = np.arange(len(rows))
+        types = np.array([_TYPE_COLUMNS.get(row[3], -1) for row in rows])
+        known = types >= 0
+        matrix[positions[known], types[known]] = FEATURE_WEIGHTS['property_type']
+        districts = np.array([-1 if row[4] is None else _DISTRICTS + row[4] % DISTRICT_DIMENSIONS for row in rows])
+        known = districts >= 0
+        matrix[positions[known], districts[known]] = FEATURE_WEIGHTS['district']
+
+        text = counts * self.idf
+        norms = np.linalg.norm(text, axis=1, keepdims=True)
+        np.divide(text, norms, out=text, where=norms > 0)
+        matrix[:, _TEXT:] = text * FEATURE_WEIGHTS['text']
+        return matrix
+
+    @staticmethod
+    def _numeric(rows):
+        prices = np.log1p(np.array([float(row[1]) for row in rows], dtype=np.float64))
+        rooms = np.array([row[2] for row in rows], dtype=np.float64)
+        return prices, rooms
+
+    def _term_counts(self, rows):
+        cells = []
+        for index, row in enumerate(rows):
+            offset = index * TEXT_DIMENSIONS
+            for text in (row[5], row[6]):
+                cells.extend(offset + column for column in map(self._columns.__getitem__, tokenize(text)))
+        counts = np.bincount(np.array(cells, dtype=np.intp), minlength=len(rows) * TEXT_DIMENSIONS)
+        return counts.reshape(len(rows), TEXT_DIMENSIONS).astype(np.float32)
+
+
+class _TokenColumns(dict):
+    """Слово -> колонка хэшированного TF (crc32 считается один раз на слово)"""
+
+    def __missing__(self, token):
+        column = self[token] = zlib.crc32(token.encode('utf-8')) % TEXT_DIMENSIONS
+        return column
+
+
+def _scaling(values):
+    if not len(values):
+        return 0.0, 1.0
+    scale = float(values.std())
+    return float(values.mean()), scale if scale > 1e-9 else 1.0
+
+
+class Partition:
+    """Векторы активных объявлений одного города"""
+
+    def __init__(self, city_location_id):
+        self.city_location_id = city_location_id
+        self._lock = threading.Lock()
+        queryset = Listing.objects.filter(is_active=True, city_location_id=city_location_id)
+        rows = list(queryset.values_list(*FEATURE_FIELDS, 'updated_at'))
+        self.encoder = Encoder()
+        self.seen_at = max((row[-1] for row in rows), default=None)
+        # Снимок для чтения (id, матрица, квадраты норм, живые строки, размер).
+        # Массивы с запасом: добавление строки не копирует матрицу
+        capacity = max(len(rows), 16)
+        ids = np.zeros(capacity, dtype=np.int64)
+        matrix = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        ids[:len(rows)] = [row[0] for row in rows]
+        matrix[:len(rows)] = self.encoder.fit_transform(rows)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(rows)] = True
+        self._snapshot = (ids, matrix, np.einsum('ij,ij->i', matrix, matrix), alive, len(rows))
+        self.positions = {row[0]: index for index, row in enumerate(rows)}
+        self.built_at = self.refreshed_at = time.monotonic()
+
+    def vector(self, listing):
+        position = self.positions.get(listing.pk)
+        if position is not None and self._snapshot[3][position]:
+            return self._snapshot[1][position]
+        return self.encoder.transform([tuple(getattr(listing, field) for field in FEATURE_FIELDS)])[0]
+
+    def nearest(self, vector, limit, exclude=None):
+        """id ближайших объявлений по возрастанию расстояния"""
+        ids, matrix, norms, alive, size = self._snapshot
+        skip = self.positions.get(exclude)
+        candidates, distances = [], []
+        for start in range(0, size, SIMILAR_BATCH_ROWS):
+            end = min(start + SIMILAR_BATCH_ROWS, size)
+            distance = norms[start:end] - 2 * (matrix[start:end] @ vector)
+            distance[~alive[start:end]] = np.inf
+            if skip is not None and start <= skip < end:
+                distance[skip - start] = np.inf
+            take = min(limit, end - start)
+            best = np.argpartition(distance, take - 1)[:take]
+            candidates.append(best + start)
+            distances.append(distance[best])
+        if not candidates:
+            return []
+        candidates, distances = np.concatenate(candidates), np.concatenate(distances)
+        order = np.argsort(distances, kind='stable')[:limit]
+        return [int(ids[candidates[index]]) for index in order if np.isfinite(distances[index])]
+
+    def upsert(self, rows):
+        """Добавляет или перекодирует строки (FEATURE_FIELDS)"""
+        if not rows:
+            return
+        encoded = self.encoder.transform(rows)
+        with self._lock:
+            ids, matrix, norms, alive, size = self._snapshot
+            new = [row[0] for row in rows if row[0] not in self.positions]
+            if size + len(new) > len(ids):
+                # Растим с запасом; читатели дорабатывают по старому снимку
+                capacity = max(2 * len(ids), size + len(new))
+                ids, matrix, norms, alive = (
+                    _grow(array, capacity) for array in (ids, matrix, norms, alive)
+                )
+            for pk in new:
+                self.positions[pk] = size
+                ids[size] = pk
+                size += 1
+            for row, vector in zip(rows, encoded):
+                position = self.positions[row[0]]
+                matrix[position] = vector
+                norms[position] = vector @ vector
+                alive[position] = True
+            self._snapshot = (ids, matrix, norms, alive, size)
+
+    def remove(self, pks):
+        with self._lock:
+            alive = self._snapshot[3]
+            for pk in pks:
+                position = self.positions.get(pk)
+                if position is not None:
+                    alive[position] = False
+
+    def refresh(self):
+        """Дочитывает объявления города, изменённые с прошлого чтения"""
+        queryset = Listing.objects.filter(city_location_id=self.city_location_id)
+        if self.seen_at is not None:
+            queryset = queryset.filter(updated_at__gte=self.seen_at)
+        active, inactive = [], []
+        for row in queryset.values_list(*FEATURE_FIELDS, 'is_active', 'updated_at'):
+            (active if row[-2] else inactive).append(row[:len(FEATURE_FIELDS)])
+            if self.seen_at is None or row[-1] > self.seen_at:
+                self.seen_at = row[-1]
+        self.upsert(active)
+        self.remove([row[0] for row in inactive])
+        self.refreshed_at = time.monotonic()
+
+
+def _grow(array, capacity):
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class SimilarIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuilding = set()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._partitions = {}
+
+    def partition(self, city_location_id):
+        partition = self._partitions.get(city_location_id)
+        if partition is None:
+            with self._lock:
+                partition = self._partitions.get(city_location_id)
+                if partition is None:
+                    partition = self._partitions[city_location_id] = Partition(city_location_id)
+            return partition
+        age = time.monotonic() - partition.built_at
+        if age > SIMILAR_FULL_REBUILD_INTERVAL:
+            self._rebuild_in_background(city_location_id)
+        elif time.monotonic() - partition.refreshed_at > SIMILAR_REFRESH_INTERVAL:
+            partition.refresh()
+        return partition
+
+    def similar(self, listing, limit=SIMILAR_LIMIT):
+        """id похожих активных объявлений того же города, ближайшие первыми"""
+        if listing.city_location_id is None:
+            return []
+        partition = self.partition(listing.city_location_id)
+        return partition.nearest(partition.vector(listing), limit, exclude=listing.pk)
+
+    def listing_saved(self, listing, old_city_location_id=None):
+        """Обновляет строку объявления в загруженных партициях этого процесса"""
+        if old_city_location_id is not None and old_city_location_id != listing.city_location_id:
+            self._remove(old_city_location_id, listing.pk)
+        partition = self._partitions.get(listing.city_location_id)
+        if partition is None:
+            return
+        if listing.get_deferred_fields() & set(FEATURE_FIELDS):
+            # Объявление загружено не целиком - дочитаем при следующем запросе
+            partition.refreshed_at = 0.0
+        elif listing.is_active:
+            partition.upsert([tuple(getattr(listing, field) for field in FEATURE_FIELDS)])
+        else:
+            partition.remove([listing.pk])
+
+    def listing_deleted(self, listing):
+        self._remove(listing.city_location_id, listing.pk)
+
+    def mark_stale(self, city_location_ids):
+        """Изменения в обход сигналов (массовая загрузка) - партиции дочитают их при следующем запросе"""
+        for city_location_id in city_location_ids:
+            partition = self._partitions.get(city_location_id)
+            if partition is not None:
+                partition.refreshed_at = 0.0
+
+    def _remove(self, city_location_id, pk):
+        partition = self._partitions.get(city_location_id)
+        if partition is not None:
+            partition.remove([pk])
+
+    def _rebuild_in_background(self, city_location_id):
+        with self._lock:
+            if city_location_id in self._rebuilding:
+                return
+            self._rebuilding.add(city_location_id)
+
+        def run():
+            try:
+                partition = Partition(city_location_id)
+                with self._lock:
+                    self._partitions[city_location_id] = partition
+            finally:
+                self._rebuilding.discard(city_location_id)
+                close_old_connections()
+
+        threading.Thread(target=run, name='similar-rebuild', daemon=True).start()
+
+
+similar_index = SimilarIndex()
@@ -0,0 +1,221 @@
+"""
+Подсказки для строки поиска (/listings/suggest/?q=).
+
+Индекс живёт в памяти процесса: отсортированный список нормализованных
+ключей (названия объявлений, города, районы, частые запросы из
+SearchHistory) с весами. Префикс ищется bisect'ом, для коротких
+префиксов (1-3 символа) топ заранее посчитан - запрос к подсказкам
+не ходит в БД. Раз в SUGGEST_REFRESH_INTERVAL секунд индекс
+дочитывает изменения (объявления по updated_at, новые запросы по id)
+в фоновом потоке, раз в SUGGEST_FULL_REBUILD_INTERVAL строится заново.
+
+Поисковые запросы пишутся в SearchHistory через буфер пачками.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import Count
+from django.utils import timezone
+
+from rental_project.buffer import BufferedWriter
+
+from .locations import normalize_location_name
+from .models import Listing, SearchHistory
+
+SUGGEST_LIMIT = 10
+SUGGEST_REFRESH_INTERVAL = 60
+SUGGEST_FULL_REBUILD_INTERVAL = 60 * 60
+# Для префиксов такой длины топ считается при построении индекса
+TOP_PREFIX_LENGTH = 3
+# Запрос попадает в подсказки, если его искали столько разных пользователей
+MIN_QUERY_USERS = 2
+QUERY_HISTORY_DAYS = 30
+# При совпадении ключа показываем вариант из более «надёжного» источника
+KIND_PRIORITY = ('city', 'district', 'title', 'query')
+
+
+def record_search(user, query):
+    """Ставит поисковый запрос пользователя в очередь на запись в SearchHistory"""
+    query = ' '.join(query.split())[:255]
+    if not query or not user.is_authenticated:
+        return False
+    return search_buffer.add((user.pk, query))
+
+
+def write_searches(events):
+    SearchHistory.objects.bulk_create(
+        [SearchHistory(user_id=user_id, query=query) for user_id, query in events]
+    )
+
+
+search_buffer = BufferedWriter('search_history', write_searches)
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refreshing = False
+        # Снимок для чтения: (ключи, записи, топ коротких префиксов).
+        # Подменяется целиком, читатели не берут блокировку
+        self._snapshot = None
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._snapshot = None
+            self._titles = {}
+            self._weights = defaultdict(Counter)
+            self._displays = {}
+            self._query_pairs = set()
+            self._listings_seen_at = None
+            self._last_search_id = 0
+            self._built_at = 0.0
+            self._refreshed_at = 0.0
+
+    def suggest(self, prefix, limit=SUGGEST_LIMIT):
+        key = normalize_location_name(prefix)
+        if not key:
+            return []
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.rebuild()
+            snapshot = self._snapshot
+        elif time.monotonic() - self._refreshed_at > SUGGEST_REFRESH_INTERVAL:
+            self._refresh_in_background()
+
+        keys, entries, top = snapshot
+        if len(key) <= TOP_PREFIX_LENGTH:
+            found = top.get(key, [])
+        else:
+            start = bisect_left(keys, key)
+            end = bisect_left(keys, key + '\uffff', start)
+            found = heapq.nlargest(limit, entries[start:end])
+        return [{'text': text, 'kind': kind} for _, text, kind in found[:limit]]
+
+    def rebuild(self):
+        """Полное построение индекса из БД"""
+        with self._lock:
+            self._titles = {}
+            self._weights = defaultdict(Counter)
+            self._displays = {}
+            self._query_pairs = set()
+            self._listings_seen_at = None
+            self._last_search_id = 0
+            self._load_listings(Listing.objects.filter(is_active=True))
+            self._load_locations()
+            self._load_searches(
+                SearchHistory.objects.filter(timestamp__gte=timezone.now() - timedelta(days=QUERY_HISTORY_DAYS))
+            )
+            self._publish()
+            self._built_at = self._refreshed_at = time.monotonic()
+
+    def refresh(self):
+        """Дочитывает изменения с прошлого построения"""
+        if time.monotonic() - self._built_at > SUGGEST_FULL_REBUILD_INTERVAL:
+            return self.rebuild()
+        with self._lock:
+            listings = Listing.objects.all()
+            if self._listings_seen_at is not None:
+                listings = listings.filter(updated_at__gte=self._listings_seen_at)
+            self._load_listings(listings)
+            self._load_locations()
+            self._load_searches(SearchHistory.objects.filter(id__gt=self._last_search_id))
+            self._publish()
+            self._refreshed_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            # Пока идёт обновление, остальные запросы не пытаются запустить своё
+            self._refreshed_at = time.monotonic()
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+                close_old_connections()
+
+        threading.Thread(target=run, name='suggest-refresh', daemon=True).start()
+
+    def _add(self, kind, text, weight):
+        key = normalize_location_name(text)
+        if not key:
+            return None
+        self._weights[key][kind] += weight
+        if (key, kind) not in self._displays:
+            self._displays[(key, kind)] = text.strip()
+        return key
+
+    def _load_listings(self, queryset):
+        rows = queryset.values_list('id', 'title', 'is_active', 'updated_at')
+        for pk, title, is_active, updated_at in rows.iterator():
+            previous = self._titles.pop(pk, None)
+            if previous is not None:
+                self._weights[previous]['title'] -= 1
+            if is_active:
+                self._titles[pk] = self._add('title', title, 1)
+            if self._listings_seen_at is None or updated_at > self._listings_seen_at:
+                self._listings_seen_at = updated_at
+
+    def _load_locations(self):
+        # Вес города/района - число активных объявлений в нём (пересчитывается целиком)
+        for key in self._weights:
+            self._weights[key].pop('city', None)
+            self._weights[key].pop('district', None)
+        for field, kind in (('city_location', 'city'), ('district_location', 'district')):
+            counts = (
+                Listing.objects.filter(is_active=True, **{f'{field}__isnull': False})
+                .values(f'{field}__name')
+                .annotate(total=Count('id'))
+                .values_list(f'{field}__name', 'total')
+            )
+            for name, total in counts:
+                self._add(kind, name, total)
+
+    def _load_searches(self, queryset):
+        for pk, user_id, query in queryset.values_list('id', 'user_id', 'query').iterator():
+            self._last_search_id = max(self._last_search_id, pk)
+            key = normalize_location_name(query)
+            if key and (user_id, key) not in self._query_pairs:
+                self._query_pairs.add((user_id, key))
+                self._add('query', query, 1)
+
+    def _publish(self):
+        entries = []
+        for key, weights in self._weights.items():
+            # Запросы - только если их искали несколько разных пользователей
+            counted = {
+                kind: value for kind, value in weights.items()
+                if value > 0 and (kind != 'query' or value >= MIN_QUERY_USERS)
+            }
+            if not counted:
+                continue
+            kind = next(kind for kind in KIND_PRIORITY if kind in counted)
+            entries.append((key, sum(counted.values()), self._displays[(key, kind)], kind))
+        entries.sort()
+
+        keys = [key for key, *_ in entries]
+        ranked = [(weight, text, kind) for _, weight, text, kind in entries]
+        top = {}
+        for length in range(1, TOP_PREFIX_LENGTH + 1):
+            start = 0
+            while start < len(keys):
+                prefix = keys[start][:length]
+                if len(prefix) < length:
+                    start += 1
+                    continue
+                end = bisect_left(keys, prefix + '\uffff', start)
+                top[prefix] = heapq.nlargest(SUGGEST_LIMIT, ranked[start:end])
+                start = end
+        self._snapshot = (keys, ranked, top)
+
+
+suggest_index = SuggestIndex()
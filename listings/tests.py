@@ -1,9 +1,47 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase, APIClient
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from django.contrib.auth import get_user_model
-from .models import Listing
+from django.core.cache import cache
+from django.db import DatabaseError, connection, connections
+from django.core.exceptions import ImproperlyConfigured
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import base64
+import csv
+import gzip
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from PIL import Image
+from datetime import date, timedelta
+
+from bookings.models import Booking
+from .also_viewed import refresh_neighbours
+from .bulk import ListingImporter
+from .geo import encode_geohash, filter_radius
+from .locations import location_lookup, normalize_location_name
+from .models import (
+    Listing, ListingImage, ListingViewBucket, Location, PriceStats, SavedSearch, SavedSearchKey, SearchHistory,
+    ViewHistory,
+)
+from .popularity import current_hour, refresh_trending, write_views
+from .price_stats import PriceStatsUpdater, load_prices, rebuild_price_stats
+from .search import IcontainsSearchBackend, MySQLFulltextBackend, get_search_backend
+from .serializers import ListingRows, ListingSerializer, listing_rows
+from .similar import similar_index
+from .suggest import suggest_index
+from rental_project.buffer import BufferedWriter
+from rental_project.pagination import CountedPaginator, KeysetPagination, keyset_columns
+from rental_project.images import KIND_LISTING, image_processor, variant_name
 from users.models import User
 
 
@@ -304,6 +342,1714 @@ class ListingAPITest(APITestCase):
         self.assertEqual(len(response.data['results']), 10)
 
 
+class ListingKeysetPaginationTest(APITestCase):
+    def setUp(self):
+        self.landlord = User.objects.create_user(
+            username='cursorlandlord',
+            email='cursor@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        # Много одинаковых цен и комнат - проверяем tie-breaker по id
+        for i in range(25):
+            Listing.objects.create(
+                title=f'Cursor Listing {i}',
+                description='Description',
+                location='Location',
+                city='Berlin',
+                price=100 + (i % 4) * 10,
+                rooms=1 + i % 3,
+                property_type='apartment',
+                owner=self.landlord
+            )
+
+    def _walk(self, url, link='next'):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            pages.append([item['id'] for item in response.data['results']])
+            url = response.data[link]
+        return pages
+
+    def test_cursor_pages_cover_all_listings_in_order(self):
+        """Курсор проходит все объявления без дублей для каждого ordering"""
+        for ordering in ['price', '-price', 'rooms', '-created_at', 'updated_at']:
+            expected = list(
+                Listing.objects.order_by(
+                    ordering, '-id' if ordering.startswith('-') else 'id'
+                ).values_list('id', flat=True)
+            )
+            pages = self._walk(reverse('listings-list') + f'?cursor=&ordering={ordering}')
+            self.assertEqual([len(page) for page in pages], [10, 10, 5])
+            self.assertEqual(sum(pages, []), expected, ordering)
+
+    def test_previous_links_walk_back(self):
+        """Ссылки previous возвращают те же страницы в обратном порядке"""
+        forward = self._walk(reverse('listings-list') + '?cursor=&ordering=price')
+        last_page = self.client.get(
+            reverse('listings-list') + '?cursor=&ordering=price'
+        ).data['next']
+        last_page = self.client.get(self.client.get(last_page).data['next'])
+        backward = self._walk(last_page.data['previous'], link='previous')
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_page_number_pagination_without_cursor(self):
+        """Без ?cursor= остаётся обычная пагинация со счётчиком"""
+        response = self.client.get(reverse('listings-list'))
+        self.assertEqual(response.data['count'], 25)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('listings-list') + '?cursor=broken')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_values_of_wrong_type(self):
+        """Подделанный курсор с чужими типами значений - 404, а не ошибка в запросе"""
+        def cursor(position):
+            data = json.dumps({'p': position, 'r': 0}).encode('utf-8')
+            return base64.urlsafe_b64encode(data).decode('ascii')
+
+        for ordering, position in [
+            ('-price', ['abc', 1]),
+            ('-price', [{'a': 1}, 1]),
+            ('rooms', [2, 'x']),
+            ('-created_at', ['yesterday', 1]),
+            ('price', [None, 1]),
+        ]:
+            response = self.client.get(
+                reverse('listings-list'), {'cursor': cursor(position), 'ordering': ordering}
+            )
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
+
+        # Курсор из ответа по-прежнему принимается
+        response = self.client.get(reverse('listings-list'), {'cursor': cursor(['110.00', 5]), 'ordering': 'price'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cursor_with_sparse_fields(self):
+        """?fields= не отбрасывает колонки курсора: Meta.ordering и tie-breaker id"""
+        for query in ['fields=title', 'fields=title&ordering=-price', 'exclude=id,created_at']:
+            expected = list(Listing.objects.order_by(
+                *(['-price', '-id'] if 'price' in query else ['-created_at', '-id'])
+            ).values_list('title', flat=True))
+            url, titles = reverse('listings-list') + f'?cursor=&{query}', []
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK, query)
+                for item in response.data['results']:
+                    self.assertNotIn('created_at', item)
+                    titles.append(item['title'])
+                url = response.data['next']
+            self.assertEqual(titles, expected, query)
+
+    def test_rows_without_ordering_columns(self):
+        """Строки values() без колонок порядка - понятная ошибка вместо KeyError"""
+        queryset = Listing.objects.all()
+        self.assertEqual(keyset_columns(queryset), ['created_at', 'id'])
+        self.assertEqual(keyset_columns(queryset.order_by('-price')), ['price', 'id'])
+
+        request = Request(APIRequestFactory().get('/listings/', {'cursor': ''}))
+        with self.assertRaisesMessage(ImproperlyConfigured, '"created_at"'):
+            KeysetPagination().paginate_queryset(queryset.values('id', 'title'), request)
+
+
+class ListingCountTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.landlord = User.objects.create_user(
+            username='countlandlord', email='count@test.com', password='pass123', user_type='landlord'
+        )
+        self.tenant = User.objects.create_user(
+            username='counttenant', email='counttenant@test.com', password='pass123', user_type='tenant'
+        )
+        for i in range(5):
+            self._create(i)
+        self.client.force_authenticate(user=self.tenant)
+
+    def _create(self, i):
+        return Listing.objects.create(
+            title=f'Count {i}', description='D', location='L', city='Berlin',
+            price=100 + i, rooms=1, property_type='room', owner=self.landlord
+        )
+
+    def _count_queries(self, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('listings-list'), params or {})
+        return response, [query for query in queries.captured_queries if 'COUNT(' in query['sql']]
+
+    def test_one_count_per_page(self):
+        """ETag и пагинация используют один агрегат"""
+        response, counts = self._count_queries()
+        self.assertEqual(response.data['count'], 5)
+        self.assertFalse(response.data['count_approximate'])
+        self.assertEqual(len(counts), 1)
+
+    @override_settings(PAGINATION_COUNT_CACHE_THRESHOLD=3)
+    def test_large_counts_cached_until_change(self):
+        self._count_queries()
+        response, counts = self._count_queries({'ordering': 'price'})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(counts, [])
+
+        # Новое объявление сбрасывает поколение - кэш COUNT тоже
+        self._create(5)
+        response, counts = self._count_queries()
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual(len(counts), 1)
+
+    def test_page_not_capped_by_stale_count(self):
+        """Страница выбирается по per_page, а не по (возможно устаревшему) числу строк"""
+        paginator = CountedPaginator(Listing.objects.order_by('id'), 3, count=2)
+        page = paginator.page(1)
+        self.assertEqual(len(page), 3)
+        self.assertTrue(page.has_next())
+        self.assertEqual(len(paginator.page(2)), 2)
+
+    @override_settings(PAGINATION_ESTIMATE_THRESHOLD=3)
+    def test_estimated_count_from_table_stats(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        request = Request(APIRequestFactory().get('/listings/', {'page': 2}))
+        paginator = KeysetPagination()
+        paginator.page_size = 2
+        with CaptureQueriesContext(connection) as queries:
+            page = paginator.paginate_queryset(Listing.objects.order_by('id'), request)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(len(page), 2)
+        data = paginator.get_paginated_response([]).data
+        self.assertEqual(data['count'], 5)
+        self.assertTrue(data['count_approximate'])
+        self.assertIsNotNone(data['next'])
+
+        # SQLite не даёт оценок для запроса с фильтром - список считается точно
+        response, counts = self._count_queries()
+        self.assertFalse(response.data['count_approximate'])
+        self.assertEqual(len(counts), 1)
+
+
+class ListingLocationFilterTest(APITestCase):
+    def setUp(self):
+        self.landlord = User.objects.create_user(
+            username='locationlandlord',
+            email='location@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.neukolln = self._create('Berlin', 'Neukölln')
+        self.mitte = self._create('berlin ', 'Mitte')
+        self.munich = self._create('München', 'Schwabing')
+
+    def _create(self, city, district):
+        return Listing.objects.create(
+            title=f'{city} {district}',
+            description='Description',
+            location='Location',
+            city=city,
+            district=district,
+            price=100,
+            rooms=2,
+            property_type='apartment',
+            owner=self.landlord
+        )
+
+    def _ids(self, params):
+        response = self.client.get(reverse('listings-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item['id'] for item in response.data['results']}
+
+    def test_same_city_spelled_differently_is_one_location(self):
+        """Регистр, пробелы и диакритика не создают новых локаций"""
+        self.assertEqual(self.neukolln.city_location_id, self.mitte.city_location_id)
+        self.assertEqual(Location.objects.filter(kind=Location.KIND_CITY).count(), 2)
+        self.assertEqual(normalize_location_name(' St. Pauli '), 'st pauli')
+
+    def test_filter_by_canonical_city(self):
+        """?city= сравнивается по каноническому имени"""
+        self.assertEqual(self._ids({'city': 'BERLIN'}), {self.neukolln.id, self.mitte.id})
+        self.assertEqual(self._ids({'city': 'munchen'}), {self.munich.id})
+        self.assertEqual(self._ids({'district': 'neukolln'}), {self.neukolln.id})
+
+    def test_filter_by_several_cities(self):
+        """Несколько городов через запятую - запрос IN"""
+        self.assertEqual(
+            self._ids({'city': 'Berlin,München'}),
+            {self.neukolln.id, self.mitte.id, self.munich.id}
+        )
+
+    def test_unknown_city_returns_nothing(self):
+        self.assertEqual(self._ids({'city': 'Atlantis'}), set())
+        self.assertEqual(self._ids({'city': 'Ber'}), set())
+
+    def test_substring_match_is_opt_in(self):
+        """Поиск подстроки доступен через ?location_match=contains"""
+        self.assertEqual(
+            self._ids({'city': 'ber', 'location_match': 'contains'}),
+            {self.neukolln.id, self.mitte.id}
+        )
+
+    def test_location_updated_with_city(self):
+        """Смена города переназначает локацию"""
+        self.munich.city = 'Berlin'
+        self.munich.save()
+        self.assertEqual(self.munich.city_location_id, self.mitte.city_location_id)
+
+
+class ListingFacetsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.landlord = User.objects.create_user(
+            username='facetlandlord',
+            email='facet@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.listings = [
+            self._create('Berlin', 'apartment', 2, 80),
+            self._create('Berlin', 'apartment', 3, 150),
+            self._create('Hamburg', 'house', 3, 1500),
+        ]
+
+    def _create(self, city, property_type, rooms, price):
+        return Listing.objects.create(
+            title='Facet Listing',
+            description='Description',
+            location='Location',
+            city=city,
+            price=price,
+            rooms=rooms,
+            property_type=property_type,
+            owner=self.landlord
+        )
+
+    def _facets(self, params=None):
+        response = self.client.get(reverse('listings-facets'), params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_facet_counts(self):
+        data = self._facets()
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(data['property_type'], [
+            {'value': 'apartment', 'count': 2}, {'value': 'house', 'count': 1}
+        ])
+        self.assertEqual(data['city'], [
+            {'value': 'Berlin', 'count': 2}, {'value': 'Hamburg', 'count': 1}
+        ])
+        self.assertEqual(data['rooms'], [{'value': 2, 'count': 1}, {'value': 3, 'count': 2}])
+        self.assertEqual(data['price_band'], [
+            {'value': '50-100', 'count': 1},
+            {'value': '100-200', 'count': 1},
+            {'value': '1000+', 'count': 1},
+        ])
+
+    def test_facets_use_list_filters(self):
+        """Фасеты принимают те же параметры, что и список"""
+        data = self._facets({'city': 'berlin', 'min_rooms': 3})
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['rooms'], [{'value': 3, 'count': 1}])
+
+    def test_facets_invalidated_by_toggle_active(self):
+        """toggle_active сбрасывает закэшированные фасеты"""
+        self.assertEqual(self._facets()['total'], 3)
+
+        self.client.force_authenticate(self.landlord)
+        response = self.client.post(reverse('listings-toggle-active', args=[self.listings[2].id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(None)
+
+        data = self._facets()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['property_type'], [{'value': 'apartment', 'count': 2}])
+
+    def test_facets_invalidated_by_create(self):
+        self.assertEqual(self._facets({'city': 'Hamburg'})['total'], 1)
+        self._create('Hamburg', 'studio', 1, 40)
+        self.assertEqual(self._facets({'city': 'Hamburg'})['total'], 2)
+
+
+class ListingPriceStatsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.landlord = User.objects.create_user(
+            username='pricelandlord',
+            email='price@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.listings = [
+            self._create('Berlin', 'apartment', price)
+            for price in (100, 200, 200, 300, 400)
+        ]
+        self._create('Berlin', 'house', 1000)
+        self._create('Hamburg', 'apartment', 50)
+
+    def _create(self, city, property_type, price):
+        return Listing.objects.create(
+            title='Price Listing',
+            description='Description',
+            location='Location',
+            city=city,
+            price=price,
+            rooms=2,
+            property_type=property_type,
+            owner=self.landlord
+        )
+
+    def _stats(self, params=None):
+        response = self.client.get(reverse('listings-price-stats'), params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def _stored(self):
+        return {
+            (stats.city_location.name, stats.property_type): list(load_prices(stats.prices))
+            for stats in PriceStats.objects.select_related('city_location')
+        }
+
+    def test_stats_for_city_and_type(self):
+        data = self._stats({'city': 'berlin', 'property_type': 'apartment', 'buckets': 3})
+        self.assertEqual(data['count'], 5)
+        self.assertEqual((data['min'], data['max'], data['mean']), (100.0, 400.0, 240.0))
+        self.assertEqual(data['percentiles']['p50'], 200.0)
+        self.assertEqual([bucket['count'] for bucket in data['histogram']], [1, 2, 2])
+        self.assertEqual(data['histogram'][0], {'from': 100.0, 'to': 200.0, 'count': 1})
+
+        self.assertEqual(self._stats({'city': 'Berlin,Hamburg'})['count'], 7)
+        self.assertEqual(self._stats()['count'], 7)
+
+    def test_empty_and_invalid_params(self):
+        data = self._stats({'city': 'Atlantis'})
+        self.assertEqual(data['count'], 0)
+        self.assertEqual(data['histogram'], [])
+        for params in ({'property_type': 'castle'}, {'buckets': 0}, {'buckets': 'x'}):
+            response = self.client.get(reverse('listings-price-stats'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_incremental_updates(self):
+        """Изменение цены, города, активности и удаление переносят цены между группами"""
+        listing = Listing.objects.get(pk=self.listings[0].pk)
+        listing.price = 250
+        listing.save()
+        hamburg = Listing.objects.get(pk=self.listings[1].pk)
+        hamburg.city = 'Hamburg'
+        hamburg.save()
+        Listing.objects.get(pk=self.listings[2].pk).delete()
+        inactive = Listing.objects.get(pk=self.listings[3].pk)
+        inactive.is_active = False
+        inactive.save()
+
+        stored = self._stored()
+        self.assertEqual(stored[('Berlin', 'apartment')], [25000, 40000])
+        self.assertEqual(stored[('Hamburg', 'apartment')], [5000, 20000])
+        self.assertEqual(self._stats({'city': 'Berlin', 'property_type': 'apartment'})['max'], 400.0)
+
+        rebuild_price_stats()
+        self.assertEqual(self._stored(), stored)
+
+    def test_save_without_loaded_state_rebuilds_group(self):
+        """Экземпляр не из БД (прежняя цена неизвестна) - группа пересобирается, без дублей"""
+        listing = Listing.objects.only('pk', 'city').get(pk=self.listings[4].pk)
+        listing.price = 500
+        listing.save(update_fields=['price'])
+        self.assertEqual(self._stored()[('Berlin', 'apartment')], [10000, 20000, 20000, 30000, 50000])
+
+        updater = PriceStatsUpdater()
+        updater.listing_saved(Listing.objects.get(pk=self.listings[0].pk))
+        updater.apply()
+        self.assertEqual(len(self._stored()[('Berlin', 'apartment')]), 5)
+
+    def test_bulk_upload_updates_stats(self):
+        self.client.force_authenticate(self.landlord)
+        content = (
+            'external_ref,title,description,location,city,price,rooms,property_type\n'
+            'P1,Loft,Loft,Street 1,Hamburg,70,1,apartment\n'
+            'P2,Flat,Flat,Street 2,Hamburg,90,1,apartment\n'
+        )
+        upload = SimpleUploadedFile('listings.csv', content.encode('utf-8'))
+        response = self.client.post(reverse('listings-bulk'), {'file': upload}, format='multipart')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(self._stats({'city': 'Hamburg'})['count'], 3)
+
+        content = 'external_ref,price\nP1,60\n'
+        upload = SimpleUploadedFile('listings.csv', content.encode('utf-8'))
+        self.client.post(reverse('listings-bulk'), {'file': upload}, format='multipart')
+        self.assertEqual(self._stored()[('Hamburg', 'apartment')], [5000, 6000, 9000])
+
+
+class ListingAvailabilityFilterTest(APITestCase):
+    def setUp(self):
+        self.landlord = User.objects.create_user(
+            username='availlandlord',
+            email='avail@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.tenant = User.objects.create_user(
+            username='availtenant',
+            email='availtenant@test.com',
+            password='pass123',
+            user_type='tenant'
+        )
+        self.free = self._create('Free')
+        self.booked = self._create('Booked')
+        self.day = date.today() + timedelta(days=10)
+        self.booking = Booking.objects.create(
+            listing=self.booked,
+            tenant=self.tenant,
+            start_date=self.day,
+            end_date=self.day + timedelta(days=3),
+            status=Booking.STATUS_PENDING
+        )
+
+    def _create(self, title):
+        return Listing.objects.create(
+            title=title,
+            description='Description',
+            location='Location',
+            city='Berlin',
+            price=100,
+            rooms=2,
+            property_type='apartment',
+            owner=self.landlord
+        )
+
+    def _ids(self, check_in, check_out):
+        response = self.client.get(reverse('listings-list'), {
+            'check_in': check_in.isoformat(),
+            'check_out': check_out.isoformat(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item['id'] for item in response.data['results']}
+
+    def test_overlapping_booking_excludes_listing(self):
+        """Пересечение хотя бы на одну ночь исключает объявление"""
+        self.assertEqual(
+            self._ids(self.day + timedelta(days=2), self.day + timedelta(days=5)),
+            {self.free.id}
+        )
+
+    def test_checkout_day_is_free(self):
+        """День выезда не занят: можно заехать в день чужого выезда"""
+        self.assertEqual(
+            self._ids(self.day + timedelta(days=3), self.day + timedelta(days=4)),
+            {self.free.id, self.booked.id}
+        )
+        self.assertEqual(
+            self._ids(self.day - timedelta(days=2), self.day),
+            {self.free.id, self.booked.id}
+        )
+
+    def test_released_booking_frees_dates(self):
+        """Отклонённое или отменённое бронирование освобождает даты"""
+        self.booking.status = Booking.STATUS_REJECTED
+        self.booking.save()
+        self.assertEqual(
+            self._ids(self.day, self.day + timedelta(days=1)),
+            {self.free.id, self.booked.id}
+        )
+
+    def test_invalid_period(self):
+        response = self.client.get(reverse('listings-list'), {
+            'check_in': self.day.isoformat(),
+            'check_out': self.day.isoformat(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ListingGeoFilterTest(APITestCase):
+    def setUp(self):
+        self.landlord = User.objects.create_user(
+            username='geolandlord',
+            email='geo@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        # Александерплац, Бранденбургские ворота, Потсдам, Гамбург
+        self.alex = self._create('Alex', 52.5219, 13.4132)
+        self.gate = self._create('Gate', 52.5163, 13.3777)
+        self.potsdam = self._create('Potsdam', 52.3906, 13.0645)
+        self.hamburg = self._create('Hamburg', 53.5511, 9.9937)
+        self.nowhere = self._create('Nowhere', None, None)
+
+    def _create(self, title, latitude, longitude):
+        return Listing.objects.create(
+            title=title,
+            description='Description',
+            location='Location',
+            price=100,
+            rooms=2,
+            property_type='apartment',
+            latitude=latitude,
+            longitude=longitude,
+            owner=self.landlord
+        )
+
+    def test_geohash_is_computed(self):
+        self.assertEqual(self.alex.geohash, encode_geohash(52.5219, 13.4132))
+        self.assertTrue(self.alex.geohash.startswith('u33d'))
+        self.assertEqual(self.nowhere.geohash, '')
+
+    def test_radius_sorted_by_distance(self):
+        response = self.client.get(reverse('listings-list'), {
+            'lat': 52.5200, 'lng': 13.4050, 'radius_km': 30,
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([item['title'] for item in results], ['Alex', 'Gate', 'Potsdam'])
+        self.assertAlmostEqual(results[0]['distance_km'], 0.6, delta=0.1)
+        self.assertAlmostEqual(results[2]['distance_km'], 27.2, delta=0.2)
+
+    def test_radius_is_exact_not_bbox(self):
+        """Угол квадрата вокруг центра дальше радиуса и не попадает в выдачу"""
+        response = self.client.get(reverse('listings-list'), {
+            'lat': 52.5219 - 0.07, 'lng': 13.4132 - 0.11, 'radius_km': 9,
+        })
+        self.assertNotIn('Alex', [item['title'] for item in response.data['results']])
+
+    def test_dense_area_not_truncated(self):
+        """Больше 1000 объявлений в радиусе: все в COUNT и на страницах, ближайшие первыми"""
+        listings = []
+        for i in range(1200):
+            latitude, longitude = 52.52 + (i % 40) * 0.0005, 13.40 + (i // 40) * 0.0005
+            listings.append(Listing(
+                title=f'Dense {i}', description='D', location='L', price=100, rooms=1,
+                property_type='room', owner=self.landlord, latitude=latitude, longitude=longitude,
+                geohash=encode_geohash(latitude, longitude),
+            ))
+        Listing.objects.bulk_create(listings)
+        params = {'lat': 52.52, 'lng': 13.40, 'radius_km': 5}
+        response = self.client.get(reverse('listings-list'), params)
+        # 1200 плотных + Alex и Gate
+        self.assertEqual(response.data['count'], 1202)
+        self.assertFalse(response.data['count_approximate'])
+        self.assertEqual(response.data['results'][0]['title'], 'Dense 0')
+
+        last = self.client.get(reverse('listings-list'), {**params, 'page': 121, 'fields': 'title,distance_km'})
+        self.assertEqual(len(last.data['results']), 2)
+        self.assertLessEqual(last.data['results'][-1]['distance_km'], 5)
+
+    def test_bbox(self):
+        response = self.client.get(reverse('listings-list'), {'bbox': '13.0,52.3,13.5,52.6'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {item['title'] for item in response.data['results']},
+            {'Alex', 'Gate', 'Potsdam'}
+        )
+        self.assertNotIn('distance_km', response.data['results'][0])
+
+    def test_invalid_params(self):
+        for params in ({'lat': 52.5, 'lng': 13.4}, {'lat': 'x', 'lng': 13.4, 'radius_km': 1},
+                       {'bbox': '13.5,52.3,13.0,52.6'}, {'bbox': '1,2,3'}):
+            response = self.client.get(reverse('listings-list'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class ListingPopularTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.landlord = User.objects.create_user(
+            username='poplandlord',
+            email='pop@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.tenants = [
+            User.objects.create_user(
+                username=f'poptenant{i}',
+                email=f'poptenant{i}@test.com',
+                password='pass123',
+                user_type='tenant'
+            )
+            for i in range(3)
+        ]
+        self.old = self._create('Old favourite')
+        self.fresh = self._create('Fresh')
+
+    def _create(self, title):
+        return Listing.objects.create(
+            title=title,
+            description='Description',
+            location='Location',
+            price=100,
+            rooms=2,
+            property_type='apartment',
+            owner=self.landlord
+        )
+
+    def _view(self, tenant, listing):
+        self.client.force_authenticate(user=tenant)
+        self.client.get(reverse('listings-detail', kwargs={'pk': listing.pk}))
+        self.client.force_authenticate(user=None)
+
+    def _titles(self, **params):
+        response = self.client.get(reverse('listings-popular'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['title'] for item in response.data]
+
+    def test_views_count_incremented_once_per_user(self):
+        self._view(self.tenants[0], self.fresh)
+        self._view(self.tenants[0], self.fresh)
+        self._view(self.tenants[1], self.fresh)
+        self.fresh.refresh_from_db()
+        self.assertEqual(self.fresh.views_count, 2)
+        self.assertEqual(ListingViewBucket.objects.get(listing=self.fresh).count, 2)
+
+    def test_all_time_and_trending(self):
+        # Старые просмотры: много, но двое суток назад
+        for tenant in self.tenants:
+            self._view(tenant, self.old)
+        ListingViewBucket.objects.filter(listing=self.old).update(hour=current_hour() - timedelta(days=2))
+        self._view(self.tenants[0], self.fresh)
+
+        self.assertEqual(self._titles(), ['Old favourite', 'Fresh'])
+        self.assertEqual(self._titles(window='24h'), ['Fresh'])
+        # За неделю три просмотра двухдневной давности весят больше одного свежего
+        refresh_trending()
+        self.assertEqual(self._titles(window='7d'), ['Old favourite', 'Fresh'])
+
+    def test_inactive_listing_skipped(self):
+        self._view(self.tenants[0], self.fresh)
+        refresh_trending()
+        self.fresh.is_active = False
+        self.fresh.save()
+        self.assertEqual(self._titles(window='24h'), [])
+        self.assertEqual(self._titles(), ['Old favourite'])
+
+    def test_invalid_window(self):
+        response = self.client.get(reverse('listings-popular'), {'window': '1y'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ListingAlsoViewedTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.landlord = User.objects.create_user(
+            username='alsolandlord',
+            email='also@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.tenants = [
+            User.objects.create_user(
+                username=f'alsotenant{i}',
+                email=f'alsotenant{i}@test.com',
+                password='pass123',
+                user_type='tenant'
+            )
+            for i in range(5)
+        ]
+        self.a, self.b, self.c, self.d = [self._create(title) for title in 'ABCD']
+        write_views([
+            (self.tenants[0].pk, self.a.pk), (self.tenants[0].pk, self.b.pk),
+            (self.tenants[1].pk, self.a.pk), (self.tenants[1].pk, self.b.pk), (self.tenants[1].pk, self.c.pk),
+            (self.tenants[2].pk, self.a.pk), (self.tenants[2].pk, self.c.pk),
+            (self.tenants[3].pk, self.d.pk),
+            (self.tenants[4].pk, self.c.pk),
+        ])
+
+    def _create(self, title):
+        return Listing.objects.create(
+            title=title,
+            description='Description',
+            location='Location',
+            price=100,
+            rooms=2,
+            property_type='apartment',
+            owner=self.landlord
+        )
+
+    def _also_viewed(self, listing, **params):
+        response = self.client.get(reverse('listings-also-viewed', args=[listing.pk]), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['title'] for item in response.data]
+
+    def test_neighbours_ranked_by_cosine(self):
+        """B и C смотрели с A одинаково часто, но у C больше зрителей - B выше"""
+        self.assertEqual(refresh_neighbours(), 4)
+        self.assertEqual(self._also_viewed(self.a), ['B', 'C'])
+        self.assertEqual(self._also_viewed(self.a, limit=1), ['B'])
+        self.assertEqual(self._also_viewed(self.d), [])
+
+    def test_incremental_refresh(self):
+        refresh_neighbours()
+        write_views([(self.tenants[3].pk, self.a.pk)])
+        # Пересчитываются только A (новый просмотр) и D (история того же зрителя)
+        self.assertEqual(refresh_neighbours(), 2)
+        self.assertEqual(self._also_viewed(self.a), ['B', 'C', 'D'])
+        self.assertEqual(self._also_viewed(self.d), ['A'])
+        self.assertEqual(refresh_neighbours(), 0)
+
+    def test_inactive_filtered_at_read_time(self):
+        refresh_neighbours()
+        self.b.is_active = False
+        self.b.save()
+        self.assertEqual(self._also_viewed(self.a), ['C'])
+        self.c.delete()
+        self.assertEqual(self._also_viewed(self.a), [])
+
+
+class SavedSearchTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        # Таблица локаций процесса могла запомнить id из откаченных тестов
+        location_lookup.clear()
+        self.landlord = User.objects.create_user(
+            username='savedlandlord',
+            email='savedlandlord@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.tenant = User.objects.create_user(
+            username='savedtenant',
+            email='savedtenant@test.com',
+            password='pass123',
+            user_type='tenant'
+        )
+        self.client.force_authenticate(self.tenant)
+        response = self.client.post(reverse('saved-searches-list'), {
+            'name': 'Berlin flats',
+            'params': {'city': 'berlin', 'max_price': 150, 'min_rooms': 2},
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.search = SavedSearch.objects.get(pk=response.data['id'])
+
+    def _create(self, city='Berlin', price=100, rooms=2, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Listing.objects.create(
+                title='Saved Search Listing',
+                description='Description',
+                location='Location',
+                city=city,
+                price=price,
+                rooms=rooms,
+                property_type='apartment',
+                owner=self.landlord,
+                **fields
+            )
+
+    def _inbox(self, **params):
+        self.client.force_authenticate(self.tenant)
+        response = self.client.get(reverse('saved-searches-inbox'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['listing']['id'] for item in response.data['results']]
+
+    def test_reverse_index_keys(self):
+        """Город x ценовые диапазоны до max_price; тип не задан - любой"""
+        self.assertEqual(self.search.params, {'city': 'berlin', 'max_price': '150', 'min_rooms': '2'})
+        # Берлина в справочнике ещё нет - ключ без города
+        self.assertEqual(
+            sorted(SavedSearchKey.objects.filter(search=self.search).values_list(
+                'city_location', 'property_type', 'price_band'
+            )),
+            [(None, '', 0), (None, '', 1), (None, '', 2)],
+        )
+
+        berlin = self._create().city_location
+        self.client.put(reverse('saved-searches-detail', args=[self.search.id]), {
+            'name': 'Berlin flats', 'params': {'city': 'berlin', 'max_price': 150, 'min_rooms': 2},
+        }, format='json')
+        self.assertEqual(
+            sorted(SavedSearchKey.objects.filter(search=self.search).values_list(
+                'city_location', 'property_type', 'price_band'
+            )),
+            [(berlin.pk, '', 0), (berlin.pk, '', 1), (berlin.pk, '', 2)],
+        )
+
+    def test_invalid_params(self):
+        for params in (
+            {'colour': 'red'}, {'min_price': 'abc'}, {},
+            {'check_in': '2030-01-10', 'check_out': '2030-01-05'},
+        ):
+            response = self.client.post(
+                reverse('saved-searches-list'), {'name': 'Bad', 'params': params}, format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_new_listings_matched(self):
+        match = self._create()
+        self._create(price=500)
+        self._create(rooms=1)
+        self._create(city='Hamburg')
+        self.assertEqual(self._inbox(), [match.id])
+        self.assertEqual(self._inbox()[0], match.id)
+
+    def test_activation_matched_once(self):
+        listing = self._create(is_active=False)
+        self.assertEqual(self._inbox(), [])
+
+        self.client.force_authenticate(self.landlord)
+        for _ in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('listings-toggle-active', args=[listing.id]))
+        self.assertEqual(self._inbox(), [listing.id])
+
+    def test_updated_search_reindexed(self):
+        self.client.patch(
+            reverse('saved-searches-detail', args=[self.search.id]),
+            {'params': {'city': 'Hamburg', 'property_type': 'apartment'}}, format='json',
+        )
+        listing = self._create(city='Hamburg', price=2000)
+        self.assertEqual(self._inbox(), [listing.id])
+
+    def test_bulk_upload_matched(self):
+        self.client.force_authenticate(self.landlord)
+        content = (
+            'external_ref,title,description,location,city,price,rooms,property_type\n'
+            'S1,Loft,Loft,Street 1,Berlin,120,2,apartment\n'
+            'S2,Villa,Villa,Street 2,Berlin,900,6,villa\n'
+        )
+        upload = SimpleUploadedFile('listings.csv', content.encode('utf-8'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('listings-bulk'), {'file': upload}, format='multipart')
+        loft = Listing.objects.get(external_ref='S1')
+        self.assertEqual(self._inbox(), [loft.id])
+
+    def test_bulk_upload_matched_without_returned_pks(self):
+        """Бэкенд без id из bulk_create (MySQL): строки без external_ref тоже доходят до входящих"""
+        features = type(connections[Listing.objects.db].features)
+        patcher = mock.patch.object(features, 'can_return_rows_from_bulk_insert', new=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client.force_authenticate(self.landlord)
+        content = (
+            'external_ref,title,description,location,city,price,rooms,property_type\n'
+            ',Loft,Loft,Street 1,Berlin,120,2,apartment\n'
+            'S2,Flat,Flat,Street 2,Berlin,130,2,apartment\n'
+            ',Villa,Villa,Street 3,Berlin,900,6,villa\n'
+        )
+        upload = SimpleUploadedFile('listings.csv', content.encode('utf-8'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('listings-bulk'), {'file': upload}, format='multipart')
+        self.assertEqual(response.data['created'], 3)
+        loft, flat = Listing.objects.get(title='Loft'), Listing.objects.get(title='Flat')
+        self.assertEqual(sorted(self._inbox()), sorted([loft.id, flat.id]))
+        # Временные метки сняты
+        self.assertEqual(
+            sorted(Listing.objects.filter(owner=self.landlord).values_list('external_ref', flat=True), key=str),
+            sorted([None, None, 'S2'], key=str),
+        )
+
+    def test_read_and_owner_excluded(self):
+        """Свои объявления владельцу не приходят; прочитанные скрываются с ?unread=true"""
+        self.client.force_authenticate(self.landlord)
+        self.client.post(reverse('saved-searches-list'), {'params': {'city': 'Berlin'}}, format='json')
+        first, second = self._create(), self._create()
+        self.client.force_authenticate(self.landlord)
+        response = self.client.get(reverse('saved-searches-inbox'))
+        self.assertEqual(response.data['results'], [])
+
+        self.assertEqual(self._inbox(unread='true'), [second.id, first.id])
+        inbox = self.client.get(reverse('saved-searches-inbox')).data['results']
+        response = self.client.post(reverse('saved-searches-read'), {'ids': [inbox[0]['id']]}, format='json')
+        self.assertEqual(response.data, {'updated': 1})
+        self.assertEqual(self._inbox(unread='true'), [first.id])
+        self.client.post(reverse('saved-searches-read'), {}, format='json')
+        self.assertEqual(self._inbox(unread='true'), [])
+        self.assertEqual(len(self._inbox()), 2)
+
+
+class ViewHistoryBufferTest(APITestCase):
+    def setUp(self):
+        self.landlord = User.objects.create_user(
+            username='bufferlandlord',
+            email='buffer@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.tenant = User.objects.create_user(
+            username='buffertenant',
+            email='buffertenant@test.com',
+            password='pass123',
+            user_type='tenant'
+        )
+        self.listing = Listing.objects.create(
+            title='Buffered',
+            description='Description',
+            location='Location',
+            price=100,
+            rooms=2,
+            property_type='apartment',
+            owner=self.landlord
+        )
+        # Большой размер и интервал: в тесте пишет только явный flush()
+        self.buffer = BufferedWriter('test_views', write_views, max_size=1000, flush_interval=3600, max_pending=3)
+        # Иначе atexit-хук писал бы остаток уже после удаления тестовой БД
+        self.addCleanup(self.buffer.close)
+
+    def test_flush_writes_unique_views(self):
+        for _ in range(3):
+            self.buffer.add((self.tenant.pk, self.listing.pk))
+        self.assertFalse(ViewHistory.objects.exists())
+
+        self.buffer.flush()
+        self.buffer.add((self.tenant.pk, self.listing.pk))
+        self.buffer.flush()
+
+        self.assertEqual(ViewHistory.objects.filter(user=self.tenant, listing=self.listing).count(), 1)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.views_count, 1)
+        self.assertEqual(self.buffer.stats['written'], 4)
+
+    def test_deleted_listing_is_skipped(self):
+        self.buffer.add((self.tenant.pk, self.listing.pk + 1000))
+        self.buffer.flush()
+        self.assertFalse(ViewHistory.objects.exists())
+        self.assertEqual(self.buffer.stats['dropped'], 0)
+
+    def test_overflow_is_dropped_and_counted(self):
+        results = [self.buffer.add((self.tenant.pk, self.listing.pk)) for _ in range(5)]
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual(self.buffer.dropped, 2)
+
+    def test_close_writes_rest_and_unregisters(self):
+        self.buffer.add((self.tenant.pk, self.listing.pk))
+        self.buffer.close()
+        self.assertEqual(ViewHistory.objects.count(), 1)
+        # После close событие пишется сразу
+        self.assertTrue(self.buffer.add((self.tenant.pk, self.listing.pk)))
+        self.assertEqual(self.buffer.stats['written'], 2)
+
+    def test_failed_flush_is_counted(self):
+        def fail(events):
+            raise DatabaseError('database is gone')
+
+        buffer = BufferedWriter('failing', fail, max_size=1000, flush_interval=3600)
+        self.addCleanup(buffer.close)
+        buffer.add((self.tenant.pk, self.listing.pk))
+        buffer.add((self.tenant.pk, self.listing.pk))
+        with self.assertLogs('rental_project.buffer', level='ERROR'):
+            buffer.flush()
+        self.assertEqual(buffer.dropped, 2)
+
+
+class ListingSuggestTest(APITestCase):
+    def setUp(self):
+        suggest_index.clear()
+        self.landlord = User.objects.create_user(
+            username='suggestlandlord',
+            email='suggest@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.tenants = [
+            User.objects.create_user(
+                username=f'suggesttenant{i}',
+                email=f'suggesttenant{i}@test.com',
+                password='pass123',
+                user_type='tenant'
+            )
+            for i in range(2)
+        ]
+        self._create('Cozy loft near park', 'Berlin', 'Neukölln')
+        self._create('Cozy flat', 'Berlin', 'Mitte')
+        self._create('Bergblick chalet', 'München', None)
+
+    def _create(self, title, city, district):
+        return Listing.objects.create(
+            title=title,
+            description='Description',
+            location='Location',
+            city=city,
+            district=district,
+            price=100,
+            rooms=2,
+            property_type='apartment',
+            owner=self.landlord
+        )
+
+    def _suggest(self, q):
+        response = self.client.get(reverse('listings-suggest'), {'q': q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(item['text'], item['kind']) for item in response.data]
+
+    def test_prefix_completions(self):
+        self.assertEqual(self._suggest('ber'), [('Berlin', 'city'), ('Bergblick chalet', 'title')])
+        self.assertEqual(self._suggest('cozy l'), [('Cozy loft near park', 'title')])
+        self.assertEqual(self._suggest('NEUK'), [('Neukölln', 'district')])
+        self.assertEqual(self._suggest(''), [])
+
+    def test_search_is_logged_and_suggested(self):
+        for tenant in self.tenants:
+            self.client.force_authenticate(user=tenant)
+            self.client.get(reverse('listings-list'), {'search': '  balcony   garden '})
+        self.client.force_authenticate(user=None)
+        self.client.get(reverse('listings-list'), {'search': 'balcony anonymous'})
+
+        self.assertEqual(
+            list(SearchHistory.objects.values_list('query', flat=True)),
+            ['balcony garden', 'balcony garden']
+        )
+        self.assertEqual(self._suggest('balc'), [('balcony garden', 'query')])
+
+    def test_single_user_query_not_suggested(self):
+        SearchHistory.objects.create(user=self.tenants[0], query='private query')
+        SearchHistory.objects.create(user=self.tenants[0], query='private query')
+        self.assertEqual(self._suggest('priv'), [])
+
+    def test_incremental_refresh(self):
+        self.assertEqual(self._suggest('penth'), [])
+        penthouse = self._create('Penthouse', 'Hamburg', None)
+        suggest_index.refresh()
+        self.assertEqual(self._suggest('penth'), [('Penthouse', 'title')])
+        self.assertEqual(self._suggest('ham'), [('Hamburg', 'city')])
+
+        penthouse.is_active = False
+        penthouse.save()
+        suggest_index.refresh()
+        self.assertEqual(self._suggest('penth'), [])
+        self.assertEqual(self._suggest('ham'), [])
+
+
+class ListingSimilarTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        similar_index.clear()
+        self.landlord = User.objects.create_user(
+            username='similarlandlord',
+            email='similar@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.base = self._create('Sunny loft with balcony', 'Berlin', 'Mitte', 'apartment', 2, 1000)
+        self.close = self._create('Sunny loft near park', 'Berlin', 'Mitte', 'apartment', 2, 1050)
+        self.cheaper = self._create('Small flat', 'Berlin', 'Pankow', 'apartment', 1, 500)
+        self.house = self._create('Family house with garden', 'Berlin', 'Pankow', 'house', 5, 3000)
+        self.other_city = self._create('Sunny loft with balcony', 'Hamburg', 'Altona', 'apartment', 2, 1000)
+
+    def _create(self, title, city, district, property_type, rooms, price, is_active=True):
+        return Listing.objects.create(
+            title=title,
+            description=title,
+            location='Location',
+            city=city,
+            district=district,
+            price=price,
+            rooms=rooms,
+            property_type=property_type,
+            is_active=is_active,
+            owner=self.landlord
+        )
+
+    def _similar(self, listing, **params):
+        response = self.client.get(reverse('listings-similar', args=[listing.id]), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data]
+
+    def test_ranked_within_city(self):
+        self.assertEqual(self._similar(self.base), [self.close.id, self.cheaper.id, self.house.id])
+        self.assertEqual(self._similar(self.base, limit=1), [self.close.id])
+        self.assertEqual(self._similar(self.other_city), [])
+
+    def test_index_follows_changes(self):
+        """Новые, изменённые и удалённые объявления видны без перестроения партиции"""
+        self._similar(self.base)
+        twin = self._create('Sunny loft with balcony', 'Berlin', 'Mitte', 'apartment', 2, 1000)
+        self.assertEqual(self._similar(self.base)[0], twin.id)
+
+        twin.city = 'Hamburg'
+        twin.save()
+        self.close.is_active = False
+        self.close.save()
+        self.house.delete()
+        self.assertEqual(self._similar(self.base), [self.cheaper.id])
+        self.assertEqual(self._similar(self.other_city), [twin.id])
+
+    def test_stale_index_entries_are_skipped(self):
+        """Изменения в обход сигналов: ответ сверяется с БД, refresh дочитывает их"""
+        self._similar(self.base)
+        Listing.objects.filter(pk=self.close.pk).update(is_active=False)
+        self.assertNotIn(self.close.id, self._similar(self.base))
+
+        Listing.objects.filter(pk=self.house.pk).update(
+            title='Sunny loft with balcony', description='Sunny loft with balcony', property_type='apartment',
+            rooms=2, price=1000, updated_at=timezone.now(),
+        )
+        self.assertEqual(self._similar(self.base), [self.cheaper.id, self.house.id])
+        similar_index.partition(self.base.city_location_id).refresh()
+        self.assertEqual(self._similar(self.base), [self.house.id, self.cheaper.id])
+
+    def test_invalid_limit(self):
+        response = self.client.get(reverse('listings-similar', args=[self.base.id]), {'limit': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ListingResponseCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.landlord = User.objects.create_user(
+            username='cachelandlord',
+            email='cache@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.berlin = self._create('Berlin flat', 'Berlin')
+        self.hamburg = self._create('Hamburg flat', 'Hamburg')
+
+    def _create(self, title, city):
+        return Listing.objects.create(
+            title=title,
+            description='Description',
+            location='Location',
+            city=city,
+            price=100,
+            rooms=2,
+            property_type='apartment',
+            owner=self.landlord
+        )
+
+    def _titles(self, **params):
+        response = self.client.get(reverse('listings-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item['title'] for item in response.data['results']}
+
+    def test_anonymous_list_and_detail_served_from_cache(self):
+        url = reverse('listings-detail', kwargs={'pk': self.berlin.pk})
+        self._titles()
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._titles(), {'Berlin flat', 'Hamburg flat'})
+            response = self.client.get(url)
+        self.assertEqual(response.data['title'], 'Berlin flat')
+
+    def test_authenticated_requests_not_cached(self):
+        self.client.force_authenticate(user=self.landlord)
+        self._titles()
+        Listing.objects.filter(pk=self.berlin.pk).update(title='Changed silently')
+        self.assertIn('Changed silently', self._titles())
+
+    def test_update_and_toggle_invalidate(self):
+        detail = reverse('listings-detail', kwargs={'pk': self.berlin.pk})
+        self._titles()
+        self.client.get(detail)
+
+        self.client.force_authenticate(user=self.landlord)
+        self.client.patch(detail, {'title': 'Renamed'})
+        self.client.post(reverse('listings-toggle-active', kwargs={'pk': self.hamburg.pk}))
+        self.client.force_authenticate(user=None)
+
+        self.assertEqual(self._titles(), {'Renamed'})
+        self.assertEqual(self.client.get(detail).data['title'], 'Renamed')
+
+    def test_city_list_uses_city_generation(self):
+        self.assertEqual(self._titles(city='Berlin'), {'Berlin flat'})
+        # Изменение в другом городе не сбрасывает кэш Берлина
+        self.hamburg.price = 200
+        self.hamburg.save()
+        with self.assertNumQueries(0):
+            self._titles(city='Berlin')
+
+        # Переезд объявления сбрасывает и старый, и новый город
+        self.assertEqual(self._titles(city='Hamburg'), {'Hamburg flat'})
+        self.berlin.city = 'Hamburg'
+        self.berlin.save()
+        self.assertEqual(self._titles(city='Berlin'), set())
+        self.assertEqual(self._titles(city='Hamburg'), {'Berlin flat', 'Hamburg flat'})
+
+    def test_booking_invalidates_availability_lists(self):
+        tenant = User.objects.create_user(
+            username='cachetenant',
+            email='cachetenant@test.com',
+            password='pass123',
+            user_type='tenant'
+        )
+        day = date.today() + timedelta(days=5)
+        params = {'check_in': day.isoformat(), 'check_out': (day + timedelta(days=2)).isoformat()}
+        self.assertEqual(self._titles(**params), {'Berlin flat', 'Hamburg flat'})
+        with self.captureOnCommitCallbacks() as callbacks:
+            Booking.objects.create(
+                listing=self.berlin,
+                tenant=tenant,
+                start_date=day,
+                end_date=day + timedelta(days=1),
+                status=Booking.STATUS_PENDING
+            )
+            # До коммита поколение не сброшено: незакоммиченная бронь в кэш не попадает
+            self.assertEqual(self._titles(**params), {'Berlin flat', 'Hamburg flat'})
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self._titles(**params), {'Hamburg flat'})
+
+
+class ListingConditionalGetTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.landlord = User.objects.create_user(
+            username='etaglandlord',
+            email='etag@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.listing = Listing.objects.create(
+            title='Conditional',
+            description='Description',
+            location='Location',
+            price=100,
+            rooms=2,
+            property_type='apartment',
+            owner=self.landlord
+        )
+        self.detail = reverse('listings-detail', kwargs={'pk': self.listing.pk})
+
+    def test_detail_not_modified(self):
+        response = self.client.get(self.detail)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        self.listing.price = 120
+        self.listing.save()
+        response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.detail)['Last-Modified']
+        response = self.client.get(self.detail, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_etag_follows_aggregate(self):
+        self.client.force_authenticate(user=self.landlord)
+        url = reverse('listings-list')
+        etag = self.client.get(url)['ETag']
+        # 304 до сериализации: только агрегат, без выборки страницы
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.assertNotEqual(self.client.get(url, {'rooms': 2})['ETag'], etag)
+        Listing.objects.filter(pk=self.listing.pk).update(views_count=5)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_cursor_page_etag_without_aggregate(self):
+        """ETag страницы ?cursor= - из её строк, без COUNT/MAX по всей выборке"""
+        self.client.force_authenticate(user=self.landlord)
+        url = reverse('listings-list') + '?cursor=&fields=title'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] or 'MAX(' in query['sql'] for query in queries.captured_queries
+        ))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # views_count не в ?fields=, но меняет ETag страницы
+        Listing.objects.filter(pk=self.listing.pk).update(views_count=5)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        # Новая строка на странице
+        Listing.objects.create(
+            title='Second', description='D', location='L', price=90, rooms=1,
+            property_type='room', owner=self.landlord
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_cached_anonymous_response_keeps_validators(self):
+        etag = self.client.get(self.detail)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class ListingRowsSerializerTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.landlord = User.objects.create_user(
+            username='rowslandlord',
+            email='rows@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        Listing.objects.create(
+            title='Full', description='Balcony garden', location='Street 1', city='Berlin',
+            district='Mitte', price='1234.5', rooms=3, property_type='house',
+            latitude=52.52, longitude=13.405, owner=self.landlord
+        )
+        Listing.objects.create(
+            title='Sparse', description='Balcony', location='Street 2', city='Köln',
+            price=99, rooms=1, property_type='room', owner=self.landlord
+        )
+
+    def _assert_identical(self, queryset):
+        queryset = queryset.order_by('-created_at', '-id')
+        serializer = ListingSerializer(context={'request': None})
+        expected = JSONRenderer().render(ListingSerializer(list(queryset), many=True).data)
+        rows = list(listing_rows.values(queryset, serializer))
+        self.assertTrue(all(isinstance(row, dict) for row in rows))
+        self.assertEqual(JSONRenderer().render(ListingSerializer(rows, many=True).data), expected)
+
+    def test_byte_identical_output(self):
+        self._assert_identical(Listing.objects.all())
+
+    def test_byte_identical_with_distance(self):
+        queryset = filter_radius(Listing.objects.all(), 52.52, 13.40, 10)
+        self.assertTrue(queryset.exists())
+        self._assert_identical(queryset)
+
+    def test_plan_cache_bounded_by_fields(self):
+        """Сочетания ?fields= не раздувают кэш: шаги плана хранятся по полям"""
+        rows = ListingRows()
+        names = list(ListingSerializer().fields)
+        for size in range(1, len(names) + 1):
+            for start in range(len(names)):
+                fieldset = frozenset(names[start:start + size])
+                serializer = ListingSerializer(context={'fieldset': fieldset})
+                self.assertEqual([step[0] for step in rows.get_plan(serializer)],
+                                 [name for name in names if name in fieldset])
+        self.assertEqual(len(rows._steps), len(names))
+
+    def test_byte_identical_with_main_image(self):
+        full = Listing.objects.get(title='Full')
+        ListingImage.objects.create(listing=full, image='images/ab/abc/original.jpg', status='ready')
+        self._assert_identical(Listing.objects.select_related('main_image'))
+
+    def test_list_endpoint_uses_rows(self):
+        response = self.client.get(reverse('listings-list'), {'ordering': 'price'})
+        self.assertEqual([item['title'] for item in response.data['results']], ['Sparse', 'Full'])
+        self.assertEqual(response.data['results'][1]['price'], '1234.50')
+        self.assertEqual(response.data['results'][1]['owner'], 'rowslandlord (Landlord)')
+
+        # Keyset-курсор строится по словарям строк
+        response = self.client.get(reverse('listings-list'), {'cursor': '', 'ordering': '-price'})
+        self.assertEqual([item['title'] for item in response.data['results']], ['Full', 'Sparse'])
+        self.assertIsNone(response.data['next'])
+
+
+class ListingMainImageTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.landlord = User.objects.create_user(
+            username='coverlandlord', email='cover@test.com', password='pass123', user_type='landlord'
+        )
+        self.listing = Listing.objects.create(
+            title='Cover flat', description='Flat', location='Street 1', city='Berlin',
+            price=1000, rooms=2, property_type='apartment', owner=self.landlord
+        )
+
+    def _image(self, name, **kwargs):
+        return ListingImage.objects.create(listing=self.listing, image=f'images/{name}/original.jpg', **kwargs)
+
+    def _main_image_id(self):
+        self.listing.refresh_from_db()
+        return self.listing.main_image_id
+
+    def test_pointer_follows_images(self):
+        first = self._image('a')
+        self.assertEqual(self._main_image_id(), first.id)
+
+        second = self._image('b', is_main=True)
+        self.assertEqual(self._main_image_id(), second.id)
+
+        second.is_main = False
+        second.save()
+        self.assertEqual(self._main_image_id(), first.id)
+
+        first.delete()
+        self.assertEqual(self._main_image_id(), second.id)
+        second.delete()
+        self.assertIsNone(self._main_image_id())
+
+    def test_list_reads_cover_without_prefetch(self):
+        self._image('a', status='ready')
+        url = reverse('listings-list')
+        self.client.get(url)  # ответ в кэш
+
+        # Фото обработано - кэш списка сброшен
+        pending = self._image('b', is_main=True)
+        image_processor.mark(pending.image.name, KIND_LISTING, 'ready')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        cover = response.data['results'][0]['main_image']
+        self.assertEqual(cover['id'], pending.id)
+        self.assertEqual(cover['status'], 'ready')
+        self.assertTrue(cover['variants']['thumb']['jpg'].endswith('/images/b/thumb.jpg'))
+        self.assertFalse(any('FROM "listings_listingimage"' in query['sql'] for query in queries.captured_queries))
+
+    def test_repair_command(self):
+        image = self._image('a')
+        Listing.objects.update(main_image=None)
+        out = io.StringIO()
+        call_command('repair_main_images', stdout=out)
+        self.assertIn('fixed 1', out.getvalue())
+        self.assertEqual(self._main_image_id(), image.id)
+
+
+class ListingSparseFieldsetTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.landlord = User.objects.create_user(
+            username='sparselandlord',
+            email='sparse@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.listing = Listing.objects.create(
+            title='Sparse', description='Very long description', location='Street 1', city='Berlin',
+            price=100, rooms=2, property_type='apartment', owner=self.landlord
+        )
+        self.detail = reverse('listings-detail', kwargs={'pk': self.listing.pk})
+
+    def _listing_queries(self, queries):
+        return [query['sql'] for query in queries if 'FROM "listings_listing"' in query['sql']]
+
+    def test_list_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('listings-list'), {'fields': 'id,title,price,city'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'price', 'city'})
+        for sql in self._listing_queries(queries.captured_queries):
+            self.assertNotIn('"description"', sql)
+            self.assertNotIn('users_user', sql)
+
+    def test_detail_exclude(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.detail, {'exclude': 'description,owner'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('description', response.data)
+        self.assertNotIn('owner', response.data)
+        self.assertEqual(response.data['title'], 'Sparse')
+        # ETag считается по колонкам, которые прочитаны вместе с объектом - без дозапросов
+        self.assertEqual(len(self._listing_queries(queries.captured_queries)), 1)
+        self.assertNotIn('"description"', self._listing_queries(queries.captured_queries)[0])
+
+        self.assertEqual(
+            self.client.get(self.detail, {'exclude': 'description,owner'}, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+    def test_without_params_returns_all_fields(self):
+        response = self.client.get(self.detail)
+        self.assertIn('description', response.data)
+        self.assertEqual(response.data['owner'], 'sparselandlord (Landlord)')
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('listings-list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
+
+    def test_popular_fields(self):
+        response = self.client.get(reverse('listings-popular'), {'fields': 'id,title'})
+        self.assertEqual(response.data, [{'id': self.listing.pk, 'title': 'Sparse'}])
+
+
+
+class ListingBulkUploadTest(APITestCase):
+    CSV_HEADER = 'external_ref,title,description,location,city,district,price,rooms,property_type,latitude,longitude\n'
+
+    def setUp(self):
+        cache.clear()
+        self.landlord = User.objects.create_user(
+            username='bulklandlord',
+            email='bulk@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.url = reverse('listings-bulk')
+        self.client.force_authenticate(user=self.landlord)
+
+    def _upload(self, name, content, **params):
+        upload = SimpleUploadedFile(name, content.encode('utf-8'))
+        return self.client.post(self.url, {'file': upload, **params}, format='multipart')
+
+    def test_csv_upload_with_row_errors(self):
+        content = self.CSV_HEADER + (
+            'A1,Loft,Bright loft,Street 1,Berlin,Mitte,1200.50,2,apartment,52.52,13.405\n'
+            'A2,Broken,Bad price,Street 2,Berlin,,abc,1,room,,\n'
+            ',Studio,No reference,Street 3,Hamburg,,800,1,studio,,\n'
+        )
+        response = self._upload('listings.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+        self.assertEqual(response.data['errors'][0]['external_ref'], 'A2')
+        self.assertIn('price', response.data['errors'][0]['errors'])
+
+        # То, что обычно делает Listing.save(), проставлено и при bulk_create
+        loft = Listing.objects.get(owner=self.landlord, external_ref='A1')
+        self.assertEqual(loft.city_location.name, 'Berlin')
+        self.assertEqual(loft.district_location.name, 'Mitte')
+        self.assertEqual(loft.geohash, encode_geohash(52.52, 13.405))
+        studio = Listing.objects.get(owner=self.landlord, title='Studio')
+        self.assertIsNone(studio.external_ref)
+        self.assertIsNone(studio.district)
+
+    def test_ndjson_upsert_by_external_ref(self):
+        self._upload('listings.ndjson', json.dumps({
+            'external_ref': 'A1', 'title': 'Loft', 'description': 'Loft', 'location': 'Street 1',
+            'price': '1000', 'rooms': 2, 'property_type': 'apartment',
+        }) + '\n')
+        loft = Listing.objects.get(owner=self.landlord, external_ref='A1')
+
+        content = '\n'.join([
+            json.dumps({'external_ref': 'A1', 'price': '900', 'city': 'Hamburg'}),
+            'not json',
+            json.dumps({'external_ref': 'A1', 'rooms': 3}),
+        ])
+        response = self._upload('update.txt', content, file_format='ndjson')
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(response.data['errors'], [
+            {'row': 2, 'external_ref': None, 'errors': {'non_field_errors': ['Invalid JSON']}}
+        ])
+
+        updated = Listing.objects.get(pk=loft.pk)
+        self.assertEqual(str(updated.price), '900.00')
+        self.assertEqual(updated.rooms, 3)
+        self.assertEqual(updated.city_location.name, 'Hamburg')
+        self.assertGreater(updated.updated_at, loft.updated_at)
+        self.assertEqual(Listing.objects.filter(owner=self.landlord).count(), 1)
+
+    def test_duplicate_reference_in_file_becomes_update(self):
+        rows = [
+            (1, {'external_ref': 'D', 'title': 'First', 'description': 'D', 'location': 'L',
+                 'price': '10', 'rooms': 1, 'property_type': 'room'}, None),
+            (2, {'external_ref': 'D', 'title': 'Second'}, None),
+            (3, {'external_ref': 'E', 'title': 'Other', 'description': 'E', 'location': 'L',
+                 'price': '10', 'rooms': 1, 'property_type': 'room'}, None),
+        ]
+        report = ListingImporter(self.landlord, batch_size=2).run(rows)
+        self.assertEqual((report['created'], report['updated'], report['failed']), (2, 1, 0))
+        self.assertEqual(Listing.objects.get(external_ref='D').title, 'Second')
+
+    def test_references_are_per_owner(self):
+        other = User.objects.create_user(
+            username='otherbulk', email='otherbulk@test.com', password='pass123', user_type='landlord'
+        )
+        row = {'external_ref': 'A1', 'title': 'Loft', 'description': 'Loft', 'location': 'L',
+               'price': '10', 'rooms': 1, 'property_type': 'room'}
+        ListingImporter(other).run([(1, row, None)])
+        report = ListingImporter(self.landlord).run([(1, row, None)])
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(Listing.objects.filter(external_ref='A1').count(), 2)
+
+    def test_upload_invalidates_cached_list(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(reverse('listings-list')).data['count'], 0)
+
+        self.client.force_authenticate(user=self.landlord)
+        self._upload('listings.csv', self.CSV_HEADER + 'A1,Loft,Loft,Street,Berlin,,100,1,room,,\n')
+
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(reverse('listings-list')).data['count'], 1)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.post(self.url, {}, format='multipart').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self._upload('listings.xlsx', 'data')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('file_format', response.data)
+
+        tenant = User.objects.create_user(
+            username='bulktenant', email='bulktenant@test.com', password='pass123', user_type='tenant'
+        )
+        self.client.force_authenticate(user=tenant)
+        response = self._upload('listings.csv', self.CSV_HEADER)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_external_ref_unique_on_create(self):
+        data = {'title': 'Loft', 'description': 'Loft', 'location': 'L', 'price': '10',
+                'rooms': 1, 'property_type': 'room', 'external_ref': 'A1'}
+        self.assertEqual(self.client.post(reverse('listings-list'), data).status_code, status.HTTP_201_CREATED)
+        response = self.client.post(reverse('listings-list'), data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('external_ref', response.data)
+
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ListingExportTest(APITestCase):
+    def setUp(self):
+        self.landlord = User.objects.create_user(
+            username='exportlandlord',
+            email='export@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.tenant = User.objects.create_user(
+            username='exporttenant',
+            email='exporttenant@test.com',
+            password='pass123',
+            user_type='tenant'
+        )
+        self.listings = [
+            Listing.objects.create(
+                title=f'Export {index}', description='Line one\nline "two"', location='Street',
+                city='Köln', price=100 + index, rooms=index + 1, property_type='apartment',
+                is_active=index != 4, owner=self.landlord
+            )
+            for index in range(5)
+        ]
+        self.url = reverse('listings-export')
+
+    def _content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_csv_export_in_chunks(self):
+        self.client.force_authenticate(user=self.tenant)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('listings.csv', response['Content-Disposition'])
+
+        rows = list(csv.DictReader(io.StringIO(self._content(response).decode('utf-8'))))
+        # Неактивное объявление арендатор не видит - та же выборка, что у списка
+        self.assertEqual([int(row['id']) for row in rows], [listing.id for listing in self.listings[:4]])
+        self.assertEqual(rows[0]['description'], 'Line one\nline "two"')
+        self.assertEqual(rows[0]['city'], 'Köln')
+        self.assertEqual(rows[0]['price'], '100.00')
+        self.assertEqual(rows[0]['is_active'], 'true')
+        self.assertEqual(rows[0]['district'], '')
+
+    def test_internal_columns_not_exposed(self):
+        """Ключ импорта и служебные колонки не попадают в список, карточку и выгрузку"""
+        internal = {'external_ref', 'geohash', 'city_location', 'district_location'}
+        listing = self.listings[0]
+        Listing.objects.filter(pk=listing.pk).update(external_ref='PRIVATE-1')
+        list_item = self.client.get(reverse('listings-list')).data['results'][0]
+        detail = self.client.get(reverse('listings-detail', kwargs={'pk': listing.pk})).data
+        self.client.force_authenticate(user=self.tenant)
+        content = self._content(self.client.get(self.url, {'file_format': 'ndjson'}))
+        exported = json.loads(content.decode('utf-8').splitlines()[0])
+        for data in (list_item, detail, exported):
+            self.assertFalse(internal & set(data))
+            self.assertIn('title', data)
+        self.assertNotIn(b'PRIVATE-1', content)
+
+        response = self.client.get(reverse('listings-list'), {'fields': 'id,external_ref'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ndjson_export_with_fields(self):
+        self.client.force_authenticate(user=self.landlord)
+        response = self.client.get(self.url, {'file_format': 'ndjson', 'fields': 'id,title', 'min_rooms': 2})
+        lines = self._content(response).decode('utf-8').splitlines()
+        # Арендодатель видит и своё неактивное объявление, фильтры списка работают
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [{'id': listing.id, 'title': listing.title} for listing in self.listings[1:]]
+        )
+
+    def test_gzip(self):
+        self.client.force_authenticate(user=self.tenant)
+        plain = self._content(self.client.get(self.url, {'file_format': 'ndjson'}))
+        response = self.client.get(self.url, {'file_format': 'ndjson'}, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(self._content(response)), plain)
+
+    def test_requires_authentication_and_valid_format(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(user=self.tenant)
+        self.assertEqual(self.client.get(self.url, {'file_format': 'xml'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class ListingModelTest(TestCase):
     def setUp(self):
         self.landlord = User.objects.create_user(
@@ -360,4 +2106,205 @@ class ListingModelTest(TestCase):
             is_active=False
         )
 
-        self.assertFalse(listing.is_active)
\ No newline at end of file
+        self.assertFalse(listing.is_active)
+
+
+class ListingSearchTest(TransactionTestCase):
+    """
+    Полнотекстовый поиск. TransactionTestCase: FULLTEXT индекс MySQL
+    видит только закоммиченные строки
+    """
+
+    def setUp(self):
+        self.landlord = User.objects.create_user(
+            username='searchlandlord',
+            email='search@test.com',
+            password='pass123',
+            user_type='landlord'
+        )
+        self.garden = self._create('Garden house', 'Quiet garden, garden terrace and a big garden')
+        self.loft = self._create('Modern loft', 'Loft near the garden market')
+        self.studio = self._create('Small studio', 'Central studio near the station')
+
+    def _create(self, title, description, **kwargs):
+        return Listing.objects.create(
+            title=title,
+            description=description,
+            location='Location',
+            city='Berlin',
+            price=100.00,
+            rooms=2,
+            property_type='apartment',
+            owner=self.landlord,
+            **kwargs
+        )
+
+    def _search(self, query):
+        response = self.client.get(reverse('listings-list'), {'search': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_search_ranked_by_relevance(self):
+        """Самые релевантные объявления идут первыми"""
+        ids = self._search('garden')
+        self.assertEqual(set(ids), {self.garden.id, self.loft.id})
+        self.assertEqual(ids[0], self.garden.id)
+
+    def test_search_all_terms_required(self):
+        """Все слова запроса должны встречаться в объявлении"""
+        self.assertEqual(self._search('garden market'), [self.loft.id])
+
+    def test_search_without_terms_finds_nothing(self):
+        """Строка из одних спецсимволов ничего не находит, а не отдаёт весь список"""
+        for query in ['!!!', '--', '"*']:
+            self.assertEqual(self._search(query), [], query)
+        for backend in (IcontainsSearchBackend(), MySQLFulltextBackend()):
+            self.assertFalse(backend.search(Listing.objects.all(), '!!!').exists())
+        self.assertEqual(IcontainsSearchBackend().search(Listing.objects.all(), '').count(), 3)
+
+    def test_search_ordering_param_overrides_rank(self):
+        """?ordering= имеет приоритет над релевантностью"""
+        self.loft.price = 50
+        self.loft.save()
+        response = self.client.get(reverse('listings-list'), {'search': 'garden', 'ordering': 'price'})
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.loft.id, self.garden.id]
+        )
+
+    def test_index_follows_update_and_delete(self):
+        """Индекс синхронизируется при сохранении и удалении"""
+        self.studio.description = 'Studio with a garden view'
+        self.studio.save()
+        self.assertIn(self.studio.id, self._search('garden'))
+
+        self.garden.delete()
+        self.assertNotIn(self.garden.id, self._search('garden'))
+
+    def test_search_skips_inactive_listings(self):
+        """Неактивные объявления не попадают в выдачу"""
+        self._create('Hidden garden flat', 'Garden', is_active=False)
+        self.assertEqual(len(self._search('hidden')), 0)
+
+    def test_backend_rebuild(self):
+        """rebuild() восстанавливает индекс после bulk_create"""
+        Listing.objects.bulk_create([
+            Listing(title='Bulk penthouse', description='Bulk', location='L', city='Berlin',
+                    price=10, rooms=1, property_type='studio', owner=self.landlord)
+        ])
+        get_search_backend().rebuild()
+        self.assertEqual(len(self._search('penthouse')), 1)
+
+    def test_bulk_import_is_indexed(self):
+        """Массовая загрузка (bulk_create / bulk_update) сама обновляет индекс"""
+        rows = [(1, {'title': 'Imported penthouse', 'description': 'Roof', 'location': 'L',
+                     'price': '10', 'rooms': 1, 'property_type': 'studio', 'external_ref': 'P1'}, None)]
+        ListingImporter(self.landlord).run(rows)
+        self.assertEqual(len(self._search('penthouse')), 1)
+
+        rows = [(1, {'external_ref': 'P1', 'title': 'Imported bungalow'}, None)]
+        ListingImporter(self.landlord).run(rows)
+        self.assertEqual(len(self._search('penthouse')), 0)
+        self.assertEqual(len(self._search('bungalow')), 1)
+
+
+class ListingImageUploadTest(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=cls.media_root)
+        media.enable()
+        cls.addClassCleanup(shutil.rmtree, cls.media_root, ignore_errors=True)
+        cls.addClassCleanup(media.disable)
+
+    def setUp(self):
+        cache.clear()
+        self.landlord = User.objects.create_user(
+            username='photolandlord', email='photo@test.com', password='pass123', user_type='landlord'
+        )
+        self.listing = Listing.objects.create(
+            title='Photo flat', description='Flat', location='Street 1', city='Berlin',
+            price=1000, rooms=2, property_type='apartment', owner=self.landlord
+        )
+        self.url = reverse('listings-images', args=[self.listing.id])
+        self.client.force_authenticate(user=self.landlord)
+
+    def _jpeg(self, size=(800, 600), color='red'):
+        image = Image.new('RGB', size, color)
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        exif[0x0112] = 6  # Повёрнуто на 90 градусов
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def _open(self, name):
+        with default_storage.open(name, 'rb') as source:
+            image = Image.open(source)
+            image.load()
+        return image
+
+    def test_upload_builds_variants_without_exif(self):
+        response = self.client.post(self.url, {'image': self._jpeg(), 'is_main': True}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'ready')
+        self.assertEqual(set(response.data['variants']), {'thumb', 'large'})
+        self.assertTrue(response.data['variants']['thumb']['webp'].endswith('/thumb.webp'))
+
+        image = ListingImage.objects.get(pk=response.data['id'])
+        self.assertTrue(image.image.name.startswith('images/'))
+        thumb = self._open(variant_name(image.image.name, 'thumb', 'jpg'))
+        self.assertEqual(thumb.size, (400, 300))
+        self.assertEqual(len(thumb.getexif()), 0)
+        # Поворот из EXIF применён, большой вариант не увеличивается
+        self.assertEqual(self._open(variant_name(image.image.name, 'large', 'webp')).size, (600, 800))
+        self.assertEqual(len(self._open(image.image.name).getexif()), 0)
+
+        response = self.client.get(self.url)
+        self.assertEqual([item['id'] for item in response.data], [image.id])
+        self.assertNotIn('image', response.data[0])
+
+    def test_identical_uploads_share_files(self):
+        first = self.client.post(self.url, {'image': self._jpeg()}, format='multipart')
+        second = self.client.post(self.url, {'image': self._jpeg()}, format='multipart')
+        names = set(ListingImage.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertEqual(first.data['variants'], second.data['variants'])
+
+    def test_pending_until_processed(self):
+        with self.settings(IMAGE_PROCESSING_WORKERS=1), self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(self.url, {'image': self._jpeg(color='blue')}, format='multipart')
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertIsNone(response.data['variants'])
+        self.assertEqual(len(callbacks), 1)
+
+        # Задача потерялась (воркер перезапущен) - доделывает команда
+        call_command('process_images', stdout=io.StringIO())
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['status'], 'ready')
+
+    def test_legacy_upload_is_moved(self):
+        legacy = default_storage.save('listing_images/old.jpg', self._jpeg(color='green'))
+        image = ListingImage.objects.create(listing=self.listing, image=legacy)
+        call_command('process_images', stdout=io.StringIO())
+        image.refresh_from_db()
+        self.assertEqual(image.status, 'ready')
+        self.assertTrue(image.image.name.startswith('images/'))
+
+    def test_upload_validation_and_permissions(self):
+        upload = SimpleUploadedFile('notes.jpg', b'not an image', content_type='image/jpeg')
+        response = self.client.post(self.url, {'image': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.settings(IMAGE_MAX_UPLOAD_SIZE=100):
+            response = self.client.post(self.url, {'image': self._jpeg()}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        other = User.objects.create_user(
+            username='otherphoto', email='otherphoto@test.com', password='pass123', user_type='landlord'
+        )
+        self.client.force_authenticate(user=other)
+        response = self.client.post(self.url, {'image': self._jpeg()}, format='multipart')
+        self.assertIn(response.status_code, (status.HTTP_403_FORBIDDEN, status.HTTP_404_NOT_FOUND))
+        self.assertFalse(ListingImage.objects.exists())
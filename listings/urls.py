@@ -1,7 +1,8 @@
 from rest_framework.routers import DefaultRouter
-from .views import ListingViewSet
+from .views import ListingViewSet, SavedSearchViewSet
 
 router = DefaultRouter()
 router.register(r'listings', ListingViewSet, basename='listings')
+router.register(r'saved-searches', SavedSearchViewSet, basename='saved-searches')
 
 urlpatterns = router.urls
\ No newline at end of file
@@ -1,25 +1,78 @@
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
-from django.db.models import Count, Q
+from datetime import datetime, timedelta, timezone
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils.dateparse import parse_date
+from django.utils.http import parse_http_date_safe
+from django.utils.timezone import localdate
 
-from .models import Listing, ViewHistory
-from .serializers import ListingSerializer, ListingCreateSerializer
-from .filters import ListingFilter
+from .also_viewed import ALSO_VIEWED_LIMIT, ALSO_VIEWED_STORED, get_neighbour_ids
+from .bulk import FILE_FORMATS, ListingImporter, guess_format, read_rows
+from .cache import (
+    get_cache, get_generations, list_generations, listing_generation, make_key, normalize_params,
+)
+from .facets import compute_facets
+from .models import Listing, ListingImage, Location, SavedSearch, SavedSearchMatch
+from .locations import location_lookup
+from .popularity import POPULAR_LIMIT, WINDOW_ALL, WINDOW_CHOICES, get_trending_ids, record_view
+from .price_stats import MAX_HISTOGRAM_BUCKETS, PRICE_HISTOGRAM_BUCKETS, get_price_stats
+from .similar import FEATURE_FIELDS, MAX_SIMILAR_LIMIT, SIMILAR_LIMIT, similar_index
+from .suggest import SUGGEST_LIMIT, record_search, suggest_index
+from .saved_searches import index_search
+from .serializers import (
+    ListingImageSerializer, ListingSerializer, ListingCreateSerializer, SavedSearchMatchSerializer,
+    SavedSearchSerializer, listing_rows,
+)
+from .filters import ListingFilter, ListingSearchFilter
+from .geo import ListingGeoFilter
+from bookings.calendar import DEFAULT_CALENDAR_DAYS, MAX_CALENDAR_DAYS, calendar_days
+from bookings.models import ListingCalendar
 from users.permissions import IsLandlordOrReadOnly
+from rental_project.conditional import ConditionalGetMixin, row_value
+from rental_project.export import ExportMixin
+from rental_project.fieldsets import SparseFieldsetMixin
+from rental_project.pagination import KeysetPagination
 
-class ListingViewSet(viewsets.ModelViewSet):
+FACETS_CACHE_TIMEOUT = 300
+# Ответы анонимным пользователям на список и карточку
+RESPONSE_CACHE_TIMEOUT = 300
+# Исходное объявление /similar/: признаки, город и владелец (для проверки прав)
+SIMILAR_SOURCE_FIELDS = ('city_location_id', 'owner_id', 'is_active') + FEATURE_FIELDS
+# Параметры, которые не влияют на состав выборки
+NON_FILTER_PARAMS = ('page', 'page_size', 'cursor', 'ordering', 'format')
+
+class ListingViewSet(SparseFieldsetMixin, ConditionalGetMixin, ExportMixin, viewsets.ModelViewSet):
     serializer_class = ListingSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ListingSearchFilter, ListingGeoFilter, filters.OrderingFilter]
     filterset_class = ListingFilter
     search_fields = ['title', 'description', 'location', 'city', 'district']
     ordering_fields = ['price', 'created_at', 'updated_at', 'rooms']
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsLandlordOrReadOnly]
+    pagination_class = KeysetPagination
+    # views_count меняется без updated_at - учитываем его в ETag отдельно
+    list_etag_aggregates = {'views': Sum('views_count')}
+    sparse_required_fields = ('views_count',)
+    # Аннотация ListingGeoFilter: без ?lat=&lng= поля в ответе нет
+    sparse_field_sources = {'distance_km': ()}
+    export_name = 'listings'
+
+    def get_etag_parts(self, instance):
+        # На keyset-странице instance - строка values()
+        return (row_value(instance, 'views_count'),)
+
+    def get_list_version(self):
+        # Кэш агрегата списка (COUNT для пагинации и ETag) сбрасывается вместе с кэшем ответов
+        return get_generations(list_generations(self.request.query_params))
 
     def get_queryset(self):
         # Базовый queryset с оптимизацией запросов
-        queryset = Listing.objects.select_related('owner').prefetch_related('images')
+        # Обложка - одним JOIN, без prefetch всех фото страницы
+        queryset = Listing.objects.select_related('owner', 'main_image')
 
         # Для аутентифицированных пользователей показываем все активные
         # Для неаутентифицированных - тоже все активные
@@ -35,17 +88,72 @@ class ListingViewSet(viewsets.ModelViewSet):
             # Неаутентифицированные видят только активные
             queryset = queryset.filter(is_active=True)
 
-        # Сохраняем просмотр если пользователь аутентифицирован
-        if self.request.user.is_authenticated and self.action == 'retrieve':
-            listing_id = self.kwargs.get('pk')
-            if listing_id:
-                ViewHistory.objects.get_or_create(
-                    user=self.request.user,
-                    listing_id=listing_id
-                )
-
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        key = self.get_response_cache_key(
+            'listings:list',
+            list_generations(request.query_params),
+            normalize_params(request.query_params),
+        )
+        response = self.cached_response(key, super().list, request, *args, **kwargs)
+        # Запрос из ?search= пишется в историю поиска (в буфер, не в запросе)
+        if request.user.is_authenticated and request.query_params.get('search'):
+            record_search(request.user, request.query_params['search'])
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        key = self.get_response_cache_key(
+            'listings:detail',
+            [listing_generation(kwargs['pk'])],
+            kwargs['pk'],
+            normalize_params(request.query_params),
+        )
+        response = self.cached_response(key, super().retrieve, request, *args, **kwargs)
+        # Сохраняем просмотр если пользователь аутентифицирован (в буфер,
+        # запись в БД пачкой вне запроса)
+        if request.user.is_authenticated:
+            record_view(request.user, self.kwargs['pk'])
+        return response
+
+    def get_response_cache_key(self, prefix, generations, *parts):
+        """Кэшируются только анонимные GET: им всем отдаётся одно и то же"""
+        if self.request.method != 'GET' or self.request.user.is_authenticated:
+            return None
+        # В ссылках пагинации абсолютный URL - хост входит в ключ
+        return make_key(prefix, get_generations(generations), self.request.get_host(), *parts)
+
+    def cached_response(self, key, view, request, *args, **kwargs):
+        if key is None:
+            return view(request, *args, **kwargs)
+        cache = get_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            # Валидаторы сохранены вместе с ответом: If-None-Match проверяется без БД
+            data, etag, timestamp = cached
+            last_modified = datetime.fromtimestamp(timestamp, timezone.utc) if timestamp else None
+            return self.conditional_response(request, etag, last_modified, lambda: Response(data))
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            timestamp = parse_http_date_safe(response.get('Last-Modified', ''))
+            cache.set(key, (response.data, response.get('ETag'), timestamp), RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def get_rows(self, queryset):
+        """Строки для быстрого пути сериализации (values() вместо моделей)"""
+        # Колонки ETag страницы (?cursor=) нужны и при ?fields= без них
+        required = (self.last_modified_field, *self.sparse_required_fields)
+        return listing_rows.values(queryset, self.get_serializer(), required)
+
+    def get_export_queryset(self, queryset):
+        return self.get_rows(queryset)
+
+    def paginate_queryset(self, queryset):
+        # Списки только читаются - страницу выбираем словарями, без моделей
+        if self.action == 'list' and self.get_serializer_class() is ListingSerializer:
+            queryset = self.get_rows(queryset)
+        return super().paginate_queryset(queryset)
+
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return ListingCreateSerializer
@@ -75,12 +183,236 @@ class ListingViewSet(viewsets.ModelViewSet):
             'message': f'Listing is now {"active" if listing.is_active else "inactive"}'
         })
 
+    @action(detail=True, methods=['get', 'post'])
+    def images(self, request, pk=None):
+        """
+        Фото объявления. POST (владелец, multipart: image, is_main) сохраняет
+        оригинал и ставит его в обработку: в ответе status=pending, пока
+        варианты не готовы
+        """
+        listing = self.get_object()
+        if request.method == 'GET':
+            images = ListingImage.objects.filter(listing=listing).order_by('-is_main', 'id')
+            return Response(ListingImageSerializer(images, many=True, context=self.get_serializer_context()).data)
+
+        serializer = ListingImageSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            if serializer.validated_data.get('is_main'):
+                listing.images.filter(is_main=True).update(is_main=False)
+            serializer.save(listing=listing)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Похожие активные объявления того же города: цена, комнаты, тип, район и текст (?limit=)"""
+        # Фильтры списка к исходному объявлению не относятся - без filter_queryset
+        listing = get_object_or_404(self.get_queryset().select_related(None).only(*SIMILAR_SOURCE_FIELDS), pk=pk)
+        self.check_object_permissions(request, listing)
+        try:
+            limit = min(int(request.query_params.get('limit', SIMILAR_LIMIT)), MAX_SIMILAR_LIMIT)
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer'})
+        limit = max(limit, 1)
+
+        # Индекс мог отстать от БД (другой процесс снял объявление) - берём с запасом
+        ids = similar_index.similar(listing, 2 * limit)
+        queryset = Listing.objects.filter(is_active=True, city_location_id=listing.city_location_id, pk__in=ids)
+        rows = {row['id']: row for row in self.get_rows(queryset)}
+        similar_listings = [rows[pk] for pk in ids if pk in rows][:limit]
+
+        serializer = self.get_serializer(similar_listings, many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path='also-viewed')
+    def also_viewed(self, request, pk=None):
+        """«Смотрели также»: объявления, которые смотрели зрители этого (?limit=)"""
+        get_object_or_404(self.get_queryset().select_related(None).only('id'), pk=pk)
+        try:
+            limit = min(int(request.query_params.get('limit', ALSO_VIEWED_LIMIT)), ALSO_VIEWED_STORED)
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer'})
+
+        # Соседи посчитаны заранее (refresh_also_viewed); неактивные отбрасываем здесь
+        ids = get_neighbour_ids(pk)
+        rows = {row['id']: row for row in self.get_rows(Listing.objects.filter(is_active=True, pk__in=ids))}
+        neighbours = [rows[neighbour] for neighbour in ids if neighbour in rows][:max(limit, 1)]
+
+        serializer = self.get_serializer(neighbours, many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def calendar(self, request, pk=None):
+        """
+        Статус каждого дня [?from, ?to): booked, pending, blocked или free (по
+        умолчанию DEFAULT_CALENDAR_DAYS дней с сегодняшнего). Читается одна
+        строка ListingCalendar; ETag меняется только с бронированиями и
+        закрытыми датами объявления
+        """
+        get_object_or_404(self.get_queryset().select_related(None).only('id'), pk=pk)
+        start = self._calendar_date('from', localdate())
+        end = self._calendar_date('to', start + timedelta(days=DEFAULT_CALENDAR_DAYS))
+        if end <= start:
+            raise ValidationError({'to': 'to must be after from'})
+        if (end - start).days > MAX_CALENDAR_DAYS:
+            raise ValidationError({'to': f'The period must not exceed {MAX_CALENDAR_DAYS} days'})
+
+        calendar = ListingCalendar.objects.filter(listing_id=pk).first()
+        version = calendar.version if calendar is not None else 0
+        # Период входит в ETag явно: без ?from= он сдвигается каждый день
+        etag = self.make_etag('calendar', pk, version, start, end)
+        last_modified = calendar.updated_at if calendar is not None else None
+        return self.conditional_response(request, etag, last_modified, lambda: Response({
+            'from': start, 'to': end, 'days': calendar_days(calendar, start, end),
+        }))
+
+    def _calendar_date(self, name, default):
+        value = self.request.query_params.get(name)
+        if not value:
+            return default
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Enter a valid date (YYYY-MM-DD)'})
+        return parsed
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Массовая загрузка объявлений из CSV / NDJSON (поле file, формат - по
+        расширению или ?file_format=). Строки с известным external_ref
+        обновляют объявления. В ответе счётчики и ошибки по строкам
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'This field is required'})
+        file_format = request.query_params.get('file_format') or request.data.get('file_format') or guess_format(upload.name)
+        if file_format not in FILE_FORMATS:
+            raise ValidationError({'file_format': f'Must be one of: {", ".join(FILE_FORMATS)}'})
+
+        report = ListingImporter(request.user).run(read_rows(upload, file_format))
+        return Response(report)
+
     @action(detail=False, methods=['get'])
     def popular(self, request):
-        """Популярные объявления (по количеству просмотров)"""
-        popular_listings = Listing.objects.filter(is_active=True).annotate(
-            views_count=Count('views')
-        ).order_by('-views_count')[:10]
+        """
+        Популярные объявления: ?window=all (по числу просмотров, по умолчанию),
+        ?window=24h или ?window=7d (тренды с затуханием, пересчитываются по расписанию)
+        """
+        window = request.query_params.get('window', WINDOW_ALL)
+        if window not in WINDOW_CHOICES:
+            raise ValidationError({'window': f'Must be one of: {", ".join(WINDOW_CHOICES)}'})
+
+        queryset = Listing.objects.filter(is_active=True)
+        if window == WINDOW_ALL:
+            popular_listings = list(self.get_rows(queryset.order_by('-views_count', '-id'))[:POPULAR_LIMIT])
+        else:
+            ids = get_trending_ids(window)
+            # Объявление могло стать неактивным после пересчёта - берём из запаса
+            rows = {row['id']: row for row in self.get_rows(queryset.filter(pk__in=ids))}
+            popular_listings = [rows[pk] for pk in ids if pk in rows][:POPULAR_LIMIT]
 
         serializer = self.get_serializer(popular_listings, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Подсказки по префиксу ?q=: названия, города, районы и частые запросы"""
+        try:
+            limit = min(int(request.query_params.get('limit', SUGGEST_LIMIT)), SUGGEST_LIMIT)
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer'})
+        return Response(suggest_index.suggest(request.query_params.get('q', ''), limit=max(limit, 1)))
+
+    @action(detail=False, methods=['get'], url_path='price-stats')
+    def price_stats(self, request):
+        """
+        Цены активных объявлений: ?city= и ?property_type= (через запятую),
+        ?buckets= - число корзин гистограммы. Считается по предрасчитанным
+        массивам цен групп (listings.price_stats), без чтения объявлений
+        """
+        params = request.query_params
+        city_location_ids = property_types = None
+        if params.get('city'):
+            names = [name for name in params['city'].split(',') if name.strip()]
+            city_location_ids = location_lookup.resolve_many(Location.KIND_CITY, names)
+        if params.get('property_type'):
+            property_types = [value.strip() for value in params['property_type'].split(',') if value.strip()]
+            choices = dict(Listing.PROPERTY_TYPES)
+            unknown = [value for value in property_types if value not in choices]
+            if unknown:
+                raise ValidationError({'property_type': f'Must be one of: {", ".join(choices)}'})
+        try:
+            buckets = int(params.get('buckets', PRICE_HISTOGRAM_BUCKETS))
+        except ValueError:
+            raise ValidationError({'buckets': 'Must be an integer'})
+        if not 1 <= buckets <= MAX_HISTOGRAM_BUCKETS:
+            raise ValidationError({'buckets': f'Must be between 1 and {MAX_HISTOGRAM_BUCKETS}'})
+        return Response(get_price_stats(city_location_ids, property_types, buckets))
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Количество объявлений по типу, городу, комнатам и цене (те же фильтры, что у списка)"""
+        scope = 'public'
+        if request.user.is_authenticated and request.user.user_type == 'landlord':
+            scope = f'owner:{request.user.pk}'
+
+        cache = get_cache()
+        key = make_key(
+            'listings:facets',
+            get_generations(list_generations(request.query_params)),
+            scope,
+            normalize_params(request.query_params, ignore=NON_FILTER_PARAMS),
+        )
+        data = cache.get(key)
+        if data is None:
+            data = compute_facets(self.filter_queryset(self.get_queryset()))
+            cache.set(key, data, FACETS_CACHE_TIMEOUT)
+        return Response(data)
+
+
+class SavedSearchViewSet(viewsets.ModelViewSet):
+    """Сохранённые поиски пользователя и входящие с новыми подходящими объявлениями"""
+    serializer_class = SavedSearchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return SavedSearch.objects.filter(user=self.request.user).order_by('-id')
+
+    def get_serializer_class(self):
+        if self.action == 'inbox':
+            return SavedSearchMatchSerializer
+        return SavedSearchSerializer
+
+    def perform_create(self, serializer):
+        index_search(serializer.save(user=self.request.user))
+
+    def perform_update(self, serializer):
+        index_search(serializer.save())
+
+    @action(detail=False, methods=['get'])
+    def inbox(self, request):
+        """Новые объявления под сохранённые поиски, свежие первыми (?unread=true - только непрочитанные)"""
+        queryset = (
+            SavedSearchMatch.objects.filter(user=request.user, listing__is_active=True)
+            .select_related('search', 'listing__owner', 'listing__main_image')
+            .order_by('-id')
+        )
+        if request.query_params.get('unread') in ('true', '1'):
+            queryset = queryset.filter(is_read=False)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['post'], url_path='inbox/read')
+    def read(self, request):
+        """Отмечает записи входящих прочитанными: {"ids": [...]} или все"""
+        queryset = SavedSearchMatch.objects.filter(user=request.user, is_read=False)
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+                raise ValidationError({'ids': 'Must be a list of integers'})
+            queryset = queryset.filter(pk__in=ids)
+        return Response({'updated': queryset.update(is_read=True)})
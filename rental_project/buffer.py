@@ -0,0 +1,138 @@
+"""
+Буфер для записи событий вне пути запроса.
+
+События (просмотры, поисковые запросы) складываются в список в памяти
+процесса и пишутся в БД пачкой: когда набралось max_size событий или
+прошло flush_interval секунд. Пишет фоновый поток; при остановке
+воркера (atexit) остаток сбрасывается. Если буфер переполнен (БД не
+успевает) или запись упала, события отбрасываются и учитываются в
+счётчике dropped. close() сбрасывает остаток и снимает atexit-хук
+(тесты, остановка приложения); после него события пишутся сразу.
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter:
+    def __init__(self, name, flush_func, max_size=None, flush_interval=None, max_pending=None):
+        self.name = name
+        self.flush_func = flush_func
+        self._max_size = max_size
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._items = []
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self.stats = {'added': 0, 'written': 0, 'flushes': 0, 'dropped': 0}
+        atexit.register(self.flush)
+
+    @property
+    def dropped(self):
+        """Сколько событий потеряно: буфер переполнен или запись упала"""
+        return self.stats['dropped']
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'HISTORY_BUFFER_SIZE', 200)
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return getattr(settings, 'HISTORY_FLUSH_INTERVAL', 2.0)
+
+    @property
+    def max_pending(self):
+        if self._max_pending is not None:
+            return self._max_pending
+        return getattr(settings, 'HISTORY_BUFFER_MAX_PENDING', 10000)
+
+    def add(self, item):
+        """Кладёт событие в буфер; False - событие отброшено"""
+        if self.max_size <= 1 or self._closed:
+            # Буферизация выключена (например, в тестах) или буфер закрыт - пишем сразу
+            with self._lock:
+                self.stats['added'] += 1
+            self._write([item])
+            return True
+
+        with self._lock:
+            self._ensure_thread()
+            if len(self._items) >= self.max_pending:
+                self.stats['dropped'] += 1
+                dropped = self.stats['dropped']
+            else:
+                self._items.append(item)
+                self.stats['added'] += 1
+                dropped = None
+                if len(self._items) >= self.max_size:
+                    self._wakeup.set()
+
+        if dropped is not None:
+            # Не засоряем лог: первое событие и дальше каждое тысячное
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning('%s buffer is full, %d events dropped so far', self.name, dropped)
+            return False
+        return True
+
+    def flush(self):
+        """Пишет всё накопленное; вызывается фоновым потоком, при выходе и в тестах"""
+        with self._flush_lock:
+            with self._lock:
+                items, self._items = self._items, []
+            if items:
+                self._write(items)
+
+    def close(self):
+        """Останавливает фоновый поток, пишет остаток и снимает atexit-хук"""
+        atexit.unregister(self.flush)
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+
+    def _write(self, items):
+        try:
+            self.flush_func(items)
+        except Exception:
+            logger.exception('Failed to write %d %s events', len(items), self.name)
+            with self._lock:
+                self.stats['dropped'] += len(items)
+        else:
+            with self._lock:
+                self.stats['written'] += len(items)
+                self.stats['flushes'] += 1
+
+    def _ensure_thread(self):
+        # После fork (gunicorn) потока в дочернем процессе нет, а буфер
+        # содержит копию чужих событий - начинаем с чистого листа
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        if self._pid is not None and self._pid != pid:
+            self._items = []
+        self._pid = pid
+        self._thread = threading.Thread(target=self._run, name=f'{self.name}-flusher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # У потока своё соединение с БД: не держим его дольше CONN_MAX_AGE
+                close_old_connections()
@@ -0,0 +1,152 @@
+import hashlib
+from datetime import date, datetime
+
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .counts import cached_aggregate, estimate_count
+
+
+class ConditionalGetMixin:
+    """
+    Условный GET (ETag / Last-Modified) для list и retrieve.
+
+    ETag карточки строится из pk, last_modified_field и get_etag_parts(),
+    ETag списка - из агрегата (MAX(last_modified_field), COUNT) по
+    отфильтрованному queryset плюс параметры запроса и пользователь.
+    If-None-Match / If-Modified-Since проверяются до сериализации:
+    при совпадении отдаётся 304 без тела.
+
+    Агрегат списка кэшируется (rental_project.counts), его COUNT берёт
+    пагинатор. Для очень больших выборок агрегат не считается: ETag
+    строится из get_list_version() и оценки числа строк, а без версии
+    данных валидаторов у такого списка нет.
+
+    Страница ?cursor= (KeysetPagination) агрегатов по всей выборке не
+    считает: сначала выбирается страница, ETag строится из её строк
+    (pk, last_modified_field, get_etag_parts()), Last-Modified - их
+    максимум. Строки могут быть словарями values().
+    """
+    last_modified_field = 'updated_at'
+    # Дополнительные агрегаты для ETag списка: {'name': Max('listing__updated_at')}
+    list_etag_aggregates = {}
+
+    def get_etag_parts(self, instance):
+        """Версия объекта помимо last_modified_field (связанные объекты и т.п.)"""
+        return ()
+
+    def get_etag_context(self):
+        """Общие для карточки и списка части ETag (например, текущая дата)"""
+        return ()
+
+    def get_list_version(self):
+        """Версия данных списка (поколения кэша); None - агрегат не кэшируется"""
+        return None
+
+    def get_page_validators(self, page):
+        """Валидаторы keyset-страницы - только по её строкам"""
+        paginator = self.paginator
+        parts = [getattr(paginator, 'has_next', None), getattr(paginator, 'has_previous', None)]
+        last_modified = None
+        for row in page:
+            modified = row_value(row, self.last_modified_field)
+            if modified is not None and (last_modified is None or modified > last_modified):
+                last_modified = modified
+            parts.extend((row_value(row, 'pk'), modified, *self.get_etag_parts(row)))
+        return self.make_etag(*parts), last_modified
+
+    def is_cursor_request(self):
+        param = getattr(self.paginator, 'cursor_query_param', None)
+        return param is not None and param in self.request.query_params
+
+    def get_object_validators(self, instance):
+        last_modified = getattr(instance, self.last_modified_field)
+        parts = (instance._meta.label, instance.pk, *self.get_etag_parts(instance))
+        return self.make_etag(last_modified, *parts), last_modified
+
+    def get_list_validators(self, queryset):
+        version = self.get_list_version()
+        estimate = estimate_count(queryset)
+        if estimate is not None:
+            self.list_count = (estimate, True)
+            if version is None:
+                return None, None
+            return self.make_etag(version, estimate), None
+
+        aggregates = cached_aggregate(queryset, {
+            'last_modified': Max(self.last_modified_field),
+            **self.list_etag_aggregates,
+        }, version)
+        # Пагинатор возьмёт это число вместо второго COUNT
+        self.list_count = (aggregates['total'], False)
+        last_modified = aggregates['last_modified']
+        parts = [value for name, value in sorted(aggregates.items())]
+        return self.make_etag(*parts), last_modified
+
+    def make_etag(self, *parts):
+        request = self.request
+        user = request.user.pk if request.user.is_authenticated else None
+        # Путь с параметрами и пользователь: разные страницы и выборки - разные ETag
+        values = [request.get_full_path(), user, type(self).__name__, *self.get_etag_context(), *parts]
+        data = '|'.join(_etag_value(value) for value in values)
+        # Слабый ETag: тело может отличаться рендерером (JSON / browsable API)
+        return 'W/' + quote_etag(hashlib.sha1(data.encode('utf-8')).hexdigest())
+
+    def conditional_response(self, request, etag, last_modified, build):
+        """304, если клиент прислал актуальный валидатор, иначе build() с заголовками"""
+        # HTTP-дата с точностью до секунды
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = build()
+        if etag is not None and (200 <= response.status_code < 300 or response.status_code == 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.get_object_validators(instance)
+        return self.conditional_response(
+            request, etag, last_modified,
+            lambda: Response(self.get_serializer(instance).data),
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.is_cursor_request():
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                etag, last_modified = self.get_page_validators(page)
+                return self.conditional_response(
+                    request, etag, last_modified,
+                    lambda: self.get_paginated_response(self.get_serializer(page, many=True).data),
+                )
+
+        etag, last_modified = self.get_list_validators(queryset)
+
+        def build():
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+            return Response(self.get_serializer(queryset, many=True).data)
+
+        return self.conditional_response(request, etag, last_modified, build)
+
+
+def row_value(row, name):
+    """Поле строки страницы: модель или словарь values() ('pk' - по первичному ключу)"""
+    if not isinstance(row, dict):
+        return getattr(row, name)
+    if name == 'pk' and 'pk' not in row:
+        return row.get('id')
+    return row.get(name)
+
+
+def _etag_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
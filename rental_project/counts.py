@@ -0,0 +1,198 @@
+"""
+Дешёвые COUNT для списков.
+
+Постраничный ответ и ETag списка считают COUNT(*) по всей выборке с
+фильтрами; на больших городах это дороже самой страницы. Поэтому:
+
+- агрегаты больших выборок (от PAGINATION_COUNT_CACHE_THRESHOLD строк)
+  кэшируются на PAGINATION_COUNT_CACHE_TIMEOUT секунд по ключу из SQL
+  запроса без сортировки и версии данных (поколения кэша), только если
+  версия есть;
+- если в таблице больше PAGINATION_ESTIMATE_THRESHOLD строк, а запрос
+  без фильтров или оценка планировщика тоже выше порога, COUNT не
+  выполняется: берётся статистика таблицы (MySQL information_schema,
+  PostgreSQL pg_class, SQLite sqlite_stat1 после ANALYZE) или оценка
+  EXPLAIN. Такое число помечается в ответе как приблизительное.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import DatabaseError, connections
+from django.db.models import Count
+
+PAGINATION_COUNT_CACHE_TIMEOUT = 60
+PAGINATION_COUNT_CACHE_THRESHOLD = 1000
+PAGINATION_ESTIMATE_THRESHOLD = 100_000
+
+
+def get_count_cache_timeout():
+    return getattr(settings, 'PAGINATION_COUNT_CACHE_TIMEOUT', PAGINATION_COUNT_CACHE_TIMEOUT)
+
+
+def get_count_cache_threshold():
+    return getattr(settings, 'PAGINATION_COUNT_CACHE_THRESHOLD', PAGINATION_COUNT_CACHE_THRESHOLD)
+
+
+def get_estimate_threshold():
+    return getattr(settings, 'PAGINATION_ESTIMATE_THRESHOLD', PAGINATION_ESTIMATE_THRESHOLD)
+
+
+def count_rows(queryset, version=None):
+    """(число строк, приблизительное ли оно)"""
+    estimate = estimate_count(queryset)
+    if estimate is not None:
+        return estimate, True
+    return cached_aggregate(queryset, {}, version)['total'], False
+
+
+def cached_aggregate(queryset, aggregates, version=None):
+    """
+    queryset.aggregate(total=Count('pk'), **aggregates) с кэшем для больших
+    выборок. version - версия данных в ключе (поколения кэша и т.п.);
+    без неё агрегат не кэшируется: сбросить его при записи было бы нечем
+    """
+    timeout = get_count_cache_timeout()
+    key = None
+    if timeout and version is not None:
+        key = _query_key('aggregate', queryset, version, sorted(aggregates))
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    result = queryset.order_by().aggregate(total=Count('pk'), **aggregates)
+    if key is not None and result['total'] >= get_count_cache_threshold():
+        cache.set(key, result, timeout)
+    return result
+
+
+def estimate_count(queryset):
+    """Оценка числа строк без COUNT; None - выборка небольшая или оценки нет"""
+    threshold = get_estimate_threshold()
+    if not threshold:
+        return None
+    table_rows = table_estimate(queryset.model, queryset.db)
+    if table_rows is None or table_rows < threshold:
+        return None
+    if not queryset.query.where:
+        return table_rows
+    planned = planner_estimate(queryset)
+    if planned is None or planned < threshold:
+        # Узкий фильтр: точный COUNT по индексу недорог
+        return None
+    return planned
+
+
+def table_estimate(model, using='default'):
+    """Число строк таблицы по статистике СУБД (кэшируется); None - статистики нет"""
+    key = f'counts:table:{using}:{model._meta.db_table}'
+    cached = cache.get(key)
+    if cached is not None:
+        return cached if cached >= 0 else None
+    connection = connections[using]
+    estimator = _TABLE_ESTIMATORS.get(connection.vendor)
+    try:
+        rows = estimator(connection, model._meta.db_table) if estimator else None
+    except DatabaseError:
+        rows = None
+    # Отсутствие статистики тоже кэшируем (-1), чтобы не спрашивать СУБД каждый запрос
+    cache.set(key, rows if rows is not None else -1, get_count_cache_timeout())
+    return rows
+
+
+def planner_estimate(queryset):
+    """Оценка планировщика для запроса с фильтрами (MySQL, PostgreSQL); None - нет оценки"""
+    connection = connections[queryset.db]
+    estimator = _PLAN_ESTIMATORS.get(connection.vendor)
+    if estimator is None:
+        return None
+    query = _count_sql(queryset)
+    if query is None:
+        return None
+    try:
+        return estimator(connection, *query)
+    except DatabaseError:
+        return None
+
+
+def _count_sql(queryset):
+    """SQL выборки без сортировки и списка колонок; None - заведомо пустая (filter(pk__in=[]))"""
+    try:
+        return queryset.order_by().values_list('pk').query.sql_with_params()
+    except EmptyResultSet:
+        return None
+
+
+def _query_key(prefix, queryset, version, extra=()):
+    """Ключ кэша по нормализованным фильтрам; None - кэшировать нечего"""
+    query = _count_sql(queryset)
+    if query is None:
+        return None
+    sql, params = query
+    data = json.dumps([queryset.db, sql, [str(param) for param in params], version, list(extra)])
+    return f'counts:{prefix}:{hashlib.sha1(data.encode("utf-8")).hexdigest()}'
+
+
+def _mysql_table_rows(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+            [table],
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def _postgresql_table_rows(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)', [table])
+        row = cursor.fetchone()
+    # -1 - таблицу ещё не анализировали
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+def _sqlite_table_rows(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+        if cursor.fetchone() is None:
+            return None
+        cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+        # Первое число в stat - строк в таблице (или в индексе - то же самое)
+        counts = [int(row[0].split()[0]) for row in cursor.fetchall() if row[0]]
+    return max(counts) if counts else None
+
+
+def _mysql_plan_rows(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN {sql}', params)
+        columns = [column[0].lower() for column in cursor.description]
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    data = dict(zip(columns, row))
+    if data.get('rows') is None:
+        return None
+    # Первая строка плана - ведущая таблица: строки к чтению x доля прошедших условия
+    return int(int(data['rows']) * float(data.get('filtered') or 100) / 100)
+
+
+def _postgresql_plan_rows(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+_TABLE_ESTIMATORS = {
+    'mysql': _mysql_table_rows,
+    'postgresql': _postgresql_table_rows,
+    'sqlite': _sqlite_table_rows,
+}
+_PLAN_ESTIMATORS = {
+    'mysql': _mysql_plan_rows,
+    'postgresql': _postgresql_plan_rows,
+}
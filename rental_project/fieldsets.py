@@ -0,0 +1,195 @@
+"""
+Выборочные поля ответа: ?fields=id,title,price и ?exclude=description.
+
+Сериализатор отдаёт только запрошенные поля (вложенные сериализаторы
+не затрагиваются), а queryset списка, карточки и выгрузки читает только нужные
+для них колонки: .only() по source полей, select_related только для
+связей, которые реально выводятся, prefetch_related - аналогично.
+Без параметров ответ прежний, но лишние JOIN и prefetch всё равно
+отбрасываются.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import PrimaryKeyRelatedField
+
+from .pagination import KeysetPagination, keyset_columns
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+class SparseFieldsetSerializerMixin:
+    """Оставляет в сериализаторе верхнего уровня только поля из context['fieldset']"""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('fieldset')
+        if fieldset is None or not self._is_top_level():
+            return fields
+        return {name: field for name, field in fields.items() if name in fieldset}
+
+    def _is_top_level(self):
+        root = self.root
+        return root is self or (isinstance(root, serializers.ListSerializer) and self.parent is root)
+
+
+class SparseFieldsetMixin:
+    """
+    ?fields= / ?exclude= для list, retrieve и export вьюсета.
+
+    sparse_field_sources - колонки для полей, которые не являются полями
+    модели (свойства): {'is_active': ('status', 'start_date', 'end_date')}.
+    sparse_required_fields - колонки, нужные самому вьюсету помимо ответа
+    (ETag и т.п.). Поле-свойство без описания отключает .only().
+    """
+    sparse_field_sources = {}
+    sparse_required_fields = ()
+    sparse_actions = ('list', 'retrieve', 'export')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.get_fieldset()
+        return context
+
+    def get_fieldset(self):
+        """Имена полей ответа или None, если клиент не ограничивал поля"""
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = self._parse_fieldset()
+        return self._fieldset
+
+    def _parse_fieldset(self):
+        request = self.request
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        params = request.query_params
+        if FIELDS_PARAM not in params and EXCLUDE_PARAM not in params:
+            return None
+
+        available = [
+            name for name, field in self.get_serializer_class()().fields.items()
+            if not field.write_only
+        ]
+        fieldset = set(available)
+        for param in (FIELDS_PARAM, EXCLUDE_PARAM):
+            if param not in params:
+                continue
+            names = {name.strip() for name in params[param].split(',') if name.strip()}
+            unknown = names - fieldset
+            if unknown:
+                raise ValidationError({param: f'Unknown fields: {", ".join(sorted(unknown))}'})
+            fieldset = fieldset & names if param == FIELDS_PARAM else fieldset - names
+        return frozenset(fieldset)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.sparse_actions and self.request.method in SAFE_METHODS:
+            queryset = self.restrict_queryset(queryset)
+        return queryset
+
+    def restrict_queryset(self, queryset):
+        """only() / select_related() / prefetch_related() по полям ответа"""
+        serializer = self.get_serializer()
+        required = [self.last_modified_field] if hasattr(self, 'last_modified_field') else []
+        required.extend(self.sparse_required_fields)
+        # Поля сортировки читает keyset-пагинация: весь её фактический порядок
+        # (Meta.ordering, tie-breaker), а не только явный order_by
+        pagination_class = getattr(self, 'pagination_class', None)
+        if isinstance(pagination_class, type) and issubclass(pagination_class, KeysetPagination):
+            required.extend(keyset_columns(queryset, pagination_class))
+        else:
+            required.extend(
+                field.lstrip('-') for field in queryset.query.order_by if isinstance(field, str)
+            )
+        paths = collect_load_paths(
+            queryset.model, serializer.fields, self.sparse_field_sources, required, queryset.query.annotations,
+        )
+        if paths is None:
+            return queryset
+        columns, relations, many = paths
+
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*sorted(relations))
+
+        lookups = queryset._prefetch_related_lookups
+        if lookups:
+            kept = [lookup for lookup in lookups if _lookup_root(lookup) in many | relations]
+            queryset = queryset.prefetch_related(None).prefetch_related(*kept)
+        return queryset.only(*sorted(columns))
+
+
+def collect_load_paths(model, fields, sources, required=(), annotations=()):
+    """
+    Что нужно прочитать из БД для полей сериализатора.
+
+    Возвращает (columns, relations, many): пути для only(), связи для
+    select_related (внешний ключ + объект целиком или его колонки) и
+    обратные/M2M связи для prefetch_related. Поля-аннотации queryset
+    колонок не требуют. None - поля нельзя свести к колонкам (source='*'
+    или свойство без sparse_field_sources).
+    """
+    columns, full, many = {model._meta.pk.name}, set(), set()
+
+    def add_path(path, whole):
+        """path - список имён через связи; whole - нужен связанный объект целиком"""
+        current, names = model, []
+        for index, name in enumerate(path):
+            try:
+                field = current._meta.get_field(name)
+            except FieldDoesNotExist:
+                return False
+            if field.many_to_many or field.one_to_many:
+                many.add('__'.join(names + [name]))
+                return True
+            names.append(name)
+            last = index == len(path) - 1
+            if field.is_relation and not last:
+                current = field.related_model
+                continue
+            if field.is_relation and whole:
+                full.add('__'.join(names))
+            columns.add('__'.join(names))
+            return True
+        return True
+
+    for name, field in fields.items():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            return None
+        if field.source in annotations:
+            continue
+        attrs = field.source.split('.')
+        # PrimaryKeyRelatedField читает только *_id, остальные связи - объект целиком
+        whole = not isinstance(field, PrimaryKeyRelatedField)
+        if add_path(attrs, whole):
+            continue
+        if name not in sources:
+            return None
+        for path in sources[name]:
+            add_path(path.split('__'), True)
+
+    for path in required:
+        add_path(path.split('__'), False)
+
+    # Для связей целиком колонки связанной модели не перечисляем - тогда Django читает её всю
+    columns = {
+        column for column in columns
+        if not any(column.startswith(relation + '__') for relation in full)
+    }
+    relations = full | {column.rsplit('__', 1)[0] for column in columns if '__' in column}
+    # Промежуточные связи (listing__owner -> listing) тоже нужны в select_related
+    relations |= {
+        '__'.join(relation.split('__')[:depth])
+        for relation in set(relations)
+        for depth in range(1, relation.count('__') + 1)
+    }
+    # Внешние ключи самих связей: без них only() не даст пройти select_related
+    return columns | relations, relations, many
+
+
+def _lookup_root(lookup):
+    path = lookup if isinstance(lookup, str) else lookup.prefetch_to
+    return path.split('__')[0]
@@ -0,0 +1,288 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .counts import count_rows
+
+
+class CountedPaginator(Paginator):
+    """
+    Paginator с заранее посчитанным числом строк (rental_project.counts).
+    Число может быть приблизительным или взятым из кэша, поэтому страница
+    им не ограничивается: выбирается per_page + 1 строк, а следующая
+    страница определяется по лишней строке текущей
+    """
+
+    def __init__(self, object_list, per_page, count, approximate=False):
+        super().__init__(object_list, per_page)
+        # count - cached_property Paginator: подставляем готовое значение
+        self.__dict__['count'] = count
+        self.approximate = approximate
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        items = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not items and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return CountedPage(items[:self.per_page], number, self, has_more=len(items) > self.per_page)
+
+
+class CountedPage(Page):
+    def __init__(self, object_list, number, paginator, has_more):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Пагинация по ключу (keyset) вместо OFFSET + COUNT(*).
+
+    Включается параметром ?cursor= (пустое значение - первая страница),
+    без него работает обычная постраничная пагинация, поэтому вьюсет
+    может подключить этот класс, не ломая существующих клиентов.
+
+    Порядок берётся из queryset (OrderingFilter, поиск по релевантности,
+    Meta.ordering), в конец добавляется id как tie-breaker. Следующая
+    страница - это WHERE (field, id) > (last_field, last_id), который идёт
+    по индексам вида (price) / (created_at): InnoDB хранит PK в каждом
+    вторичном индексе, так что это фактически (price, id).
+    """
+    cursor_query_param = 'cursor'
+    default_ordering = ('-created_at',)
+    tie_breaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return self.paginate_pages(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.request = request
+        self.display_page_controls = False
+        self.ordering = self.get_ordering(queryset)
+        position, reverse = self.decode_cursor(request, queryset)
+
+        ordering = [_invert(field) for field in self.ordering] if reverse else self.ordering
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(ordering, position))
+
+        results = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        if results:
+            self.first_position = self.get_position(results[0])
+            self.last_position = self.get_position(results[-1])
+        else:
+            # Пустая страница: обе ссылки ведут от текущей позиции
+            self.first_position = self.last_position = position
+        return results
+
+    def paginate_pages(self, queryset, request, view):
+        """?page=: как у PageNumberPagination, но число строк - через rental_project.counts"""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        count, approximate = self.get_count(queryset, view)
+        paginator = CountedPaginator(queryset, page_size, count, approximate)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def get_count(self, queryset, view):
+        """
+        (число строк, приблизительное ли). ConditionalGetMixin уже посчитал
+        его для ETag списка (list_count) - второй COUNT не нужен
+        """
+        counted = getattr(view, 'list_count', None)
+        if counted is not None:
+            return counted
+        get_version = getattr(view, 'get_list_version', None)
+        return count_rows(queryset, get_version() if get_version is not None else None)
+
+    def get_ordering(self, queryset):
+        return keyset_ordering(queryset, self.default_ordering, self.tie_breaker)
+
+    def get_position_filter(self, ordering, position):
+        """(f1, f2, ..., id) > (v1, v2, ..., id) с учётом направления каждого поля"""
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': position[index]})
+            for previous, value in zip(ordering[:index], position[:index]):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        return condition
+
+    def get_position(self, item):
+        position = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            if isinstance(item, dict):
+                # Строки values() должны выбирать все колонки keyset_ordering
+                if name not in item:
+                    raise ImproperlyConfigured(
+                        f'Keyset pagination needs the "{name}" column in the selected rows'
+                    )
+                value = item[name]
+            else:
+                value = getattr(item, name)
+            position.append(_encode_value(value))
+        return position
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position, reverse = data['p'], bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # Значения курсора приходят от клиента: приводим к типам полей до WHERE
+        try:
+            position = [
+                _ordering_field(queryset, field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if any(value is None for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        data = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.last_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.first_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return Response({
+                'count': self.page.paginator.count,
+                # count - оценка по статистике СУБД, а не точный COUNT(*)
+                'count_approximate': self.page.paginator.approximate,
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+                'results': data,
+            })
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+def keyset_ordering(queryset, default_ordering=KeysetPagination.default_ordering,
+                    tie_breaker=KeysetPagination.tie_breaker):
+    """
+    Фактический порядок keyset-страницы: order_by queryset, Meta.ordering
+    или default_ordering плюс tie-breaker. Колонки отсюда должны быть в
+    строках страницы - из них собирается курсор
+    """
+    ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+    if not ordering or not all(isinstance(field, str) for field in ordering):
+        ordering = list(default_ordering)
+
+    names = {field.lstrip('-') for field in ordering}
+    if tie_breaker not in names and 'pk' not in names:
+        prefix = '-' if ordering[0].startswith('-') else ''
+        ordering.append(f'{prefix}{tie_breaker}')
+    return ordering
+
+
+def keyset_columns(queryset, pagination_class=KeysetPagination):
+    """Имена колонок keyset_ordering (с настройками pagination_class) без направления"""
+    ordering = keyset_ordering(queryset, pagination_class.default_ordering, pagination_class.tie_breaker)
+    return [field.lstrip('-') for field in ordering]
+
+
+def _ordering_field(queryset, name):
+    """Поле модели (в т.ч. через связи) или output_field аннотации для колонки порядка"""
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    model = queryset.model
+    *relations, last = name.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    if last == 'pk':
+        return model._meta.pk
+    try:
+        return model._meta.get_field(last)
+    except FieldDoesNotExist:
+        raise ImproperlyConfigured(f'Keyset pagination cannot order by "{name}"')
+
+
+def _invert(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _encode_value(value):
+    """Значение для курсора: без потери точности (микросекунды, Decimal)"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
@@ -170,6 +170,57 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Кэш (ответы API, фасеты, тренды). CACHE_URL:
+#   locmem://                     - в памяти процесса (по умолчанию, для разработки:
+#                                   у каждого воркера gunicorn свой кэш и свои поколения)
+#   file:///var/tmp/rental_cache  - файлы, общие для процессов одной машины
+#   redis://redis:6379/0          - Redis или совместимый сервер (docker-compose)
+CACHE_URL = os.getenv('CACHE_URL', 'locmem://')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}}
+elif CACHE_URL.startswith('file://'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_URL[len('file://'):],
+    }}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Буферизация записи истории просмотров (0 или 1 - писать сразу)
+HISTORY_BUFFER_SIZE = int(os.getenv('HISTORY_BUFFER_SIZE', '200'))
+HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', '2'))
+HISTORY_BUFFER_MAX_PENDING = int(os.getenv('HISTORY_BUFFER_MAX_PENDING', '10000'))
+if 'test' in sys.argv[1:2]:
+    # В тестах фоновый поток писал бы вне транзакции теста
+    HISTORY_BUFFER_SIZE = 0
+
+# Выгрузка .../export/: сколько строк читается из БД за один запрос
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
+# COUNT для пагинации и ETag списков (rental_project.counts): агрегаты выборок
+# от PAGINATION_COUNT_CACHE_THRESHOLD строк кэшируются на PAGINATION_COUNT_CACHE_TIMEOUT
+# секунд; выборки больше PAGINATION_ESTIMATE_THRESHOLD строк считаются по статистике
+# СУБД (в ответе count_approximate: true), 0 - всегда точный COUNT
+PAGINATION_COUNT_CACHE_TIMEOUT = int(os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', '60'))
+PAGINATION_COUNT_CACHE_THRESHOLD = int(os.getenv('PAGINATION_COUNT_CACHE_THRESHOLD', '1000'))
+PAGINATION_ESTIMATE_THRESHOLD = int(os.getenv('PAGINATION_ESTIMATE_THRESHOLD', '100000'))
+
+# Порядок массового подтверждения заявок /bookings/bookings/decide/, если он
+# не передан в запросе: first_come (раньше созданные) или longest_stay
+BOOKING_DECISION_PRIORITY = os.getenv('BOOKING_DECISION_PRIORITY', 'first_come')
+
+# Загруженные файлы (фото объявлений, аватары)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+# Обработка изображений: миниатюры и WebP строит пул из IMAGE_PROCESSING_WORKERS
+# процессов (0 - прямо в запросе), загрузки больше IMAGE_MAX_UPLOAD_SIZE байт отклоняются
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', '2'))
+IMAGE_MAX_UPLOAD_SIZE = int(os.getenv('IMAGE_MAX_UPLOAD_SIZE', str(10 * 2 ** 20)))
+if 'test' in sys.argv[1:2]:
+    # Статус обработки пишется после коммита - в тестах обрабатываем сразу
+    IMAGE_PROCESSING_WORKERS = 0
+
 # JWT настройки
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -199,7 +250,3 @@ if not DEBUG:
 # CORS настройки (для фронтенда)
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:3000').split(',')
 CORS_ALLOW_CREDENTIALS = True
-
-#MEDIA_URL = '/media/'
-#MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-#mkdir media
\ No newline at end of file
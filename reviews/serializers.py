@@ -3,9 +3,10 @@ from .models import Review
 from users.serializers import UserSerializer
 from listings.serializers import ListingSerializer
 from bookings.models import Booking
+from rental_project.fieldsets import SparseFieldsetSerializerMixin
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     listing = ListingSerializer(read_only=True)
     booking_id = serializers.PrimaryKeyRelatedField(
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from listings.cache import REVIEWS_GENERATION, bump_generation
+
+from .models import Review
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def bump_reviews_generation(sender, instance, **kwargs):
+    # Агрегат списка отзывов (COUNT / ETag) кэшируется по поколению - сбрасываем после коммита
+    transaction.on_commit(lambda: bump_generation(REVIEWS_GENERATION))
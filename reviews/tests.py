@@ -1,4 +1,5 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
@@ -451,6 +452,54 @@ class ReviewAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
 
+class ReviewListCountTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.tenant = User.objects.create_user(
+            username='counttenant', email='counttenant@test.com', password='pass123', user_type='tenant'
+        )
+        landlord = User.objects.create_user(
+            username='countlandlord', email='countlandlord@test.com', password='pass123', user_type='landlord'
+        )
+        self.listing = Listing.objects.create(
+            title='Count reviews', description='Test', location='Berlin', city='Berlin',
+            price=100, rooms=2, property_type='apartment', owner=landlord
+        )
+        self.bookings = [
+            Booking.objects.create(
+                listing=self.listing,
+                tenant=self.tenant,
+                start_date=date.today() + timedelta(days=offset),
+                end_date=date.today() + timedelta(days=offset + 2),
+                status=Booking.STATUS_COMPLETED
+            )
+            for offset in (1, 5)
+        ]
+        self.client.force_authenticate(user=self.tenant)
+
+    def _review(self, booking):
+        return Review.objects.create(
+            booking=booking, listing=self.listing, author=self.tenant, rating=5, comment='Great!'
+        )
+
+    @override_settings(PAGINATION_COUNT_CACHE_THRESHOLD=1)
+    def test_cached_list_count_follows_writes(self):
+        """Закэшированный COUNT списка отзывов сбрасывается новым и удалённым отзывом"""
+        self._review(self.bookings[0])
+        url = reverse('review-list')
+        self.assertEqual(self.client.get(url).data['count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self._review(self.bookings[1])
+        response = self.client.get(url)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(len(response.data['results']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.client.get(url).data['count'], 1)
+
+
 class ReviewModelTest(TestCase):
     def setUp(self):
         self.tenant = User.objects.create_user(
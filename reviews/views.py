@@ -1,18 +1,35 @@
+from django.db.models import Max
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from .models import Review
 from .serializers import ReviewSerializer
 from bookings.models import Booking
+from listings.cache import LISTINGS_GENERATION, REVIEWS_GENERATION, get_generations
+from rental_project.conditional import ConditionalGetMixin
+from rental_project.export import ExportMixin
+from rental_project.fieldsets import SparseFieldsetMixin
+from rental_project.pagination import KeysetPagination
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(SparseFieldsetMixin, ConditionalGetMixin, ExportMixin, viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    # В отзыв вложено объявление - его изменение тоже меняет ETag
+    list_etag_aggregates = {'listing_updated_at': Max('listing__updated_at')}
+    sparse_required_fields = ('listing__updated_at',)
+    export_name = 'reviews'
 
+    def get_etag_parts(self, instance):
+        return (instance.listing.updated_at,)
+
+    def get_list_version(self):
+        # Кэш агрегата списка сбрасывается изменением отзывов и объявлений
+        return get_generations([REVIEWS_GENERATION, LISTINGS_GENERATION])
 
     def get_queryset(self):
         user = self.request.user
-        queryset = Review.objects.select_related('listing', 'author', 'booking')
+        queryset = Review.objects.select_related('listing', 'listing__main_image', 'author', 'booking')
 
         if user.user_type == 'landlord':
             return queryset.filter(listing__owner=user)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from rental_project.images import KIND_AVATAR, image_processor
+        from .models import User
+        image_processor.register(User, 'avatar', 'avatar_status', KIND_AVATAR)
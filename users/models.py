@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from rental_project.images import IMAGE_STATUS_CHOICES
 
 
 class User(AbstractUser):
@@ -11,6 +12,8 @@ class User(AbstractUser):
     user_type = models.CharField(max_length=20, choices=USER_TYPES, default='tenant')
     phone = models.CharField(max_length=20, blank=True, null=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # Статус обработки аватара (rental_project.images); пусто - аватара нет
+    avatar_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, blank=True, default='')
 
     def __str__(self):
         return f"{self.username} ({self.get_user_type_display()})"
\ No newline at end of file
@@ -1,16 +1,28 @@
 from rest_framework import serializers
+from rental_project.images import IMAGE_READY, KIND_AVATAR, validate_image_upload, variant_urls
 from .models import User
 
 
 class UserSerializer(serializers.ModelSerializer):
+    # {"status": ..., "variants": {...}} или null, если аватара нет
+    avatar = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        fields = ("id", "email", "password", "user_type", "username")
+        fields = ("id", "email", "password", "user_type", "username", "avatar")
         extra_kwargs = {
             "password": {"write_only": True},
             "email": {"required": True}
         }
 
+    def get_avatar(self, obj):
+        if not obj.avatar:
+            return None
+        variants = None
+        if obj.avatar_status == IMAGE_READY:
+            variants = variant_urls(obj.avatar.name, KIND_AVATAR, self.context.get("request"))
+        return {"status": obj.avatar_status, "variants": variants}
+
     def validate_email(self, value):
         if User.objects.filter(email=value).exists():
             raise serializers.ValidationError("Пользователь с таким email уже существует")
@@ -28,4 +40,10 @@ class UserSerializer(serializers.ModelSerializer):
             password=password,
             user_type=user_type
         )
-        return user
\ No newline at end of file
+        return user
+
+class AvatarUploadSerializer(serializers.Serializer):
+    avatar = serializers.ImageField()
+
+    def validate_avatar(self, value):
+        return validate_image_upload(value)
@@ -1,7 +1,13 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
+from PIL import Image
 from .models import User
 
 
@@ -260,3 +266,38 @@ class UserAPITest(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+
+
+class UserAvatarTest(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=cls.media_root)
+        media.enable()
+        cls.addClassCleanup(shutil.rmtree, cls.media_root, ignore_errors=True)
+        cls.addClassCleanup(media.disable)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='avataruser', email='avatar@test.com', password='pass123')
+        self.client.force_authenticate(user=self.user)
+
+    def test_avatar_upload(self):
+        """Аватар сохраняется, в ответе статус и URL вариантов"""
+        buffer = io.BytesIO()
+        Image.new('RGBA', (500, 300), (0, 128, 0, 128)).save(buffer, 'PNG')
+        upload = SimpleUploadedFile('me.png', buffer.getvalue(), content_type='image/png')
+        response = self.client.post(reverse('user-avatar'), {'avatar': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['avatar']['status'], 'ready')
+        self.assertEqual(set(response.data['avatar']['variants']), {'avatar', 'avatar_small'})
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar.name.startswith('images/'))
+
+        response = self.client.get(reverse('user-detail', args=[self.user.id]))
+        self.assertEqual(response.data['avatar']['status'], 'ready')
+
+    def test_no_avatar(self):
+        response = self.client.get(reverse('user-detail', args=[self.user.id]))
+        self.assertIsNone(response.data['avatar'])
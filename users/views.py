@@ -1,7 +1,8 @@
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from .models import User
-from .serializers import UserSerializer
+from .serializers import AvatarUploadSerializer, UserSerializer
+from rental_project.images import IMAGE_PENDING, KIND_AVATAR, image_processor
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -30,6 +31,20 @@ class UserViewSet(ModelViewSet):
             'access': str(refresh.access_token),
         }, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['post'])
+    def avatar(self, request):
+        """Загрузка аватара текущего пользователя (multipart, поле avatar)"""
+        serializer = AvatarUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        name, avatar_status = image_processor.prepare(serializer.validated_data['avatar'], KIND_AVATAR)
+        user = request.user
+        user.avatar = name
+        user.avatar_status = avatar_status
+        user.save(update_fields=['avatar', 'avatar_status'])
+        if avatar_status == IMAGE_PENDING:
+            image_processor.schedule(name, KIND_AVATAR)
+        return Response(UserSerializer(user, context=self.get_serializer_context()).data)
+
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
 